@@ -59,6 +59,38 @@ def authorizer_handler(event: dict[str, Any], _context: Any) -> dict[str, Any]:
     }
 
 
+def websocket_authorizer_handler(event: dict[str, Any], _context: Any) -> dict[str, Any]:
+    """REQUEST authorizer del $connect WebSocket: el token llega en ?token= (el navegador no manda headers).
+
+    Sin token la conexión se acepta como anónima (sin contexto, sin eventos personales);
+    un token inválido la rechaza.
+    """
+    token = (event.get("queryStringParameters") or {}).get("token", "")
+    context: dict[str, Any] = {}
+    if token:
+        try:
+            claims = jwt_utils.verify_token(token)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(f"Invalid websocket token: {str(err)}")
+            raise Exception("Unauthorized") from err
+        if claims.get("type") != "access":
+            raise Exception("Unauthorized")
+        context = {
+            "sub": claims["sub"],
+            "role": claims.get("role", "student"),
+            "tokenType": claims.get("type"),
+        }
+
+    return {
+        "principalId": context.get("sub", "anonymous"),
+        "policyDocument": {
+            "Version": "2012-10-17",
+            "Statement": [{"Action": "execute-api:Invoke", "Effect": "Allow", "Resource": event["methodArn"]}],
+        },
+        "context": context,
+    }
+
+
 def _handle_request(body: str, handler: Callable[[Any], Any], model_cls):
     try:
         parsed_body = json.loads(body or "{}")
@@ -91,3 +91,24 @@ def test_login_fails_with_wrong_password():
         service.login(LoginRequest(email="user@utec.edu.pe", password="invalid"))
 
     assert err.value.args[0] == "INVALID_CREDENTIALS"
+
+
+def test_websocket_authorizer_accepts_access_tokens_and_anonymous(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    from auth_service import app
+
+    arn = "arn:aws:execute-api:us-east-1:123:api/prod/$connect"
+    token = jwt_utils.sign_token(subject="user@utec.edu.pe", role="staff", ttl_seconds=900, token_type="access")
+
+    verified = app.websocket_authorizer_handler({"methodArn": arn, "queryStringParameters": {"token": token}}, None)
+    anonymous = app.websocket_authorizer_handler({"methodArn": arn, "queryStringParameters": None}, None)
+
+    assert verified["context"]["sub"] == "user@utec.edu.pe"
+    assert verified["context"]["role"] == "staff"
+    assert verified["policyDocument"]["Statement"][0]["Resource"] == arn
+    assert anonymous["context"] == {}
+
+    refresh = jwt_utils.sign_token(subject="user@utec.edu.pe", role="staff", ttl_seconds=900, token_type="refresh")
+    for bad in ("not-a-token", refresh):
+        with pytest.raises(Exception, match="Unauthorized"):
+            app.websocket_authorizer_handler({"methodArn": arn, "queryStringParameters": {"token": bad}}, None)
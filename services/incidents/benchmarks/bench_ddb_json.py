@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: serialización de listados de incidentes.
+
+Compara el camino anterior (copiar cada item con decimal_to_number y luego
+json.dumps) contra ddb_json.dumps para 1k, 10k y 100k items, midiendo tiempo
+y pico de memoria (tracemalloc).
+
+Uso: python benchmarks/bench_ddb_json.py
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import ddb_json
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def decimal_to_number(obj):
+    # Implementación previa de handlers.decimal_to_number
+    if isinstance(obj, list):
+        return [decimal_to_number(i) for i in obj]
+    elif isinstance(obj, dict):
+        return {k: decimal_to_number(v) for k, v in obj.items()}
+    elif isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    return obj
+
+
+def legacy_dumps(items):
+    return json.dumps({'incidents': decimal_to_number(items), 'count': len(items)})
+
+
+def new_dumps(items):
+    return ddb_json.dumps({'incidents': items, 'count': len(items)})
+
+
+def make_items(n):
+    return [
+        {
+            'incidentId': f'inc_{i:08x}',
+            'status': ('open', 'in_progress', 'resolved')[i % 3],
+            'urgencia': ('baja', 'media', 'alta')[i % 3],
+            'ubicacion': f'Edificio {chr(65 + i % 6)} - Lab {100 + i % 400}',
+            'titulo': 'Fuga de agua en el baño del segundo piso',
+            'descripcion': 'Se observa agua en el piso cerca de los lavaderos',
+            'reporterId': f'user{i % 5000}',
+            'reporterEmail': f'user{i % 5000}@utec.edu.pe',
+            'createdAt': Decimal(1700000000 + i),
+            'updatedAt': Decimal(1700000000 + i),
+        }
+        for i in range(n)
+    ]
+
+
+def measure(fn, items, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(items)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn(items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    backend = 'orjson' if ddb_json.orjson is not None else 'json'
+    print(f'ddb_json backend: {backend}')
+    print(f"{'items':>8} {'legacy ms':>10} {'ddb_json ms':>12} {'speedup':>8} {'legacy MB':>10} {'ddb_json MB':>12}")
+    for n in SIZES:
+        items = make_items(n)
+        assert json.loads(legacy_dumps(items)) == json.loads(new_dumps(items))
+        repeat = 5 if n < 100_000 else 2
+        legacy_t, legacy_mem = measure(legacy_dumps, items, repeat)
+        new_t, new_mem = measure(new_dumps, items, repeat)
+        print(f'{n:>8} {legacy_t * 1000:>10.1f} {new_t * 1000:>12.1f} {legacy_t / new_t:>7.1f}x '
+              f'{legacy_mem / 2**20:>10.1f} {new_mem / 2**20:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""
+Archivo de incidentes fríos (tiering caliente/frío).
+
+`archive_incidents` (job programado) toma los incidentes resueltos o cerrados
+sin cambios hace más de ARCHIVE_AFTER_DAYS días, los escribe en archivos
+columnares comprimidos particionados por fecha de creación
+(`year=YYYY/month=MM/`) y recién entonces los borra de la tabla caliente con
+BatchWriteItem. Antes de escribirlos se marcan con `archivedAt`: el REMOVE del
+stream lleva la marca en el OldImage y los consumidores (tombstones, stats,
+búsqueda) no lo tratan como un borrado. Con pyarrow instalado los archivos son Parquet (zstd); sin él,
+JSON por columnas comprimido con gzip.
+
+`list_archived` responde GET /incidents?archived=true partición por
+partición, de la más reciente a la más antigua: el cursor guarda la partición
+y el offset dentro de ella, así cada página lee solo las particiones que
+necesita. Los archivos son inmutables, así que cada contenedor guarda en
+memoria los que ya leyó.
+"""
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+import ddb_json
+from batch_write import batch_write
+from location import location_query
+from pagination import decode_cursor, encode_cursor, parse_limit
+from query_planner import ARCHIVED_AT
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # backend opcional
+    pyarrow = None
+
+ddb = boto3.resource('dynamodb')
+TABLE = os.environ.get('INCIDENTS_TABLE', 'AlertaUTEC-Incidents')
+table = ddb.Table(TABLE)
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_STATUSES = tuple(os.environ.get('ARCHIVE_STATUSES', 'resolved,closed').split(','))
+# Tope por ejecución para acotar memoria y duración del job
+ARCHIVE_MAX_ITEMS = int(os.environ.get('ARCHIVE_MAX_ITEMS', '5000'))
+ARCHIVE_BUCKET = os.environ.get('ARCHIVE_BUCKET')
+# Sin bucket se usa un directorio local (desarrollo y pruebas)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'incidents/')
+# Endpoint opcional para stores compatibles con S3 (MinIO, LocalStack)
+ARCHIVE_S3_ENDPOINT = os.environ.get('ARCHIVE_S3_ENDPOINT')
+ARCHIVE_READ_WORKERS = int(os.environ.get('ARCHIVE_READ_WORKERS', '8'))
+ARCHIVE_WRITE_WORKERS = int(os.environ.get('ARCHIVE_WRITE_WORKERS', '8'))
+# Particiones (meses) que lee como máximo una página de GET /incidents?archived=true
+ARCHIVE_PAGE_PARTITIONS = int(os.environ.get('ARCHIVE_PAGE_PARTITIONS', '6'))
+
+PARQUET_EXT = '.parquet'
+COLUMNS_EXT = '.columns.json.gz'
+ARCHIVE_FILTERS = ('status', 'urgencia', 'reporterId', 'assignedTo')
+
+
+class LocalArchiveStore:
+    """Archivo en un directorio local, con la misma estructura de keys que S3"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def put(self, key, data):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: un lector nunca ve un archivo a medias
+        with open(path + '.tmp', 'wb') as fh:
+            fh.write(data)
+        os.replace(path + '.tmp', path)
+        return path
+
+    def list(self, prefix):
+        base = os.path.join(self.root, prefix)
+        keys = []
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                if not name.endswith('.tmp'):
+                    keys.append(os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, '/'))
+        return sorted(keys)
+
+    def children(self, prefix):
+        """Sub-prefijos inmediatos de `prefix` ('.../year=2024/'), sin recorrer los archivos"""
+        base = os.path.join(self.root, prefix)
+        if not os.path.isdir(base):
+            return []
+        return sorted(f'{prefix}{name}/' for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+
+    def get(self, key):
+        with open(os.path.join(self.root, key), 'rb') as fh:
+            return fh.read()
+
+
+class S3ArchiveStore:
+    """Archivo en un bucket S3 (o compatible)"""
+
+    def __init__(self, bucket, client=None):
+        self.bucket = bucket
+        self._s3 = client or boto3.client('s3', endpoint_url=ARCHIVE_S3_ENDPOINT)
+
+    def put(self, key, data):
+        self._s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+        return f's3://{self.bucket}/{key}'
+
+    def list(self, prefix):
+        keys = []
+        for page in self._s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return sorted(keys)
+
+    def children(self, prefix):
+        """Sub-prefijos inmediatos de `prefix` vía Delimiter: no lista los archivos"""
+        prefixes = []
+        paginator = self._s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+        return sorted(prefixes)
+
+    def get(self, key):
+        return self._s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+
+def default_store():
+    if ARCHIVE_BUCKET:
+        return S3ArchiveStore(ARCHIVE_BUCKET)
+    if ARCHIVE_DIR:
+        return LocalArchiveStore(ARCHIVE_DIR)
+    raise RuntimeError('ARCHIVE_BUCKET o ARCHIVE_DIR debe estar configurado')
+
+
+# ==================== FORMATO COLUMNAR ====================
+
+def encode_columns(items):
+    """Devuelve (bytes, extensión) con los items en formato columnar comprimido"""
+    # Decimals, sets y binarios pasan a tipos JSON en una sola pasada
+    rows = json.loads(ddb_json.dumps(items))
+    names = sorted({name for row in rows for name in row})
+    columns = {name: [row.get(name) for row in rows] for name in names}
+    if pyarrow is not None:
+        buffer = io.BytesIO()
+        pyarrow.parquet.write_table(pyarrow.table(columns), buffer, compression='zstd')
+        return buffer.getvalue(), PARQUET_EXT
+    return gzip.compress(json.dumps(columns, separators=(',', ':')).encode('utf-8')), COLUMNS_EXT
+
+
+def decode_columns(data, key):
+    """Vuelve a filas un archivo escrito por `encode_columns`"""
+    if key.endswith(PARQUET_EXT):
+        if pyarrow is None:
+            raise RuntimeError(f'pyarrow es necesario para leer {key}')
+        columns = pyarrow.parquet.read_table(io.BytesIO(data)).to_pydict()
+    else:
+        columns = json.loads(gzip.decompress(data))
+    names = list(columns)
+    count = len(columns[names[0]]) if names else 0
+    return [
+        {name: columns[name][i] for name in names if columns[name][i] is not None}
+        for i in range(count)
+    ]
+
+
+def partition_prefix(created_at):
+    day = datetime.fromtimestamp(int(created_at), tz=timezone.utc)
+    return f'{ARCHIVE_PREFIX}year={day.year}/month={day.month:02d}/'
+
+
+# ==================== JOB DE ARCHIVO ====================
+
+def _archive_candidates(cutoff):
+    """Incidentes archivables vía StatusIndex (sin scan de la tabla)"""
+    candidates = []
+    for status in ARCHIVE_STATUSES:
+        kwargs = {
+            'IndexName': 'StatusIndex',
+            'KeyConditionExpression': Key('status').eq(status) & Key('createdAt').lt(cutoff),
+            # Un incidente viejo pero modificado hace poco todavía está "caliente"
+            'FilterExpression': Attr('updatedAt').lt(cutoff) | Attr('updatedAt').not_exists(),
+        }
+        while len(candidates) < ARCHIVE_MAX_ITEMS:
+            resp = table.query(**kwargs)
+            candidates.extend(resp.get('Items', []))
+            if not resp.get('LastEvaluatedKey'):
+                break
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+    return candidates[:ARCHIVE_MAX_ITEMS]
+
+
+def _mark_archived(items, now):
+    """
+    SET archivedAt en cada candidato, condicionado a que no haya cambiado desde
+    el Query. Devuelve los marcados; los que cambiaron siguen calientes.
+    """
+    # El client del resource es thread-safe y serializa Attr y tipos nativos
+    client = table.meta.client
+
+    def mark(item):
+        unchanged = (Attr('updatedAt').eq(item['updatedAt']) if 'updatedAt' in item
+                     else Attr('updatedAt').not_exists())
+        try:
+            client.update_item(
+                TableName=TABLE,
+                Key={'incidentId': item['incidentId']},
+                UpdateExpression='SET #archivedAt = :now',
+                ConditionExpression=Attr('incidentId').exists() & unchanged,
+                ExpressionAttributeNames={'#archivedAt': ARCHIVED_AT},
+                ExpressionAttributeValues={':now': now}
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            return None
+        return dict(item, **{ARCHIVED_AT: now})
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=ARCHIVE_WRITE_WORKERS) as pool:
+        return [item for item in pool.map(mark, items) if item is not None]
+
+
+def archive_old_incidents(store, now=None, after_days=None):
+    """Archiva y borra de la tabla caliente. Devuelve un resumen de la ejecución"""
+    now = int(time.time()) if now is None else now
+    after_days = ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    cutoff = now - after_days * 24 * 3600
+
+    partitions = {}
+    for item in _mark_archived(_archive_candidates(cutoff), now):
+        partitions.setdefault(partition_prefix(item.get('createdAt', 0)), []).append(item)
+
+    stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(now))
+    files, archived, failed = [], 0, 0
+    for prefix, items in sorted(partitions.items()):
+        data, ext = encode_columns(items)
+        files.append(store.put(f'{prefix}part-{stamp}-{uuid.uuid4().hex[:8]}{ext}', data))
+        # Solo se borra lo que ya quedó escrito en el archivo
+        deletes = [{'DeleteRequest': {'Key': {'incidentId': item['incidentId']}}} for item in items]
+        for req, reason in batch_write(ddb, TABLE, deletes):
+            print(f"No se pudo borrar {req['DeleteRequest']['Key']['incidentId']}: {reason}")
+            failed += 1
+        archived += len(items)
+    return {'archived': archived, 'failedDeletes': failed, 'files': files}
+
+
+def archive_incidents(event, context):
+    """Job programado (EventBridge) de archivo"""
+    result = archive_old_incidents(default_store())
+    print(f"Archivados {result['archived']} incidentes en {len(result['files'])} archivos")
+    return result
+
+
+# ==================== LECTURA ====================
+
+@lru_cache(maxsize=64)
+def _read_file(store, key):
+    # Los archivos nunca se reescriben: cachear por key es seguro
+    return tuple(decode_columns(store.get(key), key))
+
+
+def _partitions(store, params):
+    """Prefijos de partición a leer, del más reciente al más antiguo (lazy)"""
+    year, month = params.get('year'), params.get('month')
+    if month and not year:
+        raise ValueError('month requiere year')
+    if year and month:
+        yield f'{ARCHIVE_PREFIX}year={int(year)}/month={int(month):02d}/'
+        return
+    years = [f'{ARCHIVE_PREFIX}year={int(year)}/'] if year else sorted(store.children(ARCHIVE_PREFIX), reverse=True)
+    for year_prefix in years:
+        yield from sorted(store.children(year_prefix), reverse=True)
+
+
+def _matches(row, params):
+    for name in ARCHIVE_FILTERS:
+        if params.get(name) and row.get(name) != params[name]:
+            return False
+    if params.get('location'):
+        _, prefix, _ = location_query(params['location'])
+        key = row.get('locationKey', '')
+        return key == prefix or key.startswith(prefix + '#')
+    return True
+
+
+def read_partition(store, prefix, params):
+    """Filas archivadas de una partición que cumplen los filtros, más recientes primero y sin duplicados"""
+    keys = [k for k in store.list(prefix) if k.endswith((PARQUET_EXT, COLUMNS_EXT))]
+    with ThreadPoolExecutor(max_workers=ARCHIVE_READ_WORKERS) as pool:
+        files = list(pool.map(lambda key: _read_file(store, key), keys))
+
+    # Si un borrado falló el incidente se vuelve a archivar: queda la versión más nueva.
+    # Un incidente siempre cae en la partición de su createdAt, así que alcanza con deduplicar acá
+    latest = {}
+    for rows in files:
+        for row in rows:
+            current = latest.get(row['incidentId'])
+            if current is None or row.get('updatedAt', 0) >= current.get('updatedAt', 0):
+                latest[row['incidentId']] = row
+    rows = [row for row in latest.values() if _matches(row, params)]
+    return sorted(rows, key=lambda row: row.get('createdAt', 0), reverse=True)
+
+
+def read_page(store, params, limit, state=None):
+    """
+    Una página del archivo: recorre las particiones desde la del cursor y se
+    detiene al llenar `limit` o tras leer ARCHIVE_PAGE_PARTITIONS particiones
+    (con filtros muy selectivos la página puede volver incompleta). Devuelve
+    (filas, estado del próximo cursor o None).
+    """
+    state = state or {}
+    start, offset = state.get('p'), state.get('o', 0)
+    page, read = [], 0
+    for prefix in _partitions(store, params):
+        if start and prefix > start:
+            continue  # ya devuelta en páginas anteriores
+        if len(page) >= limit or read >= ARCHIVE_PAGE_PARTITIONS:
+            return page, {'p': prefix, 'o': 0}
+        rows = read_partition(store, prefix, params)
+        read += 1
+        skip = offset if prefix == start else 0
+        taken = rows[skip:skip + limit - len(page)]
+        page.extend(taken)
+        if skip + len(taken) < len(rows):
+            return page, {'p': prefix, 'o': skip + len(taken)}
+    return page, None
+
+
+_default_store = None
+
+
+def list_archived(params, store=None):
+    """Respuesta de GET /incidents?archived=true"""
+    global _default_store
+    try:
+        limit = parse_limit(params.get('limit'))
+        scope = 'archive|' + '|'.join(f'{k}={params[k]}' for k in sorted(params) if k not in ('cursor', 'limit'))
+        state = decode_cursor(params.get('cursor'), scope)
+        if params.get('location'):
+            location_query(params['location'])
+        if store is None:
+            _default_store = _default_store or default_store()
+            store = _default_store
+        page, next_state = read_page(store, params, limit, state)
+    except ValueError as e:  # limit, year/month, location o InvalidCursor
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': str(e)})
+        }
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': ddb_json.dumps({
+            'incidents': page,
+            'count': len(page),
+            'archived': True,
+            'nextCursor': encode_cursor(next_state, scope) if next_state else None
+        })
+    }
+
+
+if __name__ == '__main__':
+    # Uso local: ARCHIVE_DIR=./archive python archive.py [dias]
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    summary = archive_old_incidents(default_store(), after_days=days)
+    print(json.dumps(summary, indent=2))
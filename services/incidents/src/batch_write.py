@@ -0,0 +1,54 @@
+"""
+Escritura en lote con BatchWriteItem.
+
+Parte las operaciones en chunks de 25 (el máximo de DynamoDB) y reintenta los
+UnprocessedItems con backoff exponencial y jitter completo. Devuelve las
+operaciones que no se pudieron escribir para que el llamador reporte el
+resultado por item.
+"""
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+BATCH_WRITE_MAX_ITEMS = 25
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def backoff(attempt, base_delay, max_delay):
+    """Espera del intento `attempt` (desde 0): exponencial con jitter completo"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def batch_write(ddb, table_name, requests, max_attempts=5, base_delay=0.05, max_delay=2.0, sleep=time.sleep):
+    """
+    Escribe `requests` ({'PutRequest': ...} o {'DeleteRequest': ...}) en `table_name`.
+
+    `ddb` es el resource (o client) de DynamoDB. Devuelve una lista de
+    (request, motivo) con las operaciones que fallaron.
+    """
+    failed = []
+    for chunk in _chunks(list(requests), BATCH_WRITE_MAX_ITEMS):
+        pending = chunk
+        for attempt in range(max_attempts):
+            try:
+                resp = ddb.batch_write_item(RequestItems={table_name: pending})
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code', '')
+                if code not in ('ProvisionedThroughputExceededException', 'ThrottlingException',
+                                'RequestLimitExceeded', 'InternalServerError'):
+                    failed.extend((req, code or str(e)) for req in pending)
+                    pending = []
+                    break
+            else:
+                pending = resp.get('UnprocessedItems', {}).get(table_name, [])
+                if not pending:
+                    break
+            if attempt + 1 < max_attempts:
+                sleep(backoff(attempt, base_delay, max_delay))
+        failed.extend((req, 'UnprocessedItems tras reintentos') for req in pending)
+    return failed
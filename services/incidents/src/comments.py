@@ -6,10 +6,36 @@ import os
 import time
 from datetime import datetime
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+import ddb_json
 from ulid import ULID
+from pagination import InvalidCursor, decode_cursor, encode_cursor, fetch_page, parse_limit
+from sync import updated_shard
 
 dynamodb = boto3.resource('dynamodb')
-incidents_table = dynamodb.Table(os.environ.get('INCIDENTS_TABLE', 'AlertaUTEC-Incidents'))
+INCIDENTS_TABLE = os.environ.get('INCIDENTS_TABLE', 'AlertaUTEC-Incidents')
+incidents_table = dynamodb.Table(INCIDENTS_TABLE)
+# Comentarios: PK incidentId, SK COMMENT#<ulid>. Un Query por incidente los trae en orden de creación
+COMMENTS_TABLE = os.environ.get('COMMENTS_TABLE', 'AlertaUTEC-Comments')
+comments_table = dynamodb.Table(COMMENTS_TABLE)
+
+COMMENT_SK_PREFIX = 'COMMENT#'
+ENTITY_TYPE_COMMENT = 'COMMENT'
+COMMENT_ID_PREFIX = 'comment_'
+
+
+def comment_sort_key(comment_id):
+    """comment_01jd... -> COMMENT#01JD... (el ULID ordena por tiempo de creación)"""
+    return COMMENT_SK_PREFIX + comment_id.removeprefix(COMMENT_ID_PREFIX).upper()
+
+
+def _cancelled_by_condition(error, index):
+    """True si la transacción se canceló porque falló la condición del item `index`"""
+    if error.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+        return False
+    reasons = error.response.get('CancellationReasons') or []
+    return index < len(reasons) and reasons[index].get('Code') == 'ConditionalCheckFailed'
 
 
 def _response(status_code, body):
@@ -21,7 +47,7 @@ def _response(status_code, body):
             'Access-Control-Allow-Headers': 'Content-Type,Authorization',
             'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
         },
-        'body': json.dumps(body)
+        'body': ddb_json.dumps(body)
     }
 
 
@@ -42,17 +68,13 @@ def create_comment(event, context):
         if len(comment_text) > 1000:
             return _response(400, {'error': 'El comentario no puede exceder 1000 caracteres'})
         
-        # Verificar que el incidente existe
-        incident_response = incidents_table.get_item(Key={'incidentId': incident_id})
-        if 'Item' not in incident_response:
-            return _response(404, {'error': 'Incidente no encontrado'})
-        
         # Obtener info del usuario (de JWT o query params por ahora)
         user_id = body.get('userId', 'anon')
         user_name = body.get('userName', 'Anónimo')
         
         # Crear comentario
-        comment_id = f"comment_{str(ULID()).lower()}"
+        ulid = str(ULID())
+        comment_id = f"{COMMENT_ID_PREFIX}{ulid.lower()}"
         timestamp = int(time.time())
         
         comment_item = {
@@ -64,18 +86,27 @@ def create_comment(event, context):
             'createdAt': timestamp,
         }
         
-        # Guardar como item separado con SK para permitir queries
-        # Usamos GSI o estructura pk=incidentId, sk=COMMENT#commentId
-        incidents_table.put_item(Item={
-            'incidentId': f"{incident_id}#COMMENT#{comment_id}",
-            'commentId': comment_id,
-            'parentIncidentId': incident_id,
-            'userId': user_id,
-            'userName': user_name,
-            'comment': comment_text,
-            'createdAt': timestamp,
-            'type': 'comment'
-        })
+        # Un solo round trip: el Update exige que el incidente exista y le suma el comentario
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Update': {
+                    'TableName': INCIDENTS_TABLE,
+                    'Key': {'incidentId': incident_id},
+                    'UpdateExpression': 'ADD commentCount :one SET lastCommentAt = :ts, updatedAt = :ts, '
+                                        'updatedShard = if_not_exists(updatedShard, :shard)',
+                    'ConditionExpression': 'attribute_exists(incidentId)',
+                    'ExpressionAttributeValues': {':one': 1, ':ts': timestamp, ':shard': updated_shard(incident_id)}
+                }},
+                {'Put': {
+                    'TableName': COMMENTS_TABLE,
+                    'Item': dict(comment_item, sk=COMMENT_SK_PREFIX + ulid, entityType=ENTITY_TYPE_COMMENT),
+                    'ConditionExpression': 'attribute_not_exists(sk)'
+                }}
+            ])
+        except ClientError as e:
+            if _cancelled_by_condition(e, 0):
+                return _response(404, {'error': 'Incidente no encontrado'})
+            raise
         
         return _response(201, comment_item)
         
@@ -94,36 +125,34 @@ def list_comments(event, context):
     try:
         incident_id = event['pathParameters']['incidentId']
         
-        # Verificar que el incidente existe
-        incident_response = incidents_table.get_item(Key={'incidentId': incident_id})
-        if 'Item' not in incident_response:
-            return _response(404, {'error': 'Incidente no encontrado'})
-        
-        # Buscar todos los comentarios (usando begins_with en incidentId)
-        response = incidents_table.query(
-            IndexName='IncidentTypeIndex',  # Necesitaremos agregar este GSI
-            KeyConditionExpression='parentIncidentId = :iid AND #t = :type',
-            ExpressionAttributeNames={'#t': 'type'},
-            ExpressionAttributeValues={
-                ':iid': incident_id,
-                ':type': 'comment'
-            },
-            ScanIndexForward=False  # Ordenar por más reciente primero
-        )
-        
-        comments = response.get('Items', [])
-        
-        # Si no hay GSI, hacer scan filtrado (menos eficiente)
-        if not comments:
-            response = incidents_table.scan(
-                FilterExpression='begins_with(incidentId, :prefix) AND #t = :type',
-                ExpressionAttributeNames={'#t': 'type'},
-                ExpressionAttributeValues={
-                    ':prefix': f"{incident_id}#COMMENT#",
-                    ':type': 'comment'
-                }
+        params = event.get('queryStringParameters') or {}
+        try:
+            limit = parse_limit(params.get('limit'))
+        except ValueError as e:
+            return _response(400, {'error': str(e)})
+        
+        scope = f'comments|{incident_id}'
+        start_key = None
+        if params.get('cursor'):
+            try:
+                start_key = decode_cursor(params['cursor'], scope)
+            except InvalidCursor as e:
+                return _response(400, {'error': str(e)})
+        
+        # Un solo Query sobre la partición del incidente, más reciente primero
+        comments, last_key = fetch_page(comments_table.query, {
+            'KeyConditionExpression': Key('incidentId').eq(incident_id) & Key('sk').begins_with(COMMENT_SK_PREFIX),
+            'ScanIndexForward': False
+        }, limit, start_key, ('incidentId', 'sk'))
+        
+        # Solo un hilo vacío paga la lectura del incidente para distinguir 404 de "sin comentarios"
+        if not comments and not start_key:
+            incident_response = incidents_table.get_item(
+                Key={'incidentId': incident_id},
+                ProjectionExpression='incidentId'
             )
-            comments = response.get('Items', [])
+            if 'Item' not in incident_response:
+                return _response(404, {'error': 'Incidente no encontrado'})
         
         # Formatear respuesta
         formatted_comments = []
@@ -136,13 +165,11 @@ def list_comments(event, context):
                 'createdAt': c.get('createdAt'),
             })
         
-        # Ordenar por fecha descendente
-        formatted_comments.sort(key=lambda x: x.get('createdAt', 0), reverse=True)
-        
         return _response(200, {
             'incidentId': incident_id,
             'comments': formatted_comments,
-            'count': len(formatted_comments)
+            'count': len(formatted_comments),
+            'nextCursor': encode_cursor(last_key, scope)
         })
         
     except KeyError as e:
@@ -161,10 +188,35 @@ def delete_comment(event, context):
         incident_id = event['pathParameters']['incidentId']
         comment_id = event['pathParameters']['commentId']
         
-        # Eliminar comentario
-        incidents_table.delete_item(
-            Key={'incidentId': f"{incident_id}#COMMENT#{comment_id}"}
-        )
+        key = {'incidentId': incident_id, 'sk': comment_sort_key(comment_id)}
+        
+        # Borrar el comentario y descontarlo del incidente en una transacción
+        # (lastCommentAt se conserva: sigue siendo la última actividad del hilo)
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Delete': {
+                    'TableName': COMMENTS_TABLE,
+                    'Key': key,
+                    'ConditionExpression': 'attribute_exists(sk)'
+                }},
+                {'Update': {
+                    'TableName': INCIDENTS_TABLE,
+                    'Key': {'incidentId': incident_id},
+                    'UpdateExpression': 'ADD commentCount :minus SET updatedAt = :ts, '
+                                        'updatedShard = if_not_exists(updatedShard, :shard)',
+                    'ConditionExpression': 'attribute_exists(incidentId)',
+                    'ExpressionAttributeValues': {
+                        ':minus': -1, ':ts': int(time.time()), ':shard': updated_shard(incident_id)
+                    }
+                }}
+            ])
+        except ClientError as e:
+            if _cancelled_by_condition(e, 0):
+                return _response(404, {'error': 'Comentario no encontrado'})
+            if not _cancelled_by_condition(e, 1):
+                raise
+            # El incidente ya no existe: el comentario quedó huérfano y no hay contador que ajustar
+            comments_table.delete_item(Key=key)
         
         return _response(200, {'message': 'Comentario eliminado exitosamente'})
         
@@ -0,0 +1,209 @@
+"""
+Exportación completa de incidentes a NDJSON (un incidente por línea).
+
+Hace un Scan paralelo (Segment/TotalSegments) de EntityTypeIndex, filtrado a
+entityType = INCIDENT, sobre un pool acotado de threads. Cada página se convierte y se escribe al sink apenas llega, así la
+memoria queda acotada a ~una página por worker más el buffer del sink, sin
+importar el tamaño de la tabla.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+import ddb_json
+from handlers import TABLE, get_claims
+from query_planner import ENTITY_INDEX, ENTITY_TYPE_INCIDENT
+
+EXPORT_SEGMENTS = int(os.environ.get('EXPORT_SEGMENTS', '16'))
+EXPORT_MAX_WORKERS = int(os.environ.get('EXPORT_MAX_WORKERS', '8'))
+EXPORT_BUCKET = os.environ.get('EXPORT_BUCKET')
+EXPORT_PREFIX = os.environ.get('EXPORT_PREFIX', 'exports/')
+# Endpoint opcional para stores compatibles con S3 (MinIO, LocalStack)
+EXPORT_S3_ENDPOINT = os.environ.get('EXPORT_S3_ENDPOINT')
+EXPORT_ALLOWED_ROLES = ('authority',)
+
+# S3 exige partes de al menos 5 MB (salvo la última)
+PART_SIZE = 8 * 1024 * 1024
+
+_des = TypeDeserializer()
+
+
+class FileSink:
+    """Escribe el NDJSON en un archivo local"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = open(path, 'wb')
+
+    def write(self, chunk):
+        with self._lock:
+            self._fh.write(chunk)
+
+    def close(self):
+        self._fh.close()
+        return self.path
+
+    def abort(self):
+        self._fh.close()
+        os.remove(self.path)
+
+
+class S3Sink:
+    """Sube el NDJSON a S3 (o compatible) por multipart upload, parte a parte"""
+
+    def __init__(self, bucket, key, client=None):
+        self.bucket = bucket
+        self.key = key
+        self._s3 = client or boto3.client('s3', endpoint_url=EXPORT_S3_ENDPOINT)
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._parts = []
+        self._next_part = 1
+        resp = self._s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType='application/x-ndjson')
+        self._upload_id = resp['UploadId']
+
+    def _take_part(self, force=False):
+        # Se llama con el lock tomado: reserva número de parte y vacía el buffer
+        if not self._buffer or (len(self._buffer) < PART_SIZE and not force):
+            return None, None
+        data, self._buffer = bytes(self._buffer), bytearray()
+        part_number, self._next_part = self._next_part, self._next_part + 1
+        return part_number, data
+
+    def _upload(self, part_number, data):
+        resp = self._s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                    PartNumber=part_number, Body=data)
+        with self._lock:
+            self._parts.append({'PartNumber': part_number, 'ETag': resp['ETag']})
+
+    def write(self, chunk):
+        with self._lock:
+            self._buffer += chunk
+            part_number, data = self._take_part()
+        # La subida ocurre fuera del lock para que los demás workers sigan escribiendo
+        if data:
+            self._upload(part_number, data)
+
+    def close(self):
+        with self._lock:
+            part_number, data = self._take_part(force=True)
+        if data:
+            self._upload(part_number, data)
+        if not self._parts:
+            # Exportación vacía: multipart no admite cero partes
+            self._s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._s3.put_object(Bucket=self.bucket, Key=self.key, Body=b'', ContentType='application/x-ndjson')
+        else:
+            self._s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={'Parts': sorted(self._parts, key=lambda p: p['PartNumber'])}
+            )
+        return f's3://{self.bucket}/{self.key}'
+
+    def abort(self):
+        self._s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+
+def _to_ndjson(raw_items):
+    return b''.join(
+        ddb_json.dumpb({k: _des.deserialize(v) for k, v in raw.items()}) + b'\n'
+        for raw in raw_items
+    )
+
+
+def export_table(sink, table_name=TABLE, total_segments=EXPORT_SEGMENTS, max_workers=EXPORT_MAX_WORKERS, client=None):
+    """Escanea la tabla en paralelo y escribe todos los incidentes en `sink`. Devuelve el total exportado"""
+    # El cliente de bajo nivel es thread-safe; los resources de boto3 no lo son
+    client = client or boto3.client('dynamodb')
+
+    def scan_segment(segment):
+        kwargs = {
+            'TableName': table_name,
+            # EntityTypeIndex tiene cualquier item con entityType y createdAt (no solo
+            # incidentes): el filtro deja afuera tombstones y otros tipos
+            'IndexName': ENTITY_INDEX.name,
+            'FilterExpression': '#type = :incident',
+            'ExpressionAttributeNames': {'#type': 'entityType'},
+            'ExpressionAttributeValues': {':incident': {'S': ENTITY_TYPE_INCIDENT}},
+            'Segment': segment,
+            'TotalSegments': total_segments,
+        }
+        exported = 0
+        while True:
+            resp = client.scan(**kwargs)
+            items = resp.get('Items', [])
+            if items:
+                sink.write(_to_ndjson(items))
+                exported += len(items)
+            last_key = resp.get('LastEvaluatedKey')
+            if not last_key:
+                return exported
+            kwargs['ExclusiveStartKey'] = last_key
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, total_segments)) as pool:
+        return sum(pool.map(scan_segment, range(total_segments)))
+
+
+def export_incidents(event, context):
+    """
+    POST /incidents/export
+    Exporta todos los incidentes a S3 como NDJSON (solo autoridades)
+    """
+    claims = get_claims(event)
+    if claims.get('role') not in EXPORT_ALLOWED_ROLES:
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Forbidden'})
+        }
+    if not EXPORT_BUCKET:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'EXPORT_BUCKET no configurado'})
+        }
+
+    sink = None
+    try:
+        started = time.time()
+        key = f"{EXPORT_PREFIX}incidents-{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{uuid.uuid4().hex[:8]}.ndjson"
+        sink = S3Sink(EXPORT_BUCKET, key)
+        count = export_table(sink)
+        location = sink.close()
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'location': location,
+                'count': count,
+                'elapsedMs': int((time.time() - started) * 1000)
+            })
+        }
+    except Exception as e:
+        print(f'Error exporting incidents: {e}')
+        if sink:
+            sink.abort()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Internal server error'})
+        }
+
+
+if __name__ == '__main__':
+    # Uso local: python export.py incidents.ndjson
+    output = sys.argv[1] if len(sys.argv) > 1 else 'incidents.ndjson'
+    file_sink = FileSink(output)
+    total = export_table(file_sink)
+    print(f'{total} incidentes exportados a {file_sink.close()}')
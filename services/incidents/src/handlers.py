@@ -20,25 +20,31 @@ def dummy_authorizer(event, context):
 import os
 import json
 import boto3
+import ddb_json
 import uuid
 import time
-from decimal import Decimal
-from boto3.dynamodb.conditions import Key
+from archive import list_archived
+from batch_write import batch_write
+from location import location_attributes
+from query_planner import ENTITY_TYPE_INCIDENT, plan_list_query
+from pagination import decode_cursor, encode_cursor, fetch_page, parse_limit
+from response_cache import ResponseCache, cache_key, etag_matches
+from sync import fetch_changes, parse_since, split_changes, updated_shard
 
 ddb = boto3.resource('dynamodb')
 TABLE = os.environ.get('INCIDENTS_TABLE', 'AlertaUTEC-Incidents')
 table = ddb.Table(TABLE)
+STATS_TABLE = os.environ.get('STATS_TABLE', 'AlertaUTEC-IncidentStats')
+stats_table = ddb.Table(STATS_TABLE)
+STATS_ID = 'GLOBAL'
+BATCH_MAX_INCIDENTS = int(os.environ.get('BATCH_MAX_INCIDENTS', '100'))
 
-# Utilidad para convertir Decimals de DynamoDB a tipos JSON serializables
-def decimal_to_number(obj):
-    """Convierte objetos Decimal a int o float recursivamente"""
-    if isinstance(obj, list):
-        return [decimal_to_number(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: decimal_to_number(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
+# Cache de GET /incidents dentro del contenedor caliente
+LIST_CACHE_TTL = float(os.environ.get('LIST_CACHE_TTL', '5'))
+LIST_CACHE_MAX_ENTRIES = int(os.environ.get('LIST_CACHE_MAX_ENTRIES', '256'))
+# Si está activo, un cambio del contador `version` de la tabla de stats invalida la cache
+LIST_CACHE_VERSION_CHECK = os.environ.get('LIST_CACHE_VERSION_CHECK', 'false').lower() == 'true'
+list_cache = ResponseCache(LIST_CACHE_MAX_ENTRIES, LIST_CACHE_TTL)
 
 # Utilidad para extraer claims del contexto de API Gateway
 
@@ -55,6 +61,40 @@ def get_claims(event):
         }
     return {}
 
+# Construir y validar un incidente (compartido por create_incident y el batch)
+
+def build_incident(body, claims, now):
+    """Devuelve (item, None) o (None, mensaje de error)"""
+    if not isinstance(body, dict):
+        return None, 'el incidente debe ser un objeto'
+    if not body.get('titulo'):
+        return None, 'titulo es requerido'
+    if not body.get('ubicacion'):
+        return None, 'ubicacion es requerida'
+    
+    incident_id = body.get('incidentId') or f"inc_{str(uuid.uuid4())[:8]}"
+    
+    item = {
+        'incidentId': incident_id,
+        'entityType': ENTITY_TYPE_INCIDENT,
+        'status': body.get('status') or 'open',
+        'urgencia': body.get('urgencia') or 'medium',
+        'ubicacion': body.get('ubicacion'),
+        'titulo': body.get('titulo'),
+        'descripcion': body.get('descripcion', ''),
+        'reporterId': claims.get('sub') or body.get('reporterId') or 'anon',
+        'reporterEmail': claims.get('email') or '',
+        'createdAt': now,
+        'updatedAt': now,
+        # Shard de escritura de UpdatedAtIndex (sync incremental)
+        'updatedShard': updated_shard(incident_id),
+        # Lo mantiene comments.py en la misma transacción que crea/borra cada comentario
+        'commentCount': 0
+    }
+    # Clave jerárquica para LocationIndex (consultas por edificio/piso/sala)
+    item.update(location_attributes(item['ubicacion']))
+    return item, None
+
 # Crear incidente
 
 def create_incident(event, context):
@@ -62,48 +102,95 @@ def create_incident(event, context):
         body = json.loads(event.get('body', '{}'))
         claims = get_claims(event)
         
-        # Validaciones básicas
-        if not body.get('titulo'):
+        item, error = build_incident(body, claims, int(time.time()))
+        if error:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': error})
+            }
+        
+        table.put_item(Item=item)
+        
+        return {
+            'statusCode': 201,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': ddb_json.dumps(item)
+        }
+    except Exception as e:
+        print(f'Error creating incident: {e}')
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Internal server error'})
+        }
+
+# Crear incidentes en lote (simulacros, integraciones de sensores)
+
+def batch_create_incidents(event, context):
+    try:
+        body = json.loads(event.get('body') or '{}')
+        claims = get_claims(event)
+        incidents = body.get('incidents') if isinstance(body, dict) else None
+        
+        if not isinstance(incidents, list) or not incidents:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'titulo es requerido'})
+                'body': json.dumps({'error': 'incidents debe ser una lista no vacía'})
             }
-        if not body.get('ubicacion'):
+        if len(incidents) > BATCH_MAX_INCIDENTS:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'ubicacion es requerida'})
+                'body': json.dumps({'error': f'máximo {BATCH_MAX_INCIDENTS} incidentes por batch'})
             }
         
-        incident_id = body.get('incidentId') or f"inc_{str(uuid.uuid4())[:8]}"
         now = int(time.time())
+        results = []
+        items = {}
+        for index, incident in enumerate(incidents):
+            item, error = build_incident(incident, claims, now)
+            if not error and item['incidentId'] in items:
+                error = 'incidentId duplicado en el batch'
+            if error:
+                results.append({'index': index, 'status': 'invalid', 'error': error})
+                continue
+            items[item['incidentId']] = item
+            results.append({'index': index, 'status': 'created', 'incidentId': item['incidentId']})
         
-        item = {
-            'incidentId': incident_id,
-            'status': body.get('status', 'open'),
-            'urgencia': body.get('urgencia', 'medium'),
-            'ubicacion': body.get('ubicacion'),
-            'titulo': body.get('titulo'),
-            'descripcion': body.get('descripcion', ''),
-            'reporterId': claims.get('sub', body.get('reporterId', 'anon')),
-            'reporterEmail': claims.get('email', ''),
-            'createdAt': now,
-            'updatedAt': now
-        }
-        
-        table.put_item(Item=item)
+        failed = batch_write(ddb, TABLE, [{'PutRequest': {'Item': item}} for item in items.values()])
+        failed_ids = {req['PutRequest']['Item']['incidentId']: reason for req, reason in failed}
+        for result in results:
+            if result.get('incidentId') in failed_ids:
+                result['status'] = 'failed'
+                result['error'] = failed_ids[result['incidentId']]
         
+        created = sum(1 for r in results if r['status'] == 'created')
         return {
-            'statusCode': 201,
+            'statusCode': 201 if created == len(results) else 207,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(decimal_to_number(item))
+            'body': json.dumps({
+                'results': results,
+                'created': created,
+                'invalid': sum(1 for r in results if r['status'] == 'invalid'),
+                'failed': len(failed_ids)
+            })
+        }
+    except json.JSONDecodeError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'JSON inválido'})
         }
     except Exception as e:
-        print(f'Error creating incident: {e}')
+        print(f'Error creating incidents batch: {e}')
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
@@ -119,9 +206,19 @@ def update_incident(event, context):
         claims = get_claims(event)
         
         update_expr = []
+        remove_expr = []
         expr_attr = {}
         expr_attr_names = {}
         
+        # status y urgencia son claves de GSI: DynamoDB rechaza un string vacío
+        for field in ('status', 'urgencia'):
+            if field in body and not (isinstance(body[field], str) and body[field].strip()):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': f'{field} no puede estar vacío'})
+                }
+        
         if 'status' in body:
             update_expr.append('#s = :status')
             expr_attr[':status'] = body['status']
@@ -132,23 +229,33 @@ def update_incident(event, context):
             expr_attr[':urgencia'] = body['urgencia']
             
         if 'assignedTo' in body:
-            update_expr.append('assignedTo = :assignedTo')
-            expr_attr[':assignedTo'] = body['assignedTo']
+            # assignedTo es clave de AssignedToIndex: un string vacío no se puede indexar
+            if body['assignedTo']:
+                update_expr.append('assignedTo = :assignedTo')
+                expr_attr[':assignedTo'] = body['assignedTo']
+            else:
+                remove_expr.append('assignedTo')
             
-        if not update_expr:
+        if not update_expr and not remove_expr:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
                 'body': json.dumps({'error': 'No fields to update'})
             }
         
-        # Agregar updatedAt automáticamente
+        # Agregar updatedAt automáticamente (y la shard de UpdatedAtIndex a incidentes antiguos)
         update_expr.append('updatedAt = :updatedAt')
         expr_attr[':updatedAt'] = int(time.time())
+        update_expr.append('updatedShard = if_not_exists(updatedShard, :updatedShard)')
+        expr_attr[':updatedShard'] = updated_shard(incident_id)
+        
+        update_expression = 'SET ' + ', '.join(update_expr)
+        if remove_expr:
+            update_expression += ' REMOVE ' + ', '.join(remove_expr)
         
         update_kwargs = {
             'Key': {'incidentId': incident_id},
-            'UpdateExpression': 'SET ' + ', '.join(update_expr),
+            'UpdateExpression': update_expression,
             'ExpressionAttributeValues': expr_attr,
             'ReturnValues': 'ALL_NEW'
         }
@@ -164,7 +271,7 @@ def update_incident(event, context):
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(decimal_to_number(resp['Attributes']))
+            'body': ddb_json.dumps(resp['Attributes'])
         }
     except KeyError:
         return {
@@ -180,25 +287,148 @@ def update_incident(event, context):
             'body': json.dumps({'error': 'Internal server error'})
         }
 
-# Consultar incidentes (todos o por status)
+def _data_version():
+    # GetItem proyectado sobre un solo atributo: mucho más barato que repetir el listado
+    try:
+        resp = stats_table.get_item(
+            Key={'statsId': STATS_ID},
+            ProjectionExpression='#v',
+            ExpressionAttributeNames={'#v': 'version'}
+        )
+        return int(resp.get('Item', {}).get('version', 0))
+    except Exception as e:
+        print(f'Error reading data version: {e}')
+        return None
+
+def _sync_incidents(params):
+    """GET /incidents?since=<updatedAt>: solo lo que cambió desde el watermark del cliente"""
+    try:
+        since = parse_since(params['since'])
+        limit = parse_limit(params.get('limit'))
+        scope = f'sync|{since}'
+        state = decode_cursor(params.get('cursor'), scope)
+    except ValueError as e:  # since/limit inválido o InvalidCursor
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    items, next_state, watermark = fetch_changes(since, limit, state)
+    incidents, deleted = split_changes(items)
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-store'
+        },
+        'body': ddb_json.dumps({
+            'incidents': incidents,
+            'deleted': deleted,
+            'count': len(incidents),
+            'nextCursor': encode_cursor(next_state, scope),
+            # El cliente guarda `watermark` y lo envía como `since` en el próximo sync
+            'watermark': watermark
+        })
+    }
+
+# Consultar incidentes (todos o filtrados por status, urgencia, reporterId, assignedTo, location)
 
 def list_incidents(event, context):
     try:
         params = event.get('queryStringParameters') or {}
-        status = params.get('status')
+        if params.get('since'):
+            return _sync_incidents(params)
+        if params.get('archived') == 'true':
+            return list_archived(params)
         
-        scan_kwargs = {}
-        if status:
-            scan_kwargs['FilterExpression'] = Key('status').eq(status)
+        try:
+            plan = plan_list_query(params)
+            limit = parse_limit(params.get('limit'))
+            start_key = decode_cursor(params.get('cursor'), plan.scope)
+        except ValueError as e:  # location no reconocida, limit inválido o InvalidCursor
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': str(e)})
+            }
         
-        resp = table.scan(**scan_kwargs)
-        items = resp.get('Items', [])
+        key = cache_key(params)
+        version = _data_version() if LIST_CACHE_VERSION_CHECK else None
+        cached = list_cache.get(key, version)
+        if cached is None:
+            items, last_key = fetch_page(getattr(table, plan.operation), plan.kwargs, limit, start_key,
+                                         plan.key_attributes)
+            
+            # Los índices por createdAt ya devuelven en orden descendente; LocationIndex
+            # no (en ese caso el orden solo se garantiza dentro de la página)
+            if not plan.ordered:
+                items.sort(key=lambda x: x.get('createdAt', 0), reverse=True)
+            
+            # Los Decimals se convierten durante la serialización, sin copiar los items
+            body = ddb_json.dumps({
+                'incidents': items,
+                'count': len(items),
+                'nextCursor': encode_cursor(last_key, plan.scope)
+            })
+            cached = list_cache.put(key, body, version)
         
-        # Convertir Decimals a números normales
-        items = decimal_to_number(items)
+        headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'ETag': cached.etag,
+            'Cache-Control': 'no-cache'
+        }
+        if etag_matches(event, cached.etag):
+            return {'statusCode': 304, 'headers': headers, 'body': ''}
         
-        # Ordenar por createdAt descendente
-        items.sort(key=lambda x: x.get('createdAt', 0), reverse=True)
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': cached.body
+        }
+    except Exception as e:
+        print(f'Error listing incidents: {e}')
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Internal server error'})
+        }
+
+# Estadísticas agregadas (mantenidas por el consumidor del stream stats_aggregator)
+
+def _stats_from_item(item):
+    stats = {
+        'total': item.get('total', 0),
+        'byStatus': {},
+        'byUrgencia': {},
+        'byEdificio': {},
+        'byStatusUrgencia': {},
+        'byStatusEdificio': {},
+        'updatedAt': item.get('updatedAt')
+    }
+    for key, value in item.items():
+        if '#' not in key or not value:
+            continue
+        parts = [p.split('#', 1) for p in key.split('|')]
+        if len(parts) == 1:
+            dimension, name = parts[0]
+            bucket = {'status': 'byStatus', 'urgencia': 'byUrgencia', 'edificio': 'byEdificio'}.get(dimension)
+            if bucket:
+                stats[bucket][name] = value
+        elif len(parts) == 2 and parts[0][0] == 'status':
+            status, (dimension, name) = parts[0][1], parts[1]
+            bucket = {'urgencia': 'byStatusUrgencia', 'edificio': 'byStatusEdificio'}.get(dimension)
+            if bucket:
+                stats[bucket].setdefault(status, {})[name] = value
+    return stats
+
+
+def get_stats(event, context):
+    try:
+        resp = stats_table.get_item(Key={'statsId': STATS_ID})
+        stats = _stats_from_item(resp.get('Item', {}))
         
         return {
             'statusCode': 200,
@@ -206,13 +436,10 @@ def list_incidents(event, context):
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
-                'incidents': items,
-                'count': len(items)
-            })
+            'body': ddb_json.dumps(stats)
         }
     except Exception as e:
-        print(f'Error listing incidents: {e}')
+        print(f'Error getting stats: {e}')
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
@@ -0,0 +1,91 @@
+"""
+Normalización de `ubicacion` a una clave jerárquica campus#edificio#piso#sala.
+
+`ubicacion` es texto libre ("Lab A101", "Edificio B - Lab 201"). Se extrae lo
+que se pueda reconocer y la clave se corta en el primer nivel desconocido,
+así "Edificio B" queda como UTEC#B y sigue apareciendo al consultar el
+edificio B. Convención de códigos: A101 = edificio A, piso A1, sala A101.
+"""
+import os
+import re
+import unicodedata
+
+DEFAULT_CAMPUS = os.environ.get('DEFAULT_CAMPUS', 'UTEC')
+
+_ROOM_CODE = re.compile(r'\b([a-z])[\s-]?(\d{3,4})\b')
+_BUILDING = re.compile(r'\b(?:edificio|pabellon|bloque|torre)\s+([a-z0-9]+)\b')
+_FLOOR = re.compile(r'\b(?:piso|nivel)\s+(\d{1,2})\b')
+_ROOM_NUMBER = re.compile(r'\b(\d{3,4})\b')
+_CODE = re.compile(r'^([a-z])(\d{0,4})$')
+
+
+def _fold(text):
+    normalized = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in normalized if not unicodedata.combining(c)).lower().strip()
+
+
+def _room_segments(building, digits):
+    # Los dígitos de la sala sin los dos últimos son el piso: 201 -> piso 2
+    return [building, building + digits[:-2], building + digits]
+
+
+def parse_location(ubicacion, campus=DEFAULT_CAMPUS):
+    """Devuelve la lista de segmentos reconocidos [campus, edificio, piso, sala]"""
+    text = _fold(ubicacion)
+    segments = [campus]
+
+    code = _ROOM_CODE.search(text)
+    if code:
+        return segments + _room_segments(code.group(1).upper(), code.group(2))
+
+    building = _BUILDING.search(text)
+    if not building:
+        return segments
+    segments.append(building.group(1).upper())
+
+    room = _ROOM_NUMBER.search(text[building.end():])
+    if room:
+        return segments[:1] + _room_segments(segments[1], room.group(1))
+    floor = _FLOOR.search(text)
+    if floor:
+        segments.append(segments[1] + floor.group(1))
+    return segments
+
+
+def location_key(ubicacion, campus=DEFAULT_CAMPUS):
+    return '#'.join(parse_location(ubicacion, campus))
+
+
+def location_attributes(ubicacion):
+    """Atributos de LocationIndex para un incidente"""
+    segments = parse_location(ubicacion)
+    return {'locationCampus': segments[0], 'locationKey': '#'.join(segments)}
+
+
+def location_query(value, campus=DEFAULT_CAMPUS):
+    """
+    Traduce el query param `location` a (campus, prefijo, exacto).
+
+    Acepta una ruta jerárquica ("UTEC#A#A1"), un código ("A", "A1", "A101")
+    o texto libre ("Edificio B"). `exacto` es True cuando apunta a una sala.
+    Lanza ValueError si no se reconoce al menos un edificio: degradar al campus
+    listaría todos los incidentes.
+    """
+    text = _fold(value)
+    if '#' in text:
+        segments = [s.upper() for s in text.split('#') if s]
+    else:
+        code = _CODE.match(text.replace(' ', ''))
+        if code:
+            building, digits = code.group(1).upper(), code.group(2)
+            if len(digits) >= 3:
+                segments = [campus] + _room_segments(building, digits)
+            elif digits:
+                segments = [campus, building, building + digits]
+            else:
+                segments = [campus, building]
+        else:
+            segments = parse_location(value, campus)
+    if len(segments) < 2:
+        raise ValueError(f'ubicación no reconocida: {value}')
+    return segments[0], '#'.join(segments), len(segments) >= 4
@@ -0,0 +1,194 @@
+"""
+Migraciones y backfills sobre la tabla de incidentes.
+
+Uso: python migrations.py <comando>
+"""
+import sys
+import time
+from collections import Counter
+
+from boto3.dynamodb.conditions import Attr
+
+from batch_write import batch_write
+from comments import COMMENTS_TABLE, ENTITY_TYPE_COMMENT, comment_sort_key, comments_table
+from handlers import STATS_ID, TABLE, ddb, stats_table, table
+from location import location_attributes
+from query_planner import ENTITY_INDEX, ENTITY_TYPE_INCIDENT
+from search import META_KEY, apply_change, search_table
+from sync import updated_shard
+
+
+def _scan_all(**kwargs):
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get('Items', [])
+        last_key = resp.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def backfill_location_keys():
+    """Agrega locationCampus/locationKey a incidentes creados antes de LocationIndex"""
+    updated = 0
+    items = _scan_all(
+        FilterExpression=Attr('ubicacion').exists() & Attr('locationKey').not_exists(),
+        ProjectionExpression='incidentId, ubicacion'
+    )
+    for item in items:
+        attrs = location_attributes(item['ubicacion'])
+        table.update_item(
+            Key={'incidentId': item['incidentId']},
+            UpdateExpression='SET locationCampus = :campus, locationKey = :key',
+            ConditionExpression=Attr('incidentId').exists(),
+            ExpressionAttributeValues={':campus': attrs['locationCampus'], ':key': attrs['locationKey']}
+        )
+        updated += 1
+    return updated
+
+
+def backfill_entity_type():
+    """
+    Marca con entityType = INCIDENT los incidentes creados antes del discriminador,
+    para que entren en EntityTypeIndex. Los comentarios legacy se mueven con migrate-comments.
+    """
+    updated = 0
+    items = _scan_all(
+        FilterExpression=Attr('entityType').not_exists() & Attr('parentIncidentId').not_exists(),
+        ProjectionExpression='incidentId'
+    )
+    for item in items:
+        table.update_item(
+            Key={'incidentId': item['incidentId']},
+            UpdateExpression='SET entityType = :type',
+            ConditionExpression=Attr('incidentId').exists(),
+            ExpressionAttributeValues={':type': ENTITY_TYPE_INCIDENT}
+        )
+        updated += 1
+    return updated
+
+
+def backfill_updated_shards():
+    """Agrega updatedShard (y updatedAt si falta) para que los incidentes entren en UpdatedAtIndex"""
+    updated = 0
+    items = _scan_all(
+        IndexName=ENTITY_INDEX.name,
+        FilterExpression=Attr('entityType').eq(ENTITY_TYPE_INCIDENT) & Attr('updatedShard').not_exists(),
+        ProjectionExpression='incidentId, createdAt'
+    )
+    for item in items:
+        table.update_item(
+            Key={'incidentId': item['incidentId']},
+            UpdateExpression='SET updatedShard = :shard, updatedAt = if_not_exists(updatedAt, :createdAt)',
+            ConditionExpression=Attr('incidentId').exists(),
+            ExpressionAttributeValues={
+                ':shard': updated_shard(item['incidentId']),
+                ':createdAt': item.get('createdAt', 0)
+            }
+        )
+        updated += 1
+    return updated
+
+
+def rebuild_search_index():
+    """Indexa todos los incidentes existentes (idempotente) y recalcula el total de documentos"""
+    docs = 0
+    with search_table.batch_writer(overwrite_by_pkeys=['term', 'incidentId']) as batch:
+        for item in _scan_all(IndexName=ENTITY_INDEX.name, FilterExpression=Attr('entityType').eq(ENTITY_TYPE_INCIDENT)):
+            docs += apply_change(batch, {}, item)
+    search_table.put_item(Item=dict(META_KEY, count=docs))
+    return docs
+
+
+def migrate_comments():
+    """
+    Mueve los comentarios guardados como `<incidentId>#COMMENT#<commentId>` en la
+    tabla de incidentes a la tabla de comentarios (PK incidentId, SK COMMENT#<ulid>).
+    Escribe primero en la tabla nueva y borra el item antiguo solo si la copia quedó escrita.
+    """
+    legacy = list(_scan_all(FilterExpression=Attr('parentIncidentId').exists() & Attr('type').eq('comment')))
+    puts, deletes = [], {}
+    for item in legacy:
+        comment = {k: v for k, v in item.items() if k not in ('incidentId', 'parentIncidentId', 'type')}
+        comment['incidentId'] = item['parentIncidentId']
+        comment['sk'] = comment_sort_key(item['commentId'])
+        comment['entityType'] = ENTITY_TYPE_COMMENT
+        puts.append({'PutRequest': {'Item': comment}})
+        deletes[item['commentId']] = {'DeleteRequest': {'Key': {'incidentId': item['incidentId']}}}
+
+    for req, reason in batch_write(ddb, COMMENTS_TABLE, puts):
+        print(f"No se pudo copiar {req['PutRequest']['Item']['commentId']}: {reason}")
+        deletes.pop(req['PutRequest']['Item']['commentId'])
+    for req, reason in batch_write(ddb, TABLE, list(deletes.values())):
+        print(f"No se pudo borrar {req['DeleteRequest']['Key']['incidentId']}: {reason}")
+    return len(deletes)
+
+
+def backfill_comment_counts():
+    """Recalcula commentCount y lastCommentAt de cada incidente a partir de la tabla de comentarios"""
+    counts, last = {}, {}
+    kwargs = {'ProjectionExpression': 'incidentId, createdAt'}
+    while True:
+        resp = comments_table.scan(**kwargs)
+        for item in resp.get('Items', []):
+            incident_id = item['incidentId']
+            counts[incident_id] = counts.get(incident_id, 0) + 1
+            last[incident_id] = max(last.get(incident_id, 0), item.get('createdAt', 0))
+        if not resp.get('LastEvaluatedKey'):
+            break
+        kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    for incident_id, count in counts.items():
+        try:
+            table.update_item(
+                Key={'incidentId': incident_id},
+                UpdateExpression='SET commentCount = :n, lastCommentAt = :ts',
+                ConditionExpression=Attr('incidentId').exists(),
+                ExpressionAttributeValues={':n': count, ':ts': last[incident_id]}
+            )
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            print(f'{incident_id}: comentarios huérfanos ({count}), incidente inexistente')
+    return len(counts)
+
+
+def rebuild_stats():
+    """
+    Recalcula el item GLOBAL de stats desde la tabla, con las mismas claves que
+    services/realtime/src/stats_aggregator.counter_keys. Reemplaza el item
+    entero: descarta contadores viejos (p. ej. los `ubicacion#<texto>`).
+    Los cambios que entren por el stream durante el recorrido pueden quedar
+    contados dos veces o ninguna: correrlo con poco tráfico.
+    """
+    counts = Counter()
+    for item in _scan_all(IndexName=ENTITY_INDEX.name, ProjectionExpression='#s, urgencia, locationKey',
+                          FilterExpression=Attr('entityType').eq(ENTITY_TYPE_INCIDENT),
+                          ExpressionAttributeNames={'#s': 'status'}):
+        status = item.get('status') or 'unknown'
+        urgencia = item.get('urgencia') or 'unknown'
+        segments = (item.get('locationKey') or '').split('#')
+        edificio = segments[1] if len(segments) > 1 else 'unknown'
+        counts.update(('total', f'status#{status}', f'urgencia#{urgencia}', f'edificio#{edificio}',
+                       f'status#{status}|urgencia#{urgencia}', f'status#{status}|edificio#{edificio}'))
+    previous = stats_table.get_item(Key={'statsId': STATS_ID}).get('Item', {})
+    # La versión sigue creciendo: invalida el cache de GET /incidents
+    stats_table.put_item(Item=dict(counts, statsId=STATS_ID, updatedAt=int(time.time()),
+                                   version=previous.get('version', 0) + 1))
+    return counts['total']
+
+
+COMMANDS = {
+    'backfill-entity-type': backfill_entity_type,
+    'backfill-location-keys': backfill_location_keys,
+    'backfill-updated-shards': backfill_updated_shards,
+    'rebuild-search-index': rebuild_search_index,
+    'migrate-comments': migrate_comments,
+    'backfill-comment-counts': backfill_comment_counts,
+    'rebuild-stats': rebuild_stats,
+}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in COMMANDS:
+        print(f"Uso: python migrations.py [{' | '.join(COMMANDS)}]")
+        sys.exit(1)
+    print(f'{sys.argv[1]}: {COMMANDS[sys.argv[1]]()} items actualizados')
@@ -0,0 +1,145 @@
+"""
+Planificador de consultas para el listado de incidentes.
+
+Elige el GSI más selectivo según los query params recibidos. Cuando ningún
+índice aplica se consulta la partición entityType = INCIDENT de
+EntityTypeIndex, así el listado nunca lee otros tipos de item de la tabla.
+Los filtros que no forman parte de la clave del índice elegido se aplican
+como FilterExpression.
+"""
+from dataclasses import dataclass, field
+from functools import reduce
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from location import location_query
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    name: str
+    param: str
+    partition_key: str
+    sort_key: str = 'createdAt'
+    # Si la condición de clave es más amplia que el filtro pedido, se refina con FilterExpression
+    refine_with_filter = False
+
+    @property
+    def key_attributes(self):
+        """Atributos de un ExclusiveStartKey del índice: clave de la tabla más la del índice"""
+        return ('incidentId', self.partition_key, self.sort_key)
+
+    def key_condition(self, value):
+        return Key(self.partition_key).eq(value)
+
+    def filter_condition(self, value):
+        return Attr(self.partition_key).eq(value)
+
+
+@dataclass(frozen=True)
+class LocationIndexSpec(IndexSpec):
+    """Prefijo jerárquico campus#edificio#piso#sala sobre el sort key"""
+    # begins_with('UTEC#A') también trae 'UTEC#AB...': el filtro deja solo 'UTEC#A' y 'UTEC#A#...'
+    refine_with_filter = True
+
+    def key_condition(self, value):
+        campus, prefix, exact = location_query(value)
+        condition = Key(self.partition_key).eq(campus)
+        if prefix == campus:
+            return condition
+        if exact:
+            return condition & Key(self.sort_key).eq(prefix)
+        return condition & Key(self.sort_key).begins_with(prefix)
+
+    def filter_condition(self, value):
+        _, prefix, _ = location_query(value)
+        return Attr(self.sort_key).eq(prefix) | Attr(self.sort_key).begins_with(prefix + '#')
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    operation: str  # 'query' o 'scan'
+    kwargs: dict = field(default_factory=dict)
+    index: str = None
+    scope: str = ''  # identifica la consulta para ligar los cursores de paginación
+    ordered: bool = False  # True si DynamoDB ya devuelve por createdAt descendente
+    key_attributes: tuple = ()  # arman el cursor a partir del último item devuelto
+
+
+# Ordenados de más a menos selectivo: un reporter o un responsable tienen pocos
+# incidentes, una zona del campus algunos más, y urgencia y status solo tienen
+# un puñado de valores.
+INDEXES = (
+    IndexSpec('ReporterIndex', 'reporterId', 'reporterId'),
+    IndexSpec('AssignedToIndex', 'assignedTo', 'assignedTo'),
+    LocationIndexSpec('LocationIndex', 'location', 'locationCampus', 'locationKey'),
+    IndexSpec('UrgenciaIndex', 'urgencia', 'urgencia'),
+    IndexSpec('StatusIndex', 'status', 'status'),
+)
+
+# Discriminador de tipo de item; EntityTypeIndex tiene una partición por tipo
+ENTITY_TYPE_INCIDENT = 'INCIDENT'
+ENTITY_INDEX = IndexSpec('EntityTypeIndex', None, 'entityType')
+# archive.py lo setea justo antes de borrar un incidente archivado: en el REMOVE
+# del stream (OldImage) distingue un archivo de un borrado real
+ARCHIVED_AT = 'archivedAt'
+
+
+def is_incident(item):
+    """
+    True si el item es un incidente. Los items sin entityType son incidentes
+    previos al backfill, salvo los comentarios legacy (parentIncidentId o type).
+    """
+    if not item:
+        return False
+    if 'entityType' in item:
+        return item['entityType'] == ENTITY_TYPE_INCIDENT
+    return 'parentIncidentId' not in item and item.get('type') != 'comment'
+
+FILTERABLE_PARAMS = tuple(spec.param for spec in INDEXES)
+_SPECS_BY_PARAM = {spec.param: spec for spec in INDEXES}
+
+
+def _filters_from_params(params):
+    return {k: params[k] for k in FILTERABLE_PARAMS if params.get(k)}
+
+
+def _filter_expression(filters):
+    conditions = [_SPECS_BY_PARAM[name].filter_condition(value) for name, value in filters.items()]
+    return reduce(lambda acc, cond: acc & cond, conditions)
+
+
+def _scope(index, filters):
+    parts = [index or 'scan'] + [f'{k}={filters[k]}' for k in sorted(filters)]
+    return '|'.join(parts)
+
+
+def plan_list_query(params):
+    """Devuelve el QueryPlan para listar incidentes con los params dados"""
+    filters = _filters_from_params(params or {})
+
+    for spec in INDEXES:
+        if spec.param not in filters:
+            continue
+        remaining = dict(filters)
+        value = remaining[spec.param] if spec.refine_with_filter else remaining.pop(spec.param)
+        kwargs = {
+            'IndexName': spec.name,
+            'KeyConditionExpression': spec.key_condition(value),
+            # Con createdAt como sort key DynamoDB ya devuelve lo más reciente primero
+            'ScanIndexForward': False,
+        }
+        if remaining:
+            kwargs['FilterExpression'] = _filter_expression(remaining)
+        return QueryPlan('query', kwargs, spec.name, _scope(spec.name, filters),
+                         ordered=spec.sort_key == 'createdAt', key_attributes=spec.key_attributes)
+
+    kwargs = {
+        'IndexName': ENTITY_INDEX.name,
+        'KeyConditionExpression': ENTITY_INDEX.key_condition(ENTITY_TYPE_INCIDENT),
+        'ScanIndexForward': False,
+    }
+    if filters:
+        kwargs['FilterExpression'] = _filter_expression(filters)
+    return QueryPlan('query', kwargs, ENTITY_INDEX.name, _scope(ENTITY_INDEX.name, filters), ordered=True,
+                     key_attributes=ENTITY_INDEX.key_attributes)
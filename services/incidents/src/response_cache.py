@@ -0,0 +1,71 @@
+"""
+Cache de respuestas en memoria del contenedor Lambda (TTL + LRU) y ETags.
+
+Vive mientras el contenedor esté caliente: no se comparte entre contenedores,
+así que la obsolescencia máxima es el TTL configurado. Si se pasa una versión
+(el contador que el stream de incidentes incrementa en la tabla de stats),
+una entrada de otra versión se considera vencida aunque su TTL no lo esté.
+"""
+import hashlib
+import time
+from collections import OrderedDict, namedtuple
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'version', 'expires_at'])
+
+
+class ResponseCache:
+    def __init__(self, max_entries, ttl_seconds, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key, version=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self._clock() or entry.version != version:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, body, version=None):
+        entry = CacheEntry(body, compute_etag(body), version, self._clock() + self.ttl_seconds)
+        if self.enabled:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+
+def cache_key(params):
+    """Normaliza los query params: el orden y los valores vacíos no cambian la clave"""
+    return tuple(sorted((k, v) for k, v in (params or {}).items() if v not in (None, '')))
+
+
+def compute_etag(body):
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def etag_matches(event, etag):
+    """True si el If-None-Match del request incluye `etag`"""
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), None)
+    if not value:
+        return False
+    for candidate in (c.strip() for c in value.split(',')):
+        # If-None-Match usa comparación débil: W/"x" coincide con "x"
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
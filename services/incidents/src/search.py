@@ -0,0 +1,250 @@
+"""
+Búsqueda full-text sobre titulo y descripcion con un índice invertido.
+
+El índice vive en su propia tabla: cada término es una partición y cada
+posting un item (term, incidentId) con la frecuencia ponderada `tf` (el
+título pesa más que la descripción). Lo mantiene el sink `index_changes` del
+pipeline del stream (o `index_stream` como Lambda propio); `search_incidents`
+consulta una partición por término, rankea con BM25 simplificado y trae los
+incidentes con un BatchGetItem.
+"""
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+
+from boto3.dynamodb.types import TypeDeserializer
+
+import ddb_json
+from batch_write import backoff
+from handlers import TABLE, ddb
+from pagination import parse_limit
+from query_planner import ARCHIVED_AT, is_incident
+
+SEARCH_TABLE = os.environ.get('SEARCH_TABLE', 'AlertaUTEC-SearchIndex')
+search_table = ddb.Table(SEARCH_TABLE)
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+SEARCH_MAX_TERMS = 8
+TITLE_WEIGHT = 3
+# Lo único que miran is_incident, term_frequencies y _index (para el pipeline del stream)
+STREAM_FIELDS = frozenset({'incidentId', 'entityType', 'parentIncidentId', 'type', 'titulo', 'descripcion',
+                           ARCHIVED_AT})
+
+# Item con el total de documentos indexados (para el IDF)
+META_KEY = {'term': '__meta__', 'incidentId': 'docs'}
+
+STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun con contra cual cuando de del
+desde donde dos el ella ellas ellos en entre era es esa esas ese eso esos esta estaba estan estas este
+esto estos fue ha hay la las le les lo los mas me mi muy nada ni no nos o otra otro para pero poco por
+porque que se sea segun ser si sin sobre solo son su sus tambien tan te tiene todo todos tu un una unas
+uno unos y ya
+""".split())
+
+_WORD = re.compile(r'[a-z0-9]+')
+_des = TypeDeserializer()
+
+
+def _fold(text):
+    normalized = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in normalized if not unicodedata.combining(c)).lower()
+
+
+def _stem(word):
+    # Stemming liviano de plurales: luces -> luz, ascensores -> ascensor, fugas -> fuga
+    if len(word) > 4 and word.endswith('ces'):
+        return word[:-3] + 'z'
+    if len(word) > 4 and word.endswith('es') and word[-3] not in 'aeiou':
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Normaliza (minúsculas, sin tildes), separa, quita stopwords y plurales"""
+    return [_stem(w) for w in _WORD.findall(_fold(text)) if len(w) > 1 and w not in STOPWORDS]
+
+
+def term_frequencies(incident):
+    freqs = Counter()
+    for term in tokenize(incident.get('titulo')):
+        freqs[term] += TITLE_WEIGHT
+    freqs.update(tokenize(incident.get('descripcion')))
+    return freqs
+
+
+def _ddeserialize(dynamo_image):
+    if not dynamo_image:
+        return {}
+    return {k: _des.deserialize(v) for k, v in dynamo_image.items()}
+
+
+def apply_change(batch, old, new):
+    """Escribe en `batch` los cambios de postings entre dos versiones de un incidente. Devuelve el delta de documentos"""
+    old_freqs = term_frequencies(old) if is_incident(old) else Counter()
+    new_freqs = term_frequencies(new) if is_incident(new) else Counter()
+    incident_id = (new or old).get('incidentId')
+
+    for term in old_freqs.keys() - new_freqs.keys():
+        batch.delete_item(Key={'term': term, 'incidentId': incident_id})
+    for term, tf in new_freqs.items():
+        if old_freqs.get(term) != tf:
+            batch.put_item(Item={'term': term, 'incidentId': incident_id, 'tf': tf})
+
+    return int(bool(new_freqs)) - int(bool(old_freqs))
+
+
+def _index(pairs):
+    """Aplica al índice los pares (old, new) de imágenes decodificadas y ajusta el total de documentos"""
+    docs_delta = 0
+    with search_table.batch_writer(overwrite_by_pkeys=['term', 'incidentId']) as batch:
+        for event_type, old, new in pairs:
+            # Un incidente archivado se sigue pudiendo buscar: se conservan sus postings
+            # y search_incidents lo devuelve marcado como archivado
+            if event_type == 'REMOVE' and ARCHIVED_AT in old:
+                continue
+            docs_delta += apply_change(batch, old, new)
+    if docs_delta:
+        search_table.update_item(
+            Key=META_KEY,
+            UpdateExpression='ADD #c :d',
+            ExpressionAttributeNames={'#c': 'count'},
+            ExpressionAttributeValues={':d': docs_delta}
+        )
+
+
+def index_stream(event, context):
+    """Consumidor del stream de incidentes que mantiene el índice invertido"""
+    _index(
+        (rec['eventName'], _ddeserialize(rec['dynamodb'].get('OldImage')), _ddeserialize(rec['dynamodb'].get('NewImage')))
+        for rec in event.get('Records', []) if rec.get('eventName') in ('INSERT', 'MODIFY', 'REMOVE')
+    )
+
+
+def index_changes(changes, deadline=None):
+    """Sink `search` de services/realtime/src/stream_pipeline.py: recibe los cambios ya coalescidos"""
+    _index((c.event_type, c.old, c.new) for c in changes)
+    return []
+
+
+def _postings(term):
+    kwargs = {
+        'KeyConditionExpression': '#term = :t',
+        'ExpressionAttributeNames': {'#term': 'term'},
+        'ExpressionAttributeValues': {':t': term},
+        'ProjectionExpression': 'incidentId, tf'
+    }
+    while True:
+        resp = search_table.query(**kwargs)
+        for item in resp.get('Items', []):
+            yield item['incidentId'], int(item['tf'])
+        last_key = resp.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def rank(query_terms, postings_by_term, total_docs):
+    """
+    Ordena incidentes por términos coincidentes y luego por score BM25 (sin
+    normalización por largo). Devuelve [(incidentId, score)].
+    """
+    scores = Counter()
+    matches = Counter()
+    for term in query_terms:
+        postings = postings_by_term.get(term, [])
+        if not postings:
+            continue
+        df = len(postings)
+        idf = math.log(1 + (max(total_docs, df) - df + 0.5) / (df + 0.5))
+        for incident_id, tf in postings:
+            scores[incident_id] += idf * tf / (tf + 1.2)
+            matches[incident_id] += 1
+    return sorted(scores.items(), key=lambda kv: (matches[kv[0]], kv[1]), reverse=True)
+
+
+def _fetch_incidents(incident_ids, max_attempts=5, base_delay=0.05, max_delay=2.0, sleep=time.sleep):
+    """
+    BatchGetItem de los incidentes (a lo más 50 keys). Las UnprocessedKeys se
+    reintentan con el mismo backoff que batch_write; si quedan keys tras
+    `max_attempts` lanza RuntimeError: un incidente no leído no debe
+    reportarse como archivado.
+    """
+    if not incident_ids:
+        return {}
+    found = {}
+    request = {TABLE: {'Keys': [{'incidentId': i} for i in incident_ids]}}
+    for attempt in range(max_attempts):
+        resp = ddb.batch_get_item(RequestItems=request)
+        found.update({item['incidentId']: item for item in resp.get('Responses', {}).get(TABLE, [])})
+        request = resp.get('UnprocessedKeys') or {}
+        if not request:
+            return found
+        if attempt + 1 < max_attempts:
+            sleep(backoff(attempt, base_delay, max_delay))
+    raise RuntimeError(f"{len(request[TABLE]['Keys'])} incidentes sin leer tras {max_attempts} intentos")
+
+
+def search_incidents(event, context):
+    """
+    GET /incidents/search?q=...
+    Búsqueda por palabras en titulo y descripcion, ordenada por relevancia
+    """
+    try:
+        params = event.get('queryStringParameters') or {}
+        query = (params.get('q') or '').strip()
+        terms = list(dict.fromkeys(tokenize(query)))[:SEARCH_MAX_TERMS]
+        if not terms:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'q debe contener al menos una palabra significativa'})
+            }
+        try:
+            limit = parse_limit(params.get('limit'), SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': str(e)})
+            }
+
+        meta = search_table.get_item(Key=META_KEY).get('Item', {})
+        postings = {term: list(_postings(term)) for term in terms}
+        ranked = rank(terms, postings, int(meta.get('count', 0)))[:limit]
+
+        incidents = _fetch_incidents([incident_id for incident_id, _ in ranked])
+        results = []
+        for incident_id, score in ranked:
+            if incident_id in incidents:
+                results.append(dict(incidents[incident_id], score=round(score, 4)))
+            else:
+                # Ya no está en la tabla caliente: se lee con GET /incidents?archived=true
+                results.append({'incidentId': incident_id, 'archived': True, 'score': round(score, 4)})
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': ddb_json.dumps({
+                'query': query,
+                'terms': terms,
+                'results': results,
+                'count': len(results)
+            })
+        }
+    except Exception as e:
+        print(f'Error searching incidents: {e}')
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Internal server error'})
+        }
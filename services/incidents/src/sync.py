@@ -0,0 +1,175 @@
+"""
+Sincronización incremental: GET /incidents?since=<updatedAt>.
+
+Cada incidente lleva `updatedShard` (hash estable de su id módulo
+SYNC_SHARDS) y UpdatedAtIndex tiene PK updatedShard y SK updatedAt. Así las
+escrituras se reparten entre particiones y un sync consulta todas las shards
+en paralelo, leyendo solo lo que cambió en la ventana [since, watermark].
+
+Los borrados se registran como tombstones (entityType = TOMBSTONE) en la
+misma tabla e índice, escritos desde el stream por el sink `tombstone_changes`
+del pipeline (o `record_tombstones` como Lambda propio) y con TTL, para que
+los clientes también eliminen sus copias locales.
+"""
+import heapq
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+
+from query_planner import ARCHIVED_AT, is_incident
+
+ddb = boto3.resource('dynamodb')
+TABLE = os.environ.get('INCIDENTS_TABLE', 'AlertaUTEC-Incidents')
+table = ddb.Table(TABLE)
+
+SYNC_INDEX = 'UpdatedAtIndex'
+SYNC_SHARDS = int(os.environ.get('SYNC_SHARDS', '8'))
+# El GSI es eventualmente consistente: la ventana termina unos segundos antes de "ahora"
+SYNC_LAG_SECONDS = int(os.environ.get('SYNC_LAG_SECONDS', '2'))
+TOMBSTONE_TTL_SECONDS = int(os.environ.get('TOMBSTONE_TTL_SECONDS', str(30 * 24 * 3600)))
+
+ENTITY_TYPE_TOMBSTONE = 'TOMBSTONE'
+TOMBSTONE_PREFIX = 'TOMBSTONE#'
+# Lo único que mira tombstone_changes (para el pipeline del stream)
+STREAM_FIELDS = frozenset({'incidentId', 'entityType', 'parentIncidentId', 'type', ARCHIVED_AT})
+
+_des = TypeDeserializer()
+
+
+def updated_shard(incident_id):
+    """Shard de escritura de UpdatedAtIndex (estable entre despliegues y procesos)"""
+    return zlib.crc32(incident_id.encode('utf-8')) % SYNC_SHARDS
+
+
+def parse_since(value):
+    since = int(value)
+    if since < 0:
+        raise ValueError('since debe ser un timestamp no negativo')
+    return since
+
+
+def _index_key(item):
+    # ExclusiveStartKey de un GSI: clave de la tabla más la del índice
+    return {'incidentId': item['incidentId'], 'updatedShard': item['updatedShard'], 'updatedAt': item['updatedAt']}
+
+
+def _query_shard(shard, since, watermark, start_key, limit):
+    kwargs = {
+        'TableName': TABLE,
+        'IndexName': SYNC_INDEX,
+        'KeyConditionExpression': Key('updatedShard').eq(shard) & Key('updatedAt').between(since, watermark),
+        'Limit': limit,
+    }
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+    # El client del resource es thread-safe (el Table no) y serializa los tipos nativos
+    resp = ddb.meta.client.query(**kwargs)
+    return resp.get('Items', []), bool(resp.get('LastEvaluatedKey'))
+
+
+def fetch_changes(since, limit, state=None, now=None):
+    """
+    Devuelve (items, next_state, watermark) con los cambios de la ventana en orden de updatedAt.
+
+    `state` es None en la primera página; luego {'w': watermark, 's': {shard: start_key}}
+    con las shards pendientes. `next_state` es None cuando no quedan cambios. Todas las
+    páginas de un mismo sync comparten la ventana, y por lo tanto el watermark.
+    """
+    if state is None:
+        now = int(time.time()) if now is None else now
+        watermark = max(since, now - SYNC_LAG_SECONDS)
+        pending = {str(shard): None for shard in range(SYNC_SHARDS)}
+    else:
+        watermark, pending = state['w'], state['s']
+
+    # El límite se reparte entre las shards: una página lee a lo más ~limit items, no SYNC_SHARDS * limit
+    shard_limit = max(1, -(-limit // max(1, len(pending))))
+    with ThreadPoolExecutor(max_workers=max(1, len(pending))) as pool:
+        futures = {
+            shard: pool.submit(_query_shard, int(shard), since, watermark, start_key, shard_limit)
+            for shard, start_key in pending.items()
+        }
+        pages = {shard: future.result() for shard, future in futures.items()}
+
+    # Merge de las páginas (cada una ya viene ordenada por updatedAt) y corte en `limit`. Una
+    # shard con más páginas puede tener cambios anteriores a los que siguen en las demás:
+    # nada posterior a su último item leído sale en esta página, así el orden se mantiene
+    merged = heapq.merge(*(
+        [(item['updatedAt'], shard, i, item) for i, item in enumerate(items)]
+        for shard, (items, _) in pages.items()
+    ))
+    horizon = min((page[-1]['updatedAt'] for page, has_more in pages.values() if has_more and page), default=None)
+    items, last_by_shard = [], {}
+    for updated_at, shard, _, item in merged:
+        if len(items) == limit or (horizon is not None and updated_at > horizon):
+            break
+        items.append(item)
+        last_by_shard[shard] = item
+
+    next_pending = {}
+    for shard, (page, has_more) in pages.items():
+        last = last_by_shard.get(shard)
+        if page and last is not page[-1]:
+            # Quedaron items de esta página sin devolver: se retoma después del último devuelto
+            next_pending[shard] = _index_key(last) if last else pending[shard]
+        elif has_more:
+            next_pending[shard] = _index_key(page[-1])
+
+    return items, ({'w': watermark, 's': next_pending} if next_pending else None), watermark
+
+
+def split_changes(items):
+    """Separa incidentes cambiados (incluidos los previos al backfill de entityType) de tombstones"""
+    incidents, deleted = [], []
+    for item in items:
+        if item.get('entityType') == ENTITY_TYPE_TOMBSTONE:
+            deleted.append({'incidentId': item['deletedId'], 'deletedAt': item['updatedAt']})
+        elif is_incident(item):
+            incidents.append(item)
+    return incidents, deleted
+
+
+def tombstone_item(incident_id, now):
+    return {
+        'incidentId': TOMBSTONE_PREFIX + incident_id,
+        'entityType': ENTITY_TYPE_TOMBSTONE,
+        'deletedId': incident_id,
+        'updatedAt': now,
+        'updatedShard': updated_shard(incident_id),
+        'ttl': now + TOMBSTONE_TTL_SECONDS
+    }
+
+
+def _is_deleted_incident(old):
+    # Los tombstones vencidos por TTL, los items de otros tipos y los incidentes
+    # archivados (siguen existiendo en el archivo) no generan tombstone
+    return is_incident(old) and ARCHIVED_AT not in old
+
+
+def _write_tombstones(incident_ids):
+    now = int(time.time())
+    with table.batch_writer(overwrite_by_pkeys=['incidentId']) as batch:
+        for incident_id in incident_ids:
+            batch.put_item(Item=tombstone_item(incident_id, now))
+
+
+def record_tombstones(event, context):
+    """Consumidor del stream: un tombstone por cada incidente borrado"""
+    olds = []
+    for rec in event.get('Records', []):
+        if rec.get('eventName') == 'REMOVE':
+            image = rec['dynamodb'].get('OldImage') or {}
+            olds.append({k: _des.deserialize(v) for k, v in image.items() if k in STREAM_FIELDS})
+    _write_tombstones(old['incidentId'] for old in olds if _is_deleted_incident(old))
+
+
+def tombstone_changes(changes, deadline=None):
+    """Sink `tombstones` de services/realtime/src/stream_pipeline.py: recibe los cambios ya coalescidos"""
+    _write_tombstones(c.old['incidentId'] for c in changes
+                      if c.event_type == 'REMOVE' and _is_deleted_incident(c.old))
+    return []
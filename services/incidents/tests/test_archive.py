@@ -0,0 +1,159 @@
+import sys
+import os
+import json
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('CURSOR_SECRET', 'test-cursor-secret')
+
+import archive
+import handlers
+from archive import LocalArchiveStore, archive_old_incidents, decode_columns, encode_columns, list_archived
+
+NOW = 1735689600  # 2025-01-01
+OLD = 1700000000  # 2023-11-14
+
+
+def _incident(incident_id, created_at, **extra):
+    return dict({
+        'incidentId': incident_id, 'status': 'resolved', 'urgencia': 'alta',
+        'createdAt': Decimal(created_at), 'updatedAt': Decimal(created_at),
+        'locationKey': 'UTEC#A#A1#A101'
+    }, **extra)
+
+
+def test_columns_roundtrip_keeps_rows():
+    items = [_incident('inc-1', OLD), _incident('inc-2', OLD, assignedTo='staff-1')]
+
+    data, ext = encode_columns(items)
+    rows = decode_columns(data, 'part' + ext)
+
+    assert rows[0] == {'incidentId': 'inc-1', 'status': 'resolved', 'urgencia': 'alta',
+                       'createdAt': OLD, 'updatedAt': OLD, 'locationKey': 'UTEC#A#A1#A101'}
+    assert rows[1]['assignedTo'] == 'staff-1'
+    assert 'assignedTo' not in rows[0]
+
+
+def test_archive_writes_partition_then_deletes(tmp_path):
+    store = LocalArchiveStore(str(tmp_path))
+    with patch.object(archive, 'table') as table, patch.object(archive, 'batch_write') as batch:
+        table.query.side_effect = [{'Items': [_incident('inc-1', OLD)]}, {'Items': []}]
+        batch.return_value = []
+
+        result = archive_old_incidents(store, now=NOW, after_days=30)
+
+    assert result['archived'] == 1
+    assert result['failedDeletes'] == 0
+    keys = store.list('incidents/')
+    assert len(keys) == 1 and keys[0].startswith('incidents/year=2023/month=11/part-')
+    # Solo consulta StatusIndex, nunca escanea la tabla
+    assert {c.kwargs['IndexName'] for c in table.query.call_args_list} == {'StatusIndex'}
+    table.scan.assert_not_called()
+    deletes = batch.call_args.args[2]
+    assert deletes == [{'DeleteRequest': {'Key': {'incidentId': 'inc-1'}}}]
+    # Se marca antes de borrar, así el REMOVE del stream se reconoce como archivo
+    update = table.meta.client.update_item.call_args.kwargs
+    assert update['Key'] == {'incidentId': 'inc-1'}
+    assert update['ExpressionAttributeValues'] == {':now': NOW}
+    assert decode_columns(open(os.path.join(str(tmp_path), keys[0]), 'rb').read(), keys[0])[0]['archivedAt'] == NOW
+
+
+def test_archive_skips_incidents_changed_since_query(tmp_path):
+    store = LocalArchiveStore(str(tmp_path))
+    changed = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+    with patch.object(archive, 'table') as table, patch.object(archive, 'batch_write') as batch:
+        table.query.side_effect = [{'Items': [_incident('inc-1', OLD), _incident('inc-2', OLD)]}, {'Items': []}]
+        table.meta.client.update_item.side_effect = lambda **kw: (
+            (_ for _ in ()).throw(changed) if kw['Key']['incidentId'] == 'inc-2' else {})
+        batch.return_value = []
+
+        result = archive_old_incidents(store, now=NOW, after_days=30)
+
+    assert result['archived'] == 1
+    assert batch.call_args.args[2] == [{'DeleteRequest': {'Key': {'incidentId': 'inc-1'}}}]
+
+
+def test_list_archived_filters_prunes_and_paginates(tmp_path):
+    store = LocalArchiveStore(str(tmp_path))
+    for month, items in ((10, [_incident('inc-1', 1697000000), _incident('inc-2', 1697100000, urgencia='baja')]),
+                         (11, [_incident('inc-3', OLD)])):
+        data, ext = encode_columns(items)
+        store.put(f'incidents/year=2023/month={month}/part-x{ext}', data)
+
+    first = json.loads(list_archived({'urgencia': 'alta', 'limit': '1'}, store)['body'])
+    assert [i['incidentId'] for i in first['incidents']] == ['inc-3']
+    assert first['archived'] is True
+
+    second = json.loads(list_archived({'urgencia': 'alta', 'limit': '1', 'cursor': first['nextCursor']}, store)['body'])
+    assert [i['incidentId'] for i in second['incidents']] == ['inc-1']
+    assert second['nextCursor'] is None
+
+    october = json.loads(list_archived({'year': '2023', 'month': '10'}, store)['body'])
+    assert {i['incidentId'] for i in october['incidents']} == {'inc-1', 'inc-2'}
+
+
+def test_list_archived_keeps_latest_copy(tmp_path):
+    store = LocalArchiveStore(str(tmp_path))
+    for name, status, updated in (('a', 'resolved', OLD), ('b', 'closed', OLD + 10)):
+        data, ext = encode_columns([_incident('inc-1', OLD, status=status, updatedAt=Decimal(updated))])
+        store.put(f'incidents/year=2023/month=11/part-{name}{ext}', data)
+
+    body = json.loads(list_archived({}, store)['body'])
+
+    assert [(i['incidentId'], i['status']) for i in body['incidents']] == [('inc-1', 'closed')]
+
+
+class CountingStore(LocalArchiveStore):
+    def __init__(self, root):
+        super().__init__(root)
+        self.read = []
+
+    def get(self, key):
+        self.read.append(key)
+        return super().get(key)
+
+
+def test_list_archived_reads_only_the_partitions_of_the_page(tmp_path, monkeypatch):
+    archive._read_file.cache_clear()
+    store = CountingStore(str(tmp_path))
+    for year, month, created in ((2022, 12, 1671000000), (2023, 10, 1697000000), (2023, 11, OLD)):
+        data, ext = encode_columns([_incident(f'inc-{month}', created)])
+        store.put(f'incidents/year={year}/month={month:02d}/part-x{ext}', data)
+
+    first = json.loads(list_archived({'limit': '1'}, store)['body'])
+    assert [i['incidentId'] for i in first['incidents']] == ['inc-11']
+    assert len(store.read) == 1 and '/month=11/' in store.read[0]
+
+    # Con un filtro que no encuentra nada, la página se corta tras ARCHIVE_PAGE_PARTITIONS particiones
+    monkeypatch.setattr(archive, 'ARCHIVE_PAGE_PARTITIONS', 2)
+    empty = json.loads(list_archived({'status': 'closed'}, store)['body'])
+    assert empty['incidents'] == [] and empty['nextCursor']
+    rest = json.loads(list_archived({'status': 'closed', 'cursor': empty['nextCursor']}, store)['body'])
+    assert rest['incidents'] == [] and rest['nextCursor'] is None
+
+
+def test_s3_store_children_lists_common_prefixes():
+    s3 = MagicMock()
+    s3.get_paginator.return_value.paginate.return_value = [
+        {'CommonPrefixes': [{'Prefix': 'incidents/year=2024/'}, {'Prefix': 'incidents/year=2023/'}]}
+    ]
+
+    children = archive.S3ArchiveStore('bucket', client=s3).children('incidents/')
+
+    assert children == ['incidents/year=2023/', 'incidents/year=2024/']
+    s3.get_paginator.return_value.paginate.assert_called_once_with(
+        Bucket='bucket', Prefix='incidents/', Delimiter='/')
+
+
+def test_list_incidents_archived_reads_archive():
+    with patch.object(handlers, 'list_archived') as archived, patch('handlers.table') as table:
+        archived.return_value = {'statusCode': 200, 'body': '{}'}
+        handlers.list_incidents({'queryStringParameters': {'archived': 'true'}}, None)
+
+    archived.assert_called_once_with({'archived': 'true'})
+    table.query.assert_not_called()
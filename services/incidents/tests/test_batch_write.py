@@ -0,0 +1,61 @@
+import sys
+import os
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from batch_write import batch_write
+
+
+def _put(n):
+    return {'PutRequest': {'Item': {'incidentId': f'inc-{n}'}}}
+
+
+def test_batch_write_chunks_by_25():
+    ddb = MagicMock()
+    ddb.batch_write_item.return_value = {'UnprocessedItems': {}}
+    
+    failed = batch_write(ddb, 'T', [_put(i) for i in range(60)], sleep=lambda s: None)
+    
+    assert failed == []
+    sizes = [len(c[1]['RequestItems']['T']) for c in ddb.batch_write_item.call_args_list]
+    assert sizes == [25, 25, 10]
+
+
+def test_batch_write_retries_unprocessed_items():
+    ddb = MagicMock()
+    ddb.batch_write_item.side_effect = [
+        {'UnprocessedItems': {'T': [_put(1)]}},
+        {'UnprocessedItems': {}},
+    ]
+    delays = []
+    
+    failed = batch_write(ddb, 'T', [_put(0), _put(1)], sleep=delays.append)
+    
+    assert failed == []
+    assert ddb.batch_write_item.call_args_list[1][1]['RequestItems'] == {'T': [_put(1)]}
+    assert len(delays) == 1
+
+
+def test_batch_write_reports_items_left_after_max_attempts():
+    ddb = MagicMock()
+    ddb.batch_write_item.return_value = {'UnprocessedItems': {'T': [_put(1)]}}
+    
+    failed = batch_write(ddb, 'T', [_put(0), _put(1)], max_attempts=3, sleep=lambda s: None)
+    
+    assert [req for req, _ in failed] == [_put(1)]
+    assert ddb.batch_write_item.call_count == 3
+
+
+def test_batch_write_does_not_retry_validation_errors():
+    ddb = MagicMock()
+    ddb.batch_write_item.side_effect = ClientError(
+        {'Error': {'Code': 'ValidationException', 'Message': 'bad'}}, 'BatchWriteItem')
+    
+    failed = batch_write(ddb, 'T', [_put(0)], sleep=lambda s: None)
+    
+    assert failed == [(_put(0), 'ValidationException')]
+    assert ddb.batch_write_item.call_count == 1
@@ -0,0 +1,102 @@
+import sys
+import os
+import json
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('CURSOR_SECRET', 'test-cursor-secret')
+
+import comments
+from comments import comment_sort_key, create_comment, delete_comment, list_comments
+
+
+def test_comment_sort_key_uses_ulid():
+    assert comment_sort_key('comment_01jd8x7k2m') == 'COMMENT#01JD8X7K2M'
+
+
+def _cancelled(*codes):
+    return ClientError({
+        'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+        'CancellationReasons': [{'Code': code} for code in codes]
+    }, 'TransactWriteItems')
+
+
+def test_create_comment_is_one_transaction_with_counter():
+    event = {
+        'pathParameters': {'incidentId': 'inc-1'},
+        'body': json.dumps({'comment': 'Controlado', 'userId': 'u1'})
+    }
+    with patch.object(comments, 'dynamodb') as dynamodb, patch.object(comments, 'incidents_table') as incidents:
+        response = create_comment(event, None)
+
+    assert response['statusCode'] == 201
+    incidents.get_item.assert_not_called()
+    update, put = dynamodb.meta.client.transact_write_items.call_args.kwargs['TransactItems']
+    assert update['Update']['Key'] == {'incidentId': 'inc-1'}
+    assert update['Update']['UpdateExpression'].startswith('ADD commentCount :one SET lastCommentAt = :ts')
+    assert update['Update']['ConditionExpression'] == 'attribute_exists(incidentId)'
+    item = put['Put']['Item']
+    assert item['incidentId'] == 'inc-1'
+    assert item['sk'] == comment_sort_key(item['commentId'])
+
+
+def test_create_comment_missing_incident():
+    event = {'pathParameters': {'incidentId': 'nope'}, 'body': json.dumps({'comment': 'Hola'})}
+    with patch.object(comments, 'dynamodb') as dynamodb:
+        dynamodb.meta.client.transact_write_items.side_effect = _cancelled('ConditionalCheckFailed', 'None')
+        response = create_comment(event, None)
+
+    assert response['statusCode'] == 404
+
+
+def test_list_comments_is_a_single_query():
+    event = {'pathParameters': {'incidentId': 'inc-1'}, 'queryStringParameters': {'limit': '2'}}
+    with patch.object(comments, 'incidents_table') as incidents, patch.object(comments, 'comments_table') as table:
+        table.query.return_value = {
+            'Items': [{'commentId': 'comment_b', 'createdAt': 2}, {'commentId': 'comment_a', 'createdAt': 1}],
+            'LastEvaluatedKey': {'incidentId': 'inc-1', 'sk': 'COMMENT#A'}
+        }
+        response = list_comments(event, None)
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert [c['commentId'] for c in body['comments']] == ['comment_b', 'comment_a']
+    assert body['nextCursor']
+    assert table.query.call_count == 1
+    assert table.query.call_args.kwargs['ScanIndexForward'] is False
+    incidents.get_item.assert_not_called()
+    table.scan.assert_not_called()
+
+
+def test_list_comments_empty_thread_of_missing_incident():
+    event = {'pathParameters': {'incidentId': 'nope'}}
+    with patch.object(comments, 'incidents_table') as incidents, patch.object(comments, 'comments_table') as table:
+        table.query.return_value = {'Items': []}
+        incidents.get_item.return_value = {}
+        response = list_comments(event, None)
+
+    assert response['statusCode'] == 404
+
+
+def test_delete_comment_decrements_counter():
+    event = {'pathParameters': {'incidentId': 'inc-1', 'commentId': 'comment_01ab'}}
+    with patch.object(comments, 'dynamodb') as dynamodb:
+        response = delete_comment(event, None)
+
+    assert response['statusCode'] == 200
+    delete, update = dynamodb.meta.client.transact_write_items.call_args.kwargs['TransactItems']
+    assert delete['Delete']['Key'] == {'incidentId': 'inc-1', 'sk': 'COMMENT#01AB'}
+    assert update['Update']['ExpressionAttributeValues'][':minus'] == -1
+
+
+def test_delete_comment_not_found():
+    event = {'pathParameters': {'incidentId': 'inc-1', 'commentId': 'comment_01ab'}}
+    with patch.object(comments, 'dynamodb') as dynamodb:
+        dynamodb.meta.client.transact_write_items.side_effect = _cancelled('ConditionalCheckFailed', 'None')
+        response = delete_comment(event, None)
+
+    assert response['statusCode'] == 404
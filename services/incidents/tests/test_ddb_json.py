@@ -0,0 +1,48 @@
+import sys
+import os
+import json
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+
+# Add src to path
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, SRC)
+
+import ddb_json
+
+
+def test_dumps_converts_dynamodb_types():
+    item = {
+        'incidentId': 'inc-1',
+        'createdAt': Decimal('1700000000'),
+        'score': Decimal('0.5'),
+        'tags': {'gas'},
+        'raw': Binary(b'\x00\x01'),
+        'nested': [{'n': Decimal('2')}],
+        'titulo': 'Fuga en cafetería'
+    }
+    
+    decoded = json.loads(ddb_json.dumps(item))
+    
+    assert decoded['createdAt'] == 1700000000
+    assert isinstance(decoded['createdAt'], int)
+    assert decoded['score'] == 0.5
+    assert decoded['tags'] == ['gas']
+    assert decoded['raw'] == 'AAE='
+    assert decoded['nested'] == [{'n': 2}]
+    assert decoded['titulo'] == 'Fuga en cafetería'
+
+
+def test_dumpb_returns_utf8_bytes():
+    data = ddb_json.dumpb({'titulo': 'acción', 'n': Decimal('1')})
+    
+    assert isinstance(data, bytes)
+    assert json.loads(data.decode('utf-8')) == {'titulo': 'acción', 'n': 1}
+
+
+def test_realtime_copy_is_identical():
+    realtime_copy = os.path.join(os.path.dirname(__file__), '..', '..', 'realtime', 'src', 'ddb_json.py')
+    
+    with open(os.path.join(SRC, 'ddb_json.py')) as source, open(realtime_copy) as copy:
+        assert source.read() == copy.read()
@@ -0,0 +1,94 @@
+import sys
+import os
+import json
+from unittest.mock import MagicMock
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import export
+from export import FileSink, S3Sink, export_table
+
+
+def _raw(incident_id, created_at, entity_type='INCIDENT'):
+    return {'incidentId': {'S': incident_id}, 'createdAt': {'N': str(created_at)}, 'status': {'S': 'open'},
+            'entityType': {'S': entity_type}}
+
+
+def _apply_filter(items, kwargs):
+    # Solo entiende el filtro por entityType que arma export_table
+    if 'FilterExpression' not in kwargs:
+        return items
+    name = kwargs['ExpressionAttributeNames']['#type']
+    value = kwargs['ExpressionAttributeValues'][':incident']
+    return [item for item in items if item.get(name) == value]
+
+
+def _fake_client(pages_by_segment):
+    client = MagicMock()
+
+    def scan(**kwargs):
+        pages = pages_by_segment[kwargs['Segment']]
+        page = kwargs.get('ExclusiveStartKey', {}).get('page', 0)
+        resp = {'Items': _apply_filter(pages[page], kwargs)}
+        if page + 1 < len(pages):
+            resp['LastEvaluatedKey'] = {'page': page + 1}
+        return resp
+
+    client.scan.side_effect = scan
+    return client
+
+
+def test_export_table_writes_every_segment_as_ndjson(tmp_path):
+    client = _fake_client({
+        0: [[_raw('inc-1', 1700000000)], [_raw('inc-2', 1700000001)]],
+        1: [[]],
+        2: [[_raw('inc-3', 1700000002)]],
+    })
+    sink = FileSink(str(tmp_path / 'out.ndjson'))
+    
+    count = export_table(sink, table_name='T', total_segments=3, max_workers=2, client=client)
+    path = sink.close()
+    
+    assert count == 3
+    lines = [json.loads(line) for line in open(path)]
+    assert sorted(line['incidentId'] for line in lines) == ['inc-1', 'inc-2', 'inc-3']
+    assert all(isinstance(line['createdAt'], int) for line in lines)
+    assert {c[1]['TotalSegments'] for c in client.scan.call_args_list} == {3}
+    assert {c[1]['IndexName'] for c in client.scan.call_args_list} == {'EntityTypeIndex'}
+
+
+def test_export_table_skips_tombstones(tmp_path):
+    client = _fake_client({0: [[_raw('inc-1', 1700000000), _raw('TOMBSTONE#inc-2', 1700000001, 'TOMBSTONE')]]})
+    sink = FileSink(str(tmp_path / 'out.ndjson'))
+    
+    count = export_table(sink, table_name='T', total_segments=1, max_workers=1, client=client)
+    path = sink.close()
+    
+    assert count == 1
+    assert [json.loads(line)['incidentId'] for line in open(path)] == ['inc-1']
+
+
+def test_s3_sink_uploads_parts_in_order(monkeypatch):
+    monkeypatch.setattr(export, 'PART_SIZE', 10)
+    s3 = MagicMock()
+    s3.create_multipart_upload.return_value = {'UploadId': 'up-1'}
+    s3.upload_part.side_effect = lambda **kw: {'ETag': f"etag-{kw['PartNumber']}"}
+    sink = S3Sink('bucket', 'exports/x.ndjson', client=s3)
+    
+    sink.write(b'0123456789ab')
+    sink.write(b'cd')
+    location = sink.close()
+    
+    assert location == 's3://bucket/exports/x.ndjson'
+    assert s3.upload_part.call_count == 2
+    parts = s3.complete_multipart_upload.call_args[1]['MultipartUpload']['Parts']
+    assert parts == [{'PartNumber': 1, 'ETag': 'etag-1'}, {'PartNumber': 2, 'ETag': 'etag-2'}]
+
+
+def test_export_incidents_requires_authority():
+    event = {'requestContext': {'authorizer': {'sub': 'u1', 'role': 'student'}}}
+    
+    response = export.export_incidents(event, None)
+    
+    assert response['statusCode'] == 403
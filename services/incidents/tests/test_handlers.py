@@ -8,7 +8,15 @@ from decimal import Decimal
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from handlers import create_incident, update_incident, list_incidents, get_claims
+import handlers
+from handlers import create_incident, update_incident, list_incidents, get_claims, get_stats, batch_create_incidents
+
+
+@pytest.fixture(autouse=True)
+def clear_list_cache():
+    handlers.list_cache.clear()
+    yield
+    handlers.list_cache.clear()
 
 
 @pytest.fixture
@@ -139,12 +147,26 @@ def test_update_incident_no_fields(mock_table):
     mock_table.update_item.assert_not_called()
 
 
+@pytest.mark.parametrize('body', [{'status': ''}, {'urgencia': '  '}, {'status': None}])
+def test_update_incident_rejects_empty_index_keys(mock_table, body):
+    event = {
+        'pathParameters': {'incidentId': 'inc-123'},
+        'requestContext': {'authorizer': {'sub': 'admin'}},
+        'body': json.dumps(body)
+    }
+    
+    response = update_incident(event, None)
+    
+    assert response['statusCode'] == 400
+    mock_table.update_item.assert_not_called()
+
+
 def test_list_incidents_all(mock_table):
     event = {'requestContext': {'authorizer': {'sub': 'user'}}}
-    mock_table.scan.return_value = {
+    mock_table.query.return_value = {
         'Items': [
-            {'id': 'inc-1', 'titulo': 'Test 1', 'createdAt': 1700000000},
-            {'id': 'inc-2', 'titulo': 'Test 2', 'createdAt': 1700000100}
+            {'id': 'inc-2', 'titulo': 'Test 2', 'createdAt': 1700000100},
+            {'id': 'inc-1', 'titulo': 'Test 1', 'createdAt': 1700000000}
         ]
     }
     
@@ -157,6 +179,10 @@ def test_list_incidents_all(mock_table):
     # Debe estar ordenado por createdAt descendente
     assert body['incidents'][0]['id'] == 'inc-2'
     assert body['incidents'][1]['id'] == 'inc-1'
+    # Sin filtros se lee el índice disperso de incidentes, nunca la tabla completa
+    mock_table.scan.assert_not_called()
+    assert mock_table.query.call_args[1]['IndexName'] == 'EntityTypeIndex'
+    assert mock_table.query.call_args[1]['ScanIndexForward'] is False
 
 
 def test_list_incidents_with_status_filter(mock_table):
@@ -164,7 +190,7 @@ def test_list_incidents_with_status_filter(mock_table):
         'queryStringParameters': {'status': 'pending'},
         'requestContext': {'authorizer': {'sub': 'user'}}
     }
-    mock_table.scan.return_value = {
+    mock_table.query.return_value = {
         'Items': [{'id': 'inc-1', 'status': 'pending', 'createdAt': 1700000000}]
     }
     
@@ -173,6 +199,172 @@ def test_list_incidents_with_status_filter(mock_table):
     assert response['statusCode'] == 200
     body = json.loads(response['body'])
     assert body['count'] == 1
-    mock_table.scan.assert_called_once()
-    call_args = mock_table.scan.call_args
-    assert 'FilterExpression' in call_args[1]
+    mock_table.scan.assert_not_called()
+    mock_table.query.assert_called_once()
+    call_args = mock_table.query.call_args
+    assert call_args[1]['IndexName'] == 'StatusIndex'
+    assert 'FilterExpression' not in call_args[1]
+
+
+def test_list_incidents_follows_last_evaluated_key(mock_table):
+    event = {'requestContext': {'authorizer': {'sub': 'user'}}}
+    mock_table.query.side_effect = [
+        {'Items': [{'id': 'inc-1', 'createdAt': 1700000000}], 'LastEvaluatedKey': {'incidentId': 'inc-1'}},
+        {'Items': [{'id': 'inc-2', 'createdAt': 1700000100}]}
+    ]
+    
+    response = list_incidents(event, None)
+    
+    body = json.loads(response['body'])
+    assert body['count'] == 2
+    assert mock_table.query.call_count == 2
+    assert mock_table.query.call_args[1]['ExclusiveStartKey'] == {'incidentId': 'inc-1'}
+
+
+def test_list_incidents_returns_next_cursor(mock_table, monkeypatch):
+    monkeypatch.setenv('CURSOR_SECRET', 'test-cursor-secret')
+    mock_table.query.side_effect = [
+        {'Items': [{'id': 'inc-2', 'status': 'open', 'createdAt': 1700000100}],
+         'LastEvaluatedKey': {'incidentId': 'inc-2', 'status': 'open', 'createdAt': Decimal('1700000100')}},
+        {'Items': [{'id': 'inc-1', 'status': 'open', 'createdAt': 1700000000}]}
+    ]
+    event = {'queryStringParameters': {'status': 'open', 'limit': '1'}}
+    
+    first = json.loads(list_incidents(event, None)['body'])
+    assert first['count'] == 1
+    assert first['nextCursor']
+    
+    event['queryStringParameters']['cursor'] = first['nextCursor']
+    second = json.loads(list_incidents(event, None)['body'])
+    assert second['incidents'][0]['id'] == 'inc-1'
+    assert second['nextCursor'] is None
+    assert mock_table.query.call_args[1]['ExclusiveStartKey'] == {
+        'incidentId': 'inc-2', 'status': 'open', 'createdAt': 1700000100
+    }
+
+
+def test_list_incidents_invalid_cursor(mock_table, monkeypatch):
+    monkeypatch.setenv('CURSOR_SECRET', 'test-cursor-secret')
+    event = {'queryStringParameters': {'cursor': 'not-a-cursor'}}
+    
+    response = list_incidents(event, None)
+    
+    assert response['statusCode'] == 400
+    mock_table.query.assert_not_called()
+
+
+def test_list_incidents_unknown_location(mock_table):
+    event = {'queryStringParameters': {'location': 'zzz'}}
+    
+    response = list_incidents(event, None)
+    
+    assert response['statusCode'] == 400
+    assert 'zzz' in json.loads(response['body'])['error']
+    mock_table.query.assert_not_called()
+
+
+def test_get_stats_reads_single_item():
+    with patch('handlers.stats_table') as stats_table:
+        stats_table.get_item.return_value = {'Item': {
+            'statsId': 'GLOBAL',
+            'total': Decimal('3'),
+            'status#open': Decimal('2'),
+            'status#resolved': Decimal('1'),
+            'status#closed': Decimal('0'),
+            'urgencia#alta': Decimal('3'),
+            'edificio#A': Decimal('3'),
+            'status#open|urgencia#alta': Decimal('2'),
+            'status#open|edificio#A': Decimal('2'),
+            # Contadores por texto libre anteriores a los de edificio: se ignoran
+            'ubicacion#Lab A101': Decimal('3'),
+            'updatedAt': Decimal('1700000000')
+        }}
+        
+        response = get_stats({}, None)
+    
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['total'] == 3
+    assert body['byStatus'] == {'open': 2, 'resolved': 1}
+    assert body['byUrgencia'] == {'alta': 3}
+    assert body['byEdificio'] == {'A': 3}
+    assert body['byStatusUrgencia'] == {'open': {'alta': 2}}
+    assert body['byStatusEdificio'] == {'open': {'A': 2}}
+    assert 'byUbicacion' not in body
+    stats_table.get_item.assert_called_once_with(Key={'statsId': 'GLOBAL'})
+
+
+def test_list_incidents_etag_and_not_modified(mock_table):
+    mock_table.query.return_value = {'Items': [{'id': 'inc-1', 'createdAt': 1700000000}]}
+    
+    first = list_incidents({'queryStringParameters': {'limit': '10'}}, None)
+    etag = first['headers']['ETag']
+    assert first['statusCode'] == 200
+    assert etag.startswith('"') and etag.endswith('"')
+    
+    second = list_incidents({
+        'queryStringParameters': {'limit': '10'},
+        'headers': {'if-none-match': etag}
+    }, None)
+    assert second['statusCode'] == 304
+    assert second['body'] == ''
+    assert second['headers']['ETag'] == etag
+    # La segunda respuesta sale de la cache del contenedor
+    mock_table.query.assert_called_once()
+
+
+def test_list_incidents_cache_invalidated_by_version(mock_table, monkeypatch):
+    monkeypatch.setattr(handlers, 'LIST_CACHE_VERSION_CHECK', True)
+    versions = iter([1, 1, 2])
+    monkeypatch.setattr(handlers, '_data_version', lambda: next(versions))
+    mock_table.query.return_value = {'Items': [{'id': 'inc-1', 'createdAt': 1700000000}]}
+    event = {'queryStringParameters': {}}
+    
+    list_incidents(event, None)
+    list_incidents(event, None)
+    assert mock_table.query.call_count == 1
+    
+    list_incidents(event, None)
+    assert mock_table.query.call_count == 2
+
+
+def test_batch_create_incidents_reports_per_item_results():
+    event = {
+        'requestContext': {'authorizer': {'sub': 'sensor-1'}},
+        'body': json.dumps({'incidents': [
+            {'titulo': 'Humo', 'ubicacion': 'Lab A101', 'incidentId': 'inc-a'},
+            {'ubicacion': 'Lab A102'},
+            {'titulo': 'Agua', 'ubicacion': 'Lab A103', 'incidentId': 'inc-b'},
+            {'titulo': 'Agua', 'ubicacion': 'Lab A103', 'incidentId': 'inc-b'}
+        ]})
+    }
+    with patch('handlers.ddb') as ddb:
+        ddb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        
+        response = batch_create_incidents(event, None)
+    
+    assert response['statusCode'] == 207
+    body = json.loads(response['body'])
+    assert [r['status'] for r in body['results']] == ['created', 'invalid', 'created', 'invalid']
+    assert body['created'] == 2
+    assert body['invalid'] == 2
+    written = ddb.batch_write_item.call_args[1]['RequestItems']['AlertaUTEC-Incidents']
+    assert [w['PutRequest']['Item']['incidentId'] for w in written] == ['inc-a', 'inc-b']
+    assert all(w['PutRequest']['Item']['reporterId'] == 'sensor-1' for w in written)
+
+
+def test_batch_create_incidents_rejects_oversized_batch(monkeypatch):
+    monkeypatch.setattr(handlers, 'BATCH_MAX_INCIDENTS', 2)
+    event = {'body': json.dumps({'incidents': [{'titulo': 't', 'ubicacion': 'u'}] * 3})}
+    
+    response = batch_create_incidents(event, None)
+    
+    assert response['statusCode'] == 400
+
+
+def test_create_incident_writes_location_key(mock_table, event_with_claims):
+    create_incident(event_with_claims, None)
+    
+    item = mock_table.put_item.call_args[1]['Item']
+    assert item['locationCampus'] == 'UTEC'
+    assert item['locationKey'] == 'UTEC#A#A1#A101'
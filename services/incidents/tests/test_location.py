@@ -0,0 +1,51 @@
+import sys
+import os
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from location import location_attributes, location_key, location_query
+
+
+def test_location_key_from_room_code():
+    assert location_key('Lab A101') == 'UTEC#A#A1#A101'
+    assert location_key('Aula a-305') == 'UTEC#A#A3#A305'
+
+
+def test_location_key_from_building_and_room_number():
+    assert location_key('Edificio B - Lab 201') == 'UTEC#B#B2#B201'
+    assert location_key('Pabellón C, piso 4') == 'UTEC#C#C4'
+
+
+def test_location_key_stops_at_first_unknown_level():
+    assert location_key('Edificio D') == 'UTEC#D'
+    assert location_key('Cafetería Central') == 'UTEC'
+
+
+def test_location_attributes():
+    assert location_attributes('Lab A101') == {'locationCampus': 'UTEC', 'locationKey': 'UTEC#A#A1#A101'}
+
+
+def test_location_query_accepts_codes_paths_and_text():
+    assert location_query('A') == ('UTEC', 'UTEC#A', False)
+    assert location_query('A1') == ('UTEC', 'UTEC#A#A1', False)
+    assert location_query('a101') == ('UTEC', 'UTEC#A#A1#A101', True)
+    assert location_query('UTEC#B#B2') == ('UTEC', 'UTEC#B#B2', False)
+    assert location_query('Edificio B') == ('UTEC', 'UTEC#B', False)
+
+
+@pytest.mark.parametrize('value', ['zzz', 'Cafetería Central', '', '#'])
+def test_location_query_rejects_unknown_location(value):
+    with pytest.raises(ValueError):
+        location_query(value)
+
+
+def test_realtime_copy_is_identical():
+    # routing.py filtra suscripciones con el mismo parser que LocationIndex
+    src = os.path.join(os.path.dirname(__file__), '..', 'src', 'location.py')
+    realtime_copy = os.path.join(os.path.dirname(__file__), '..', '..', 'realtime', 'src', 'location.py')
+    
+    with open(src) as source, open(realtime_copy) as copy:
+        assert source.read() == copy.read()
@@ -0,0 +1,82 @@
+import sys
+import os
+import pytest
+from unittest.mock import MagicMock
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('CURSOR_SECRET', 'test-cursor-secret')
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, fetch_page, parse_limit
+
+
+def test_cursor_roundtrip():
+    key = {'incidentId': 'inc-1', 'status': 'open', 'createdAt': 1700000000}
+    
+    token = encode_cursor(key, 'StatusIndex|status=open')
+    
+    assert isinstance(token, str)
+    assert 'inc-1' not in token
+    assert decode_cursor(token, 'StatusIndex|status=open') == key
+
+
+def test_cursor_without_key_is_none():
+    assert encode_cursor(None, 'scan') is None
+    assert decode_cursor(None, 'scan') is None
+
+
+def test_cursor_rejects_tampering():
+    token = encode_cursor({'incidentId': 'inc-1'}, 'scan')
+    tampered = ('A' if token[0] != 'A' else 'B') + token[1:]
+    
+    with pytest.raises(InvalidCursor):
+        decode_cursor(tampered, 'scan')
+
+
+def test_cursor_rejects_other_scope():
+    token = encode_cursor({'incidentId': 'inc-1'}, 'StatusIndex|status=open')
+    
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 'StatusIndex|status=resolved')
+
+
+def test_parse_limit():
+    assert parse_limit(None) == 50
+    assert parse_limit('10') == 10
+    assert parse_limit('100000') == 200
+    with pytest.raises(ValueError):
+        parse_limit('0')
+    with pytest.raises(ValueError):
+        parse_limit('abc')
+    assert parse_limit(None, default=20, maximum=50) == 20
+    assert parse_limit('80', default=20, maximum=50) == 50
+
+
+def test_fetch_page_stops_at_limit_with_resume_key():
+    operation = MagicMock(side_effect=[
+        {'Items': [{'id': 1}], 'LastEvaluatedKey': {'id': 1}},
+        {'Items': [{'id': 2}], 'LastEvaluatedKey': {'id': 2}},
+    ])
+    
+    items, last_key = fetch_page(operation, {'IndexName': 'StatusIndex'}, 2)
+    
+    assert items == [{'id': 1}, {'id': 2}]
+    assert last_key == {'id': 2}
+    # Cada llamada evalúa la página completa, aunque ya haya items juntados
+    assert operation.call_args_list[0][1]['Limit'] == 2
+    assert operation.call_args_list[1][1]['Limit'] == 2
+    assert operation.call_args_list[1][1]['ExclusiveStartKey'] == {'id': 1}
+
+
+def test_fetch_page_truncates_and_resumes_from_last_returned_item():
+    operation = MagicMock(side_effect=[
+        {'Items': [{'incidentId': 'a', 'status': 'open', 'createdAt': 3}], 'LastEvaluatedKey': {'x': 1}},
+        {'Items': [{'incidentId': 'b', 'status': 'open', 'createdAt': 2},
+                   {'incidentId': 'c', 'status': 'open', 'createdAt': 1}], 'LastEvaluatedKey': {'x': 2}},
+    ])
+
+    items, last_key = fetch_page(operation, {'IndexName': 'StatusIndex'}, 2,
+                                 key_attributes=('incidentId', 'status', 'createdAt'))
+
+    assert [i['incidentId'] for i in items] == ['a', 'b']
+    assert last_key == {'incidentId': 'b', 'status': 'open', 'createdAt': 2}
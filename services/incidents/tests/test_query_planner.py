@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from query_planner import plan_list_query
+
+
+def test_plan_without_filters_queries_entity_type_index():
+    plan = plan_list_query({})
+    
+    assert plan.operation == 'query'
+    assert plan.index == 'EntityTypeIndex'
+    assert plan.ordered is True
+    condition = plan.kwargs['KeyConditionExpression'].get_expression()
+    assert condition['values'][1] == 'INCIDENT'
+    assert 'FilterExpression' not in plan.kwargs
+
+
+def test_plan_picks_most_selective_index():
+    plan = plan_list_query({'status': 'open', 'urgencia': 'alta', 'reporterId': 'user123'})
+    
+    assert plan.operation == 'query'
+    assert plan.index == 'ReporterIndex'
+    assert plan.kwargs['ScanIndexForward'] is False
+    # status y urgencia quedan como filtro sobre el índice elegido
+    assert 'FilterExpression' in plan.kwargs
+
+
+def test_plan_single_filter_has_no_filter_expression():
+    plan = plan_list_query({'urgencia': 'alta'})
+    
+    assert plan.index == 'UrgenciaIndex'
+    assert 'FilterExpression' not in plan.kwargs
+
+
+def test_plan_ignores_empty_and_unknown_params():
+    plan = plan_list_query({'status': '', 'foo': 'bar'})
+    
+    assert plan.index == 'EntityTypeIndex'
+    assert 'FilterExpression' not in plan.kwargs
+
+
+def test_plan_location_uses_location_index_prefix():
+    plan = plan_list_query({'location': 'A1', 'status': 'open'})
+    
+    assert plan.index == 'LocationIndex'
+    assert plan.ordered is False
+    condition = plan.kwargs['KeyConditionExpression'].get_expression()
+    assert condition['operator'] == 'AND'
+    sort_condition = condition['values'][1].get_expression()
+    assert sort_condition['operator'] == 'begins_with'
+    assert sort_condition['values'][1] == 'UTEC#A#A1'
+    assert 'FilterExpression' in plan.kwargs
+
+
+def test_plan_reporter_beats_location():
+    plan = plan_list_query({'location': 'A', 'reporterId': 'user123'})
+    
+    assert plan.index == 'ReporterIndex'
+    assert plan.ordered is True
@@ -0,0 +1,60 @@
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from response_cache import ResponseCache, cache_key, etag_matches
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_ignores_order_and_empty_values():
+    assert cache_key({'status': 'open', 'limit': '10', 'cursor': ''}) == cache_key({'limit': '10', 'status': 'open'})
+    assert cache_key(None) == ()
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(max_entries=10, ttl_seconds=5, clock=clock)
+    cache.put('k', '{"a": 1}')
+    
+    clock.now = 4.9
+    assert cache.get('k').body == '{"a": 1}'
+    clock.now = 5.0
+    assert cache.get('k') is None
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60, clock=FakeClock())
+    cache.put('a', '1')
+    cache.put('b', '2')
+    cache.get('a')
+    cache.put('c', '3')
+    
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def test_disabled_cache_still_computes_etag():
+    cache = ResponseCache(max_entries=10, ttl_seconds=0)
+    
+    entry = cache.put('k', 'body')
+    
+    assert entry.etag
+    assert cache.get('k') is None
+
+
+def test_etag_matches_weak_and_lists():
+    etag = '"abc"'
+    assert etag_matches({'headers': {'If-None-Match': '"zzz", W/"abc"'}}, etag)
+    assert etag_matches({'headers': {'if-none-match': '*'}}, etag)
+    assert not etag_matches({'headers': {'If-None-Match': '"zzz"'}}, etag)
+    assert not etag_matches({'headers': None}, etag)
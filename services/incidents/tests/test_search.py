@@ -0,0 +1,151 @@
+import sys
+import os
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import search
+from search import apply_change, rank, term_frequencies, tokenize
+
+
+def test_tokenize_folds_accents_stopwords_and_plurals():
+    assert tokenize('Fugas de GAS en el Laboratorio de Química') == ['fuga', 'gas', 'laboratorio', 'quimica']
+    assert tokenize('Luces y ascensores') == ['luz', 'ascensor']
+
+
+def test_term_frequencies_weights_title():
+    freqs = term_frequencies({'titulo': 'Incendio', 'descripcion': 'incendio en cocina'})
+    
+    assert freqs['incendio'] == 4
+    assert freqs['cocina'] == 1
+
+
+def test_apply_change_only_writes_changed_postings():
+    batch = MagicMock()
+    old = {'incidentId': 'inc-1', 'titulo': 'Fuga', 'descripcion': 'agua'}
+    new = {'incidentId': 'inc-1', 'titulo': 'Fuga', 'descripcion': 'agua caliente'}
+    
+    delta = apply_change(batch, old, new)
+    
+    assert delta == 0
+    batch.delete_item.assert_not_called()
+    batch.put_item.assert_called_once_with(Item={'term': 'caliente', 'incidentId': 'inc-1', 'tf': 1})
+
+
+def test_apply_change_remove_deletes_postings():
+    batch = MagicMock()
+    
+    delta = apply_change(batch, {'incidentId': 'inc-1', 'titulo': 'Humo'}, {})
+    
+    assert delta == -1
+    batch.delete_item.assert_called_once_with(Key={'term': 'humo', 'incidentId': 'inc-1'})
+
+
+def test_index_stream_keeps_postings_of_archived_incidents():
+    old = {'incidentId': {'S': 'inc-1'}, 'titulo': {'S': 'Humo'}, 'entityType': {'S': 'INCIDENT'}}
+    event = {'Records': [
+        {'eventName': 'REMOVE', 'dynamodb': {'OldImage': dict(old, archivedAt={'N': '1735689600'})}},
+        {'eventName': 'REMOVE', 'dynamodb': {'OldImage': dict(old, incidentId={'S': 'inc-2'})}},
+    ]}
+    with patch.object(search, 'search_table') as table:
+        search.index_stream(event, None)
+    
+    batch = table.batch_writer.return_value.__enter__.return_value
+    batch.delete_item.assert_called_once_with(Key={'term': 'humo', 'incidentId': 'inc-2'})
+
+
+def test_index_changes_sink_indexes_coalesced_changes():
+    changes = [SimpleNamespace(event_type='INSERT', old={},
+                               new={'incidentId': 'inc-1', 'titulo': 'Fuga', 'entityType': 'INCIDENT'})]
+    with patch.object(search, 'search_table') as table:
+        assert search.index_changes(changes) == []
+
+    batch = table.batch_writer.return_value.__enter__.return_value
+    batch.put_item.assert_called_once_with(Item={'term': 'fuga', 'incidentId': 'inc-1', 'tf': 3})
+    assert table.update_item.call_args.kwargs['ExpressionAttributeValues'] == {':d': 1}
+
+
+def test_rank_prefers_documents_matching_more_terms():
+    postings = {
+        'fuga': [('inc-1', 3), ('inc-2', 3), ('inc-3', 3)],
+        'gas': [('inc-2', 1)],
+    }
+    
+    ranked = rank(['fuga', 'gas'], postings, total_docs=100)
+    
+    assert ranked[0][0] == 'inc-2'
+    assert {incident_id for incident_id, _ in ranked} == {'inc-1', 'inc-2', 'inc-3'}
+
+
+def test_search_incidents_returns_ranked_incidents():
+    with patch.object(search, 'search_table') as table, patch.object(search, 'ddb') as ddb:
+        table.get_item.return_value = {'Item': {'count': 10}}
+        table.query.side_effect = lambda **kw: {
+            'fuga': {'Items': [{'incidentId': 'inc-1', 'tf': 3}, {'incidentId': 'inc-2', 'tf': 1}]},
+            'agua': {'Items': [{'incidentId': 'inc-2', 'tf': 1}]},
+        }[kw['ExpressionAttributeValues'][':t']]
+        ddb.batch_get_item.return_value = {'Responses': {'AlertaUTEC-Incidents': [
+            {'incidentId': 'inc-1', 'titulo': 'Fuga'},
+            {'incidentId': 'inc-2', 'titulo': 'Fuga de agua'},
+        ]}}
+        
+        response = search.search_incidents({'queryStringParameters': {'q': 'fuga de agua'}}, None)
+    
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['terms'] == ['fuga', 'agua']
+    assert [r['incidentId'] for r in body['results']] == ['inc-2', 'inc-1']
+
+
+def test_fetch_incidents_retries_unprocessed_keys_with_backoff():
+    unprocessed = {'AlertaUTEC-Incidents': {'Keys': [{'incidentId': 'inc-2'}]}}
+    with patch.object(search, 'ddb') as ddb:
+        ddb.batch_get_item.side_effect = [
+            {'Responses': {'AlertaUTEC-Incidents': [{'incidentId': 'inc-1'}]}, 'UnprocessedKeys': unprocessed},
+            {'Responses': {'AlertaUTEC-Incidents': [{'incidentId': 'inc-2'}]}},
+        ]
+        sleeps = []
+        found = search._fetch_incidents(['inc-1', 'inc-2'], sleep=sleeps.append)
+
+    assert set(found) == {'inc-1', 'inc-2'}
+    assert len(sleeps) == 1
+    assert ddb.batch_get_item.call_args.kwargs['RequestItems'] == unprocessed
+
+
+def test_fetch_incidents_gives_up_after_max_attempts():
+    unprocessed = {'AlertaUTEC-Incidents': {'Keys': [{'incidentId': 'inc-1'}]}}
+    with patch.object(search, 'ddb') as ddb:
+        ddb.batch_get_item.return_value = {'Responses': {}, 'UnprocessedKeys': unprocessed}
+        with pytest.raises(RuntimeError):
+            search._fetch_incidents(['inc-1'], max_attempts=3, sleep=lambda _: None)
+
+    assert ddb.batch_get_item.call_count == 3
+
+
+def test_search_incidents_requires_query():
+    response = search.search_incidents({'queryStringParameters': {'q': 'de la'}}, None)
+    
+    assert response['statusCode'] == 400
+
+
+@pytest.mark.parametrize('limit', ['-5', '0', 'abc'])
+def test_search_incidents_rejects_invalid_limit(limit):
+    with patch.object(search, 'search_table') as table:
+        response = search.search_incidents({'queryStringParameters': {'q': 'fuga', 'limit': limit}}, None)
+    
+    assert response['statusCode'] == 400
+    table.query.assert_not_called()
+
+
+def test_apply_change_ignores_non_incident_items():
+    batch = MagicMock()
+    
+    delta = apply_change(batch, {}, {'incidentId': 'x', 'entityType': 'COMMENT', 'titulo': 'Hola'})
+    
+    assert delta == 0
+    batch.put_item.assert_not_called()
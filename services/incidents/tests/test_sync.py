@@ -0,0 +1,155 @@
+import sys
+import os
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('CURSOR_SECRET', 'test-cursor-secret')
+
+import handlers
+import sync
+from sync import fetch_changes, record_tombstones, split_changes, tombstone_item, updated_shard
+
+
+def _item(incident_id, shard, updated_at, entity_type='INCIDENT'):
+    return {'incidentId': incident_id, 'updatedShard': shard, 'updatedAt': updated_at, 'entityType': entity_type}
+
+
+def _fake_client(shards):
+    """`shards`: {shard: [items ordenados por updatedAt]}; respeta Limit y ExclusiveStartKey"""
+    client = MagicMock()
+
+    def query(**kwargs):
+        shard = kwargs['KeyConditionExpression'].get_expression()['values'][0].get_expression()['values'][1]
+        items = shards.get(shard, [])
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            items = items[[i['incidentId'] for i in items].index(start['incidentId']) + 1:]
+        page = items[:kwargs['Limit']]
+        resp = {'Items': page}
+        if len(items) > kwargs['Limit']:
+            resp['LastEvaluatedKey'] = sync._index_key(page[-1])
+        return resp
+
+    client.query.side_effect = query
+    return client
+
+
+def test_updated_shard_is_stable_and_in_range(monkeypatch):
+    monkeypatch.setattr(sync, 'SYNC_SHARDS', 4)
+
+    assert updated_shard('inc_1a2b3c4d') == updated_shard('inc_1a2b3c4d')
+    assert {updated_shard(f'inc_{i}') for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_fetch_changes_merges_shards_in_order_and_resumes(monkeypatch):
+    monkeypatch.setattr(sync, 'SYNC_SHARDS', 2)
+    client = _fake_client({
+        0: [_item('a', 0, 10), _item('c', 0, 30), _item('e', 0, 50)],
+        1: [_item('b', 1, 20), _item('d', 1, 40)],
+    })
+    monkeypatch.setattr(sync, 'ddb', MagicMock(meta=MagicMock(client=client)))
+
+    first, state, watermark = fetch_changes(since=5, limit=3, now=100)
+    assert [i['incidentId'] for i in first] == ['a', 'b', 'c']
+    assert watermark == 100 - sync.SYNC_LAG_SECONDS
+    assert state['w'] == watermark
+
+    second, state, _ = fetch_changes(since=5, limit=3, state=state)
+    assert [i['incidentId'] for i in second] == ['d', 'e']
+    assert state is None
+
+
+def test_fetch_changes_splits_the_limit_across_shards(monkeypatch):
+    monkeypatch.setattr(sync, 'SYNC_SHARDS', 4)
+    client = _fake_client({
+        shard: [_item(f'{shard}-{n}', shard, 10 * n + shard) for n in range(5)] for shard in range(4)
+    })
+    monkeypatch.setattr(sync, 'ddb', MagicMock(meta=MagicMock(client=client)))
+
+    seen, state = [], None
+    while True:
+        items, state, _ = fetch_changes(since=0, limit=8, state=state, now=1000)
+        assert len(items) <= 8
+        seen.extend(items)
+        if state is None:
+            break
+
+    # Primera página: 4 shards pendientes, 2 items por shard
+    assert [call.kwargs['Limit'] for call in client.query.call_args_list[:4]] == [2, 2, 2, 2]
+    # Orden global por updatedAt aunque cada shard se lea de a poco, sin repetidos
+    assert [i['updatedAt'] for i in seen] == sorted(i['updatedAt'] for i in seen)
+    assert len(seen) == 20 and len({i['incidentId'] for i in seen}) == 20
+
+
+def test_split_changes_separates_tombstones():
+    tombstone = tombstone_item('inc-9', 1700000000)
+    incidents, deleted = split_changes([_item('inc-1', 0, 1), tombstone])
+
+    assert [i['incidentId'] for i in incidents] == ['inc-1']
+    assert deleted == [{'incidentId': 'inc-9', 'deletedAt': 1700000000}]
+    assert tombstone['ttl'] > tombstone['updatedAt']
+
+
+def test_split_changes_keeps_incidents_without_entity_type():
+    legacy = {'incidentId': 'inc-2', 'updatedAt': 2}
+    comment = {'incidentId': 'cmt-1', 'updatedAt': 3, 'type': 'comment'}
+    incidents, deleted = split_changes([legacy, comment])
+
+    assert incidents == [legacy]
+    assert deleted == []
+
+
+def test_record_tombstones_only_for_removed_incidents():
+    event = {'Records': [
+        {'eventName': 'REMOVE', 'dynamodb': {'OldImage': {'incidentId': {'S': 'inc-1'}, 'entityType': {'S': 'INCIDENT'}}}},
+        {'eventName': 'REMOVE', 'dynamodb': {'OldImage': {'incidentId': {'S': 'TOMBSTONE#inc-0'}, 'entityType': {'S': 'TOMBSTONE'}}}},
+        {'eventName': 'MODIFY', 'dynamodb': {'OldImage': {'incidentId': {'S': 'inc-2'}}}},
+        # Borrado por el job de archivo: no es un borrado para los clientes
+        {'eventName': 'REMOVE', 'dynamodb': {'OldImage': {'incidentId': {'S': 'inc-3'}, 'entityType': {'S': 'INCIDENT'},
+                                                          'archivedAt': {'N': '1735689600'}}}},
+    ]}
+    with patch.object(sync, 'table') as table:
+        record_tombstones(event, None)
+
+    batch = table.batch_writer.return_value.__enter__.return_value
+    batch.put_item.assert_called_once()
+    assert batch.put_item.call_args.kwargs['Item']['incidentId'] == 'TOMBSTONE#inc-1'
+
+
+def test_tombstone_changes_sink_uses_decoded_images():
+    changes = [
+        SimpleNamespace(event_type='REMOVE', old={'incidentId': 'inc-1', 'entityType': 'INCIDENT'}, new={}),
+        SimpleNamespace(event_type='REMOVE', old={'incidentId': 'inc-2', 'archivedAt': 1735689600}, new={}),
+        SimpleNamespace(event_type='MODIFY', old={'incidentId': 'inc-3'}, new={'incidentId': 'inc-3'}),
+    ]
+    with patch.object(sync, 'table') as table:
+        assert sync.tombstone_changes(changes) == []
+
+    batch = table.batch_writer.return_value.__enter__.return_value
+    batch.put_item.assert_called_once()
+    assert batch.put_item.call_args.kwargs['Item']['incidentId'] == 'TOMBSTONE#inc-1'
+
+
+def test_list_incidents_since_returns_changes_and_watermark():
+    with patch.object(handlers, 'fetch_changes') as fetch, patch('handlers.table') as table:
+        fetch.return_value = ([_item('inc-1', 0, 120), tombstone_item('inc-2', 130)], None, 150)
+        response = handlers.list_incidents({'queryStringParameters': {'since': '100'}}, None)
+
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert [i['incidentId'] for i in body['incidents']] == ['inc-1']
+    assert body['deleted'] == [{'incidentId': 'inc-2', 'deletedAt': 130}]
+    assert body['watermark'] == 150
+    assert body['nextCursor'] is None
+    table.scan.assert_not_called()
+    table.query.assert_not_called()
+
+
+def test_list_incidents_since_rejects_invalid_watermark():
+    response = handlers.list_incidents({'queryStringParameters': {'since': 'ayer'}}, None)
+
+    assert response['statusCode'] == 400
@@ -0,0 +1,114 @@
+"""
+Micro-benchmark: decodificación de imágenes del stream de incidentes.
+
+Compara TypeDeserializer de boto3 (el camino anterior, más la conversión de
+Decimal a int/float que venía después) contra stream_decoder.decode_image,
+con todos los campos y solo con los que usan los sinks, sobre batches
+realistas de records MODIFY (NewImage + OldImage).
+
+Uso: python benchmarks/bench_stream_decoder.py
+"""
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from stream_decoder import decode_image
+
+BATCHES = (10, 100, 1_000)
+# Unión de broadcaster.STREAM_FIELDS y notifier.STREAM_FIELDS
+SINK_FIELDS = frozenset({
+    'incidentId', 'entityType', 'status', 'urgencia', 'ubicacion', 'locationKey', 'titulo',
+    'descripcion', 'createdAt', 'updatedAt', 'reporterId', 'assignedTo',
+})
+
+_des = TypeDeserializer()
+_ser = TypeSerializer()
+
+
+def to_native(obj):
+    # Lo que hacía ddb_json / decimal_to_number con los Decimal de TypeDeserializer
+    if isinstance(obj, dict):
+        return {k: to_native(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [to_native(v) for v in obj]
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    return obj
+
+
+def legacy_decode(image):
+    return to_native({k: _des.deserialize(v) for k, v in image.items()})
+
+
+def make_image(i, status):
+    item = {
+        'incidentId': f'inc_{i:08x}',
+        'entityType': 'INCIDENT',
+        'status': status,
+        'urgencia': ('baja', 'media', 'alta')[i % 3],
+        'ubicacion': f'Edificio {chr(65 + i % 6)} - Lab {100 + i % 400}',
+        'locationKey': f'UTEC#{chr(65 + i % 6)}#{chr(65 + i % 6)}1#{chr(65 + i % 6)}{100 + i % 400}',
+        'locationCampus': 'UTEC',
+        'titulo': 'Fuga de agua en el baño del segundo piso',
+        'descripcion': 'Se observa agua en el piso cerca de los lavaderos',
+        'reporterId': f'user{i % 5000}',
+        'reporterEmail': f'user{i % 5000}@utec.edu.pe',
+        'assignedTo': f'staff{i % 40}',
+        'createdAt': Decimal(1700000000 + i),
+        'updatedAt': Decimal(1700000100 + i),
+        'updatedShard': Decimal(i % 8),
+        'commentCount': Decimal(i % 5),
+        'tags': ['agua', 'baño'],
+        'evidence': {'photos': Decimal(2), 'verified': True},
+    }
+    return {k: _ser.serialize(v) for k, v in item.items()}
+
+
+def make_records(n):
+    return [
+        {'eventName': 'MODIFY', 'dynamodb': {
+            'NewImage': make_image(i, 'in_progress'),
+            'OldImage': make_image(i, 'open'),
+        }}
+        for i in range(n)
+    ]
+
+
+def decode_batch(decode, records):
+    for rec in records:
+        decode(rec['dynamodb']['NewImage'])
+        decode(rec['dynamodb']['OldImage'])
+
+
+def measure(decode, records, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decode_batch(decode, records)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    fast_all = decode_image
+    fast_fields = lambda image: decode_image(image, SINK_FIELDS)
+    print(f"{'records':>8} {'boto3 ms':>9} {'fast ms':>8} {'speedup':>8} {'fields ms':>10} {'speedup':>8}")
+    for n in BATCHES:
+        records = make_records(n)
+        sample = records[0]['dynamodb']['NewImage']
+        assert legacy_decode(sample) == fast_all(sample)
+        repeat = 20 if n < 1_000 else 5
+        legacy_t = measure(legacy_decode, records, repeat)
+        fast_t = measure(fast_all, records, repeat)
+        fields_t = measure(fast_fields, records, repeat)
+        print(f'{n:>8} {legacy_t * 1000:>9.2f} {fast_t * 1000:>8.2f} {legacy_t / fast_t:>7.1f}x '
+              f'{fields_t * 1000:>10.2f} {legacy_t / fields_t:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
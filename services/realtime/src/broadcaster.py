@@ -1,35 +1,46 @@
 import os
-import json
-import boto3
-from boto3.dynamodb.types import TypeDeserializer
+import ddb_json
+from connection_registry import ConnectionRegistry
+from fanout import fan_out_deliveries, make_client
+from personal import personal_events, resolve_deliveries
+from stream_records import batch_item_failures, decode_changes, invocation_deadline
 
-_des = TypeDeserializer()
-_apigw = boto3.client('apigatewaymanagementapi', endpoint_url=os.environ['WS_CALLBACK_URL'])
-_table = boto3.resource('dynamodb').Table(os.environ['CONNECTIONS_TABLE'])
+# Atributos que usan build_payload y personal_events: el pipeline decodifica solo estos
+STREAM_FIELDS = frozenset({
+    'incidentId', 'entityType', 'status', 'urgencia', 'ubicacion', 'locationKey', 'titulo',
+    'descripcion', 'createdAt', 'updatedAt', 'reporterId', 'assignedTo',
+})
 
+_apigw = make_client(os.environ['WS_CALLBACK_URL'])
+# Vive mientras el contenedor esté caliente: evita escanear la tabla en cada batch
+_registry = ConnectionRegistry()
 
-def _ddeserialize(dynamo_image):
-    if not dynamo_image:
-        return {}
-    return {k: _des.deserialize(v) for k, v in dynamo_image.items()}
 
+def _is_incident(inc):
+    # Tombstones y otros tipos de item de la tabla no se publican
+    return inc.get('entityType', 'INCIDENT') == 'INCIDENT'
 
-def build_payload(event_type, new_img, old_img):
+
+def build_payload(event_type, new, old):
+    """Evento WebSocket para un cambio ya decodificado, o None"""
     if event_type == 'INSERT':
-        inc = _ddeserialize(new_img)
+        inc = new
+        if not _is_incident(inc):
+            return None
         return {
             'type': 'IncidentCreated',
             'incidentId': inc.get('incidentId'),
             'status': inc.get('status'),
             'urgencia': inc.get('urgencia'),
             'ubicacion': inc.get('ubicacion'),
+            'locationKey': inc.get('locationKey'),
             'titulo': inc.get('titulo'),
             'descripcion': inc.get('descripcion'),
             'createdAt': inc.get('createdAt'),
         }
     if event_type == 'MODIFY':
-        new = _ddeserialize(new_img)
-        old = _ddeserialize(old_img)
+        if not _is_incident(new):
+            return None
         if new.get('status') == old.get('status') and new.get('urgencia') == old.get('urgencia'):
             return None
         return {
@@ -37,28 +48,96 @@ def build_payload(event_type, new_img, old_img):
             'incidentId': new.get('incidentId'),
             'status': new.get('status'),
             'urgencia': new.get('urgencia'),
+            'previousStatus': old.get('status'),
+            'previousUrgencia': old.get('urgencia'),
+            'locationKey': new.get('locationKey'),
             'updatedAt': new.get('updatedAt'),
         }
     return None
 
 
-def handler(event, _context):
-    # Fan-out simple: enviar a todas las conexiones registradas
-    # Para segmentación por rol o scope, añadir filtros/índices
-    items = _table.scan(ProjectionExpression='pk').get('Items', [])
-    connection_ids = [it['pk'].split('#', 1)[1] for it in items]
+def encode_events(payloads):
+    """Serializa una sola vez los eventos del batch: el evento solo o un sobre Batch"""
+    if len(payloads) == 1:
+        return ddb_json.dumpb(payloads[0])
+    return ddb_json.dumpb({'type': 'Batch', 'events': payloads})
 
-    for rec in event.get('Records', []):
-        et = rec.get('eventName')
-        if et not in ('INSERT', 'MODIFY'):
-            continue
-        payload = build_payload(et, rec['dynamodb'].get('NewImage'), rec['dynamodb'].get('OldImage'))
-        if not payload:
+
+def route_payloads(routing, payloads, personal=None, sent=None):
+    """
+    Agrupa las conexiones por el subconjunto de eventos que les corresponde y
+    serializa cada subconjunto distinto una sola vez. `personal` agrega eventos
+    dirigidos ({connectionId: [payload]}) al mismo mensaje de esa conexión.
+    Si se pasa `sent` se completa con {connectionId: [payload]} enviados.
+    Devuelve [(connectionId, [bytes])].
+    """
+    personal = personal or {}
+    subsets = {}
+    for index, payload in enumerate(payloads):
+        for connection_id in routing.match(payload):
+            subsets.setdefault(connection_id, []).append(index)
+    encoded = {}
+    deliveries = []
+    for connection_id in subsets.keys() | personal.keys():
+        key = tuple(subsets.get(connection_id, ()))
+        if sent is not None:
+            sent[connection_id] = [payloads[i] for i in key] + personal.get(connection_id, [])
+        if connection_id in personal:
+            # Pocos por batch (reportante / asignado): se serializan aparte
+            events = [payloads[i] for i in key] + personal[connection_id]
+            deliveries.append((connection_id, [encode_events(events)]))
             continue
-        data = json.dumps(payload).encode('utf-8')
-        for cid in connection_ids:
-            try:
-                _apigw.post_to_connection(ConnectionId=cid, Data=data)
-            except _apigw.exceptions.GoneException:
-                # limpiar conexiones caídas
-                _table.delete_item(Key={'pk': f'CONN#{cid}', 'sk': 'META#'})
+        if key not in encoded:
+            encoded[key] = encode_events([payloads[i] for i in key])
+        deliveries.append((connection_id, [encoded[key]]))
+    return deliveries
+
+
+def broadcast(changes, deadline=None):
+    """
+    Sink de WebSocket: envía los cambios del batch a las conexiones que correspondan.
+    Devuelve los cambios cuyo envío falló por un error transitorio (tras los
+    reintentos del fan-out), para que solo esos records vuelvan a procesarse.
+    Los errores permanentes y las conexiones cerradas se registran y se
+    descartan: reintentar no los arregla.
+    """
+    payloads, personal = [], []
+    origin = {}  # id(payload) -> cambio que lo generó
+    for change in changes:
+        payload = build_payload(change.event_type, change.new, change.old)
+        if payload:
+            payloads.append(payload)
+            origin[id(payload)] = change
+        for user_id, event in personal_events(change.event_type, change.new, change.old):
+            personal.append((user_id, event))
+            origin[id(event)] = change
+    if not payloads and not personal:
+        return []
+
+    # Cada conexión recibe solo los eventos que pasan sus filtros de suscripción
+    # Los eventos personales van por UserIndex, sin recorrer el registro
+    sent = {}
+    deliveries = route_payloads(_registry.routing(), payloads, resolve_deliveries(personal), sent)
+    result = fan_out_deliveries(_apigw, deliveries, deadline=deadline)
+    if result.gone:
+        # limpiar conexiones caídas, en lote y después de enviar
+        try:
+            _registry.discard_many(result.gone)
+        except Exception as e:  # los mensajes ya salieron: no se reintenta el batch por esto
+            print(f'Error discarding gone connections: {e}')
+    for cid, reason in result.failed:
+        print(f'Error posting to {cid}: {reason}')
+
+    failed = {}
+    for connection_id in result.retryable:
+        for event in sent.get(connection_id, []):
+            change = origin[id(event)]
+            failed[id(change)] = change
+    return list(failed.values())
+
+
+def handler(event, context):
+    failed = []
+    changes = decode_changes(event.get('Records', []), STREAM_FIELDS, failed)
+    failed.extend(broadcast(changes, invocation_deadline(context)))
+    return batch_item_failures(failed)
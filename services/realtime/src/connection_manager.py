@@ -3,38 +3,107 @@ import time
 import json
 import boto3
 
+from connection_registry import connection_key, connection_state, lease_expiry, record_change
+from routing import parse_filters
+
 _table = boto3.resource('dynamodb').Table(os.environ['CONNECTIONS_TABLE'])
 
 
 def _get_claims(event):
-    # Works with Lambda Authorizer that injects jwt.claims or simple query params fallback
-    claims = event.get('requestContext', {}).get('authorizer', {}).get('jwt', {}).get('claims', {})
-    if not claims:
-        qs = event.get('queryStringParameters') or {}
-        if qs:
-            claims = {
-                'sub': qs.get('sub') or 'anon',
-                'role': qs.get('role') or 'student',
-            }
-    return claims or {'sub': 'anon', 'role': 'student'}
+    """
+    Claims verificados por el authorizer de $connect (contexto de un Lambda
+    authorizer o jwt.claims), o None si la conexión es anónima. Nunca se toman
+    de query params: cualquiera podría hacerse pasar por otro usuario.
+    """
+    authorizer = event.get('requestContext', {}).get('authorizer') or {}
+    claims = authorizer.get('jwt', {}).get('claims') or authorizer
+    return claims if claims.get('sub') else None
+
+
+def _response(status, body):
+    return {"statusCode": status, "body": json.dumps(body)}
 
 
 def on_connect(event, _context):
     request_ctx = event['requestContext']
     connection_id = request_ctx['connectionId']
     claims = _get_claims(event)
+    try:
+        # Filtros iniciales opcionales: ?status=open&urgencia=alta,media&location=A1
+        filters = parse_filters(event.get('queryStringParameters') or {})
+    except ValueError as e:
+        return _response(400, {"error": str(e)})
     item = {
-        'pk': f'CONN#{connection_id}',
-        'sk': 'META#',
-        'userId': claims.get('sub', 'anon'),
-        'role': claims.get('role', 'student'),
-        'connectedAt': int(time.time())
+        **connection_key(connection_id),
+        'role': claims.get('role', 'student') if claims else 'student',
+        'connectedAt': int(time.time()),
+        # Lease: DynamoDB borra la conexión si el cliente deja de enviar heartbeats
+        'ttl': lease_expiry()
     }
+    if claims:
+        # Solo las conexiones autenticadas entran en UserIndex y reciben eventos personales
+        item['userId'] = claims['sub']
+    if filters:
+        item['filters'] = filters
     _table.put_item(Item=item)
+    # Los registros en memoria de los broadcasters la toman del log de cambios
+    record_change(connection_id, connection_state(item), _table)
     return {"statusCode": 200, "body": json.dumps({"ok": True})}
 
 
 def on_disconnect(event, _context):
     connection_id = event['requestContext']['connectionId']
-    _table.delete_item(Key={'pk': f'CONN#{connection_id}', 'sk': 'META#'})
+    _table.delete_item(Key=connection_key(connection_id))
+    record_change(connection_id, None, _table)
     return {"statusCode": 200, "body": json.dumps({"ok": True})}
+
+
+def on_subscribe(event, _context):
+    """
+    Ruta `subscribe`: reemplaza los filtros de la conexión.
+    Body: {"action": "subscribe", "status": [...], "urgencia": [...], "locations": [...]}
+    Sin filtros, la conexión vuelve a recibir todos los eventos.
+    """
+    connection_id = event['requestContext']['connectionId']
+    try:
+        body = json.loads(event.get('body') or '{}')
+        if not isinstance(body, dict):
+            raise ValueError('el body debe ser un objeto JSON')
+        filters = parse_filters(body)
+    except ValueError as e:  # incluye JSONDecodeError
+        return _response(400, {"error": str(e)})
+    try:
+        if filters:
+            update = {'UpdateExpression': 'SET filters = :f', 'ExpressionAttributeValues': {':f': filters}}
+        else:
+            update = {'UpdateExpression': 'REMOVE filters'}
+        resp = _table.update_item(
+            Key=connection_key(connection_id),
+            ConditionExpression='attribute_exists(pk)',
+            ReturnValues='ALL_NEW',
+            **update
+        )
+    except _table.meta.client.exceptions.ConditionalCheckFailedException:
+        return _response(410, {"error": "Conexión no registrada"})
+    record_change(connection_id, connection_state(resp['Attributes']), _table)
+    return _response(200, {"ok": True, "filters": filters})
+
+
+def on_heartbeat(event, _context):
+    """
+    Ruta `heartbeat`: extiende el lease (`ttl`) de la conexión. No escribe en el
+    log de cambios: el conjunto de conexiones sigue siendo el mismo.
+    """
+    connection_id = event['requestContext']['connectionId']
+    expires_at = lease_expiry()
+    try:
+        _table.update_item(
+            Key=connection_key(connection_id),
+            UpdateExpression='SET #ttl = :ttl',
+            ConditionExpression='attribute_exists(pk)',
+            ExpressionAttributeNames={'#ttl': 'ttl'},
+            ExpressionAttributeValues={':ttl': expires_at}
+        )
+    except _table.meta.client.exceptions.ConditionalCheckFailedException:
+        return _response(410, {"error": "Conexión no registrada"})
+    return _response(200, {"ok": True, "expiresAt": expires_at})
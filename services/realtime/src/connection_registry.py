@@ -0,0 +1,235 @@
+"""
+Registro de conexiones WebSocket en memoria del contenedor.
+
+En vez de escanear la tabla de conexiones en cada batch del stream, el
+broadcaster guarda la lista en memoria y la carga completa (Scan paralelo y
+paginado) solo al arrancar o cada REGISTRY_TTL_SECONDS. Entre cargas aplica
+cambios incrementales: `on_connect`, `on_disconnect` y `on_subscribe` escriben
+cada cambio en un log de la misma tabla (pk `CHANGES#<minuto>[#shard]`, sk
+`<epoch ms>#<connectionId>`, con TTL), y cada lectura consulta solo las
+entradas nuevas del minuto en curso. No hay un item único que todas las
+conexiones actualicen. La tabla de ruteo (ver routing.py) se recompila solo
+cuando algo cambió.
+"""
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from routing import RoutingTable
+
+CONNECTIONS_TABLE = os.environ['CONNECTIONS_TABLE']
+REGISTRY_TTL_SECONDS = float(os.environ.get('REGISTRY_TTL_SECONDS', '300'))
+REGISTRY_SCAN_SEGMENTS = int(os.environ.get('REGISTRY_SCAN_SEGMENTS', '4'))
+# Lease de cada conexión: `ttl` en la tabla, extendido por la ruta heartbeat.
+# Debe ser mayor que REGISTRY_TTL_SECONDS para no descartar conexiones vivas
+CONNECTION_TTL_SECONDS = int(os.environ.get('CONNECTION_TTL_SECONDS', '900'))
+# Log de cambios: particiones por minuto, opcionalmente repartidas en shards
+REGISTRY_CHANGE_SHARDS = int(os.environ.get('REGISTRY_CHANGE_SHARDS', '1'))
+# Las entradas del log viven más que REGISTRY_TTL_SECONDS: un registro nunca se salta cambios
+REGISTRY_CHANGE_TTL_SECONDS = int(os.environ.get('REGISTRY_CHANGE_TTL_SECONDS', '3600'))
+# Solapamiento al releer el log: cubre escrituras en vuelo y diferencias de reloj
+REGISTRY_CHANGE_LAG_MS = int(os.environ.get('REGISTRY_CHANGE_LAG_MS', '2000'))
+
+CONN_PREFIX = 'CONN#'
+META_SK = 'META#'
+CHANGES_PREFIX = 'CHANGES#'
+
+_ddb = boto3.resource('dynamodb')
+_table = _ddb.Table(CONNECTIONS_TABLE)
+
+
+def connection_key(connection_id):
+    return {'pk': f'{CONN_PREFIX}{connection_id}', 'sk': META_SK}
+
+
+def lease_expiry(now=None):
+    """Valor de `ttl` (epoch) para una conexión que acaba de dar señales de vida"""
+    return int(time.time() if now is None else now) + CONNECTION_TTL_SECONDS
+
+
+def _change_partitions(minute):
+    if REGISTRY_CHANGE_SHARDS <= 1:
+        return [f'{CHANGES_PREFIX}{minute}']
+    return [f'{CHANGES_PREFIX}{minute}#{shard}' for shard in range(REGISTRY_CHANGE_SHARDS)]
+
+
+def connection_state(item):
+    """Lo que el registro guarda de una conexión, a partir de su item"""
+    return {'userId': item.get('userId'), 'role': item.get('role'), 'filters': item.get('filters') or {}}
+
+
+def change_item(connection_id, state, now_ms):
+    partitions = _change_partitions(now_ms // 60000)
+    item = {
+        'pk': partitions[zlib.crc32(connection_id.encode('utf-8')) % len(partitions)],
+        'sk': f'{now_ms:013d}#{connection_id}',
+        'connectionId': connection_id,
+        'ttl': now_ms // 1000 + REGISTRY_CHANGE_TTL_SECONDS,
+    }
+    if state is not None:
+        item['connection'] = state
+    return item
+
+
+def record_change(connection_id, state=None, table=None, now_ms=None):
+    """
+    Anota en el log que la conexión cambió: `state` es su estado nuevo
+    (connection_state) o None si se cerró.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    (table or _table).put_item(Item=change_item(connection_id, state, now_ms))
+
+
+def read_changes(since_ms, until_ms, client=None, table_name=CONNECTIONS_TABLE):
+    """Entradas del log con sk en [since_ms, until_ms], en orden"""
+    client = client or _ddb.meta.client
+    partitions = [pk for minute in range(since_ms // 60000, until_ms // 60000 + 1)
+                  for pk in _change_partitions(minute)]
+
+    def query(pk):
+        kwargs = {
+            'TableName': table_name,
+            'KeyConditionExpression': 'pk = :pk AND sk BETWEEN :from AND :to',
+            'ExpressionAttributeValues': {':pk': pk, ':from': f'{since_ms:013d}', ':to': f'{until_ms:013d}~'},
+            'ConsistentRead': True,
+        }
+        found = []
+        while True:
+            resp = client.query(**kwargs)
+            found.extend(resp.get('Items', []))
+            if not resp.get('LastEvaluatedKey'):
+                return found
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=min(len(partitions), 8)) as pool:
+        pages = list(pool.map(query, partitions))
+    return sorted((item for items in pages for item in items), key=lambda item: item['sk'])
+
+
+def scan_connections(client=None, table_name=CONNECTIONS_TABLE, segments=REGISTRY_SCAN_SEGMENTS, now=None):
+    """Lee todas las conexiones con lease vigente (todas las páginas) con un Scan paralelo"""
+    # El client del resource es thread-safe y deserializa los atributos
+    client = client or _ddb.meta.client
+    # El borrado por TTL de DynamoDB puede tardar horas: los leases vencidos se filtran acá
+    now = int(time.time() if now is None else now)
+
+    def scan_segment(segment):
+        kwargs = {
+            'TableName': table_name,
+            'Segment': segment,
+            'TotalSegments': segments,
+            # Conexiones previas a los leases no tienen ttl: se mantienen
+            'FilterExpression': 'begins_with(pk, :conn) AND (attribute_not_exists(#ttl) OR #ttl > :now)',
+            'ExpressionAttributeValues': {':conn': CONN_PREFIX, ':now': now},
+            'ProjectionExpression': 'pk, userId, #r, filters',
+            'ExpressionAttributeNames': {'#r': 'role', '#ttl': 'ttl'},
+        }
+        found = []
+        while True:
+            resp = client.scan(**kwargs)
+            found.extend(resp.get('Items', []))
+            if not resp.get('LastEvaluatedKey'):
+                return found
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        pages = list(pool.map(scan_segment, range(segments)))
+
+    connections = {}
+    for items in pages:
+        for item in items:
+            connection_id = item['pk'][len(CONN_PREFIX):]
+            connections[connection_id] = dict(connection_state(item), connectionId=connection_id)
+    return connections
+
+
+class ConnectionRegistry:
+    """Conexiones activas: carga completa cada `ttl_seconds` y cambios incrementales entre medio"""
+
+    def __init__(self, table=None, loader=scan_connections, changes=read_changes,
+                 ttl_seconds=REGISTRY_TTL_SECONDS, clock=time.monotonic, wall_clock=time.time):
+        self._table = table or _table
+        self._loader = loader
+        self._changes = changes
+        self._ttl = ttl_seconds
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._lock = threading.Lock()
+        self._connections = None
+        self._loaded_at = 0.0
+        # Hasta dónde (epoch ms) se aplicó el log de cambios
+        self._synced_ms = 0
+        self._routing = None
+
+    def _now_ms(self):
+        return int(self._wall_clock() * 1000)
+
+    def _refresh(self):
+        if self._connections is None or self._clock() - self._loaded_at >= self._ttl:
+            # Los cambios escritos durante el Scan se vuelven a aplicar en la próxima lectura
+            self._synced_ms = self._now_ms() - REGISTRY_CHANGE_LAG_MS
+            self._connections = self._loader()
+            self._loaded_at = self._clock()
+            self._routing = None
+            return
+        until_ms = self._now_ms()
+        # Releer el solapamiento es seguro: cada entrada trae el estado completo y se aplican en orden
+        for change in self._changes(self._synced_ms - REGISTRY_CHANGE_LAG_MS, until_ms):
+            connection_id = change['connectionId']
+            if 'connection' in change:
+                state = dict(connection_state(change['connection']), connectionId=connection_id)
+                if self._connections.get(connection_id) == state:
+                    continue
+                self._connections[connection_id] = state
+            elif self._connections.pop(connection_id, None) is None:
+                continue
+            self._routing = None
+        self._synced_ms = until_ms
+
+    def connections(self):
+        """Devuelve {connectionId: {'connectionId', 'userId', 'role', 'filters'}}"""
+        with self._lock:
+            self._refresh()
+            # Copia: `discard` puede modificar el registro mientras el llamador itera
+            return dict(self._connections)
+
+    def routing(self):
+        """Tabla de ruteo compilada para las conexiones actuales"""
+        with self._lock:
+            self._refresh()
+            if self._routing is None:
+                self._routing = RoutingTable(self._connections)
+            return self._routing
+
+    def discard(self, connection_id):
+        """Borra una conexión caída de la tabla y del registro local"""
+        self.discard_many([connection_id])
+
+    def discard_many(self, connection_ids):
+        """
+        Borra conexiones caídas en lote y anota los borrados en el log para los
+        demás contenedores. batch_writer agrupa las escrituras en BatchWriteItem
+        de a 25 y reintenta los no procesados.
+        """
+        connection_ids = list(dict.fromkeys(connection_ids))
+        if not connection_ids:
+            return
+        now_ms = self._now_ms()
+        with self._table.batch_writer() as batch:
+            for connection_id in connection_ids:
+                batch.delete_item(Key=connection_key(connection_id))
+                batch.put_item(Item=change_item(connection_id, None, now_ms))
+        with self._lock:
+            if self._connections is not None:
+                for connection_id in connection_ids:
+                    self._connections.pop(connection_id, None)
+                self._routing = None
+
+    def clear(self):
+        with self._lock:
+            self._connections = None
+            self._routing = None
@@ -0,0 +1,52 @@
+"""
+Serialización JSON de items de DynamoDB en una sola pasada.
+
+boto3 devuelve números como Decimal, string sets / number sets como set y
+binarios como Binary. En vez de copiar cada item para convertirlos antes de
+json.dumps, el encoder los resuelve en su hook `default` mientras escribe, sin
+estructuras intermedias. Si orjson está instalado se usa como backend.
+
+Este módulo es compartido: services/incidents/src/ddb_json.py es la fuente y
+services/realtime/src/ddb_json.py una copia idéntica (cada servicio se
+empaqueta por separado).
+"""
+import base64
+import json
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+
+try:
+    import orjson
+except ImportError:  # backend opcional
+    orjson = None
+
+
+def json_default(obj):
+    """Hook `default` para tipos de DynamoDB que json no conoce"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Binary):
+        return base64.b64encode(obj.value).decode('ascii')
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode('ascii')
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+_encoder = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def dumpb(obj):
+    """Serializa `obj` a bytes UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default)
+    return _encoder.encode(obj).encode('utf-8')
+
+
+def dumps(obj):
+    """Serializa `obj` a str (p. ej. para el body de una respuesta de API Gateway)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default).decode('utf-8')
+    return _encoder.encode(obj)
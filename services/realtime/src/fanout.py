@@ -0,0 +1,122 @@
+"""
+Fan-out concurrente de mensajes WebSocket.
+
+Cada conexión recibe sus mensajes en orden, pero las conexiones se atienden
+en paralelo sobre un pool acotado de threads (FANOUT_CONCURRENCY). El client
+de API Gateway Management se crea con un pool HTTP del mismo tamaño y
+timeouts cortos, así una conexión lenta no frena a las demás y el tiempo
+total sigue a la conexión más lenta, no a la suma de todas.
+
+Los reintentos son solo los propios (el client no reintenta) y respetan un
+`deadline` (time.monotonic()) derivado del tiempo que le queda a la
+invocación: no se empieza un envío o reintento que no alcanza a terminar.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+FANOUT_CONCURRENCY = int(os.environ.get('FANOUT_CONCURRENCY', '64'))
+FANOUT_TIMEOUT_SECONDS = float(os.environ.get('FANOUT_TIMEOUT_SECONDS', '3'))
+# Conectar a API Gateway en la misma región toma milisegundos (y el pool reutiliza conexiones)
+FANOUT_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('FANOUT_CONNECT_TIMEOUT_SECONDS', '1'))
+# Peor caso de un intento: connect_timeout + read_timeout
+FANOUT_ATTEMPT_SECONDS = FANOUT_CONNECT_TIMEOUT_SECONDS + FANOUT_TIMEOUT_SECONDS
+# Reintentos propios para errores transitorios, con backoff exponencial
+FANOUT_RETRY_ATTEMPTS = int(os.environ.get('FANOUT_RETRY_ATTEMPTS', '2'))
+FANOUT_RETRY_BASE_SECONDS = float(os.environ.get('FANOUT_RETRY_BASE_SECONDS', '0.1'))
+
+TRANSIENT_ERRORS = frozenset({
+    'LimitExceededException', 'ThrottlingException', 'TooManyRequestsException',
+    'InternalServerError', 'InternalFailure', 'ServiceUnavailable',
+})
+
+
+@dataclass
+class FanoutResult:
+    sent: int = 0
+    # Conexiones cerradas (GoneException): se limpian al final, en lote
+    gone: list = field(default_factory=list)
+    # (connectionId, motivo) de los envíos que fallaron por otra razón, ya reintentados
+    failed: list = field(default_factory=list)
+    # Subconjunto de `failed` con errores transitorios: vale la pena reintentar el record
+    retryable: list = field(default_factory=list)
+
+
+def make_client(endpoint_url, concurrency=FANOUT_CONCURRENCY, timeout=FANOUT_TIMEOUT_SECONDS,
+                connect_timeout=FANOUT_CONNECT_TIMEOUT_SECONDS):
+    """Client de API Gateway Management con pool HTTP dimensionado para el fan-out"""
+    return boto3.client('apigatewaymanagementapi', endpoint_url=endpoint_url, config=Config(
+        max_pool_connections=concurrency,
+        connect_timeout=connect_timeout,
+        read_timeout=timeout,
+        # Sin reintentos del client: los de _post son los únicos y se cortan con el deadline
+        retries={'max_attempts': 1, 'mode': 'standard'}
+    ))
+
+
+def _post(client, connection_id, data, retries, sleep, deadline=None, clock=time.monotonic):
+    """Un post con reintentos acotados. Devuelve None, 'gone' o (motivo, transitorio)"""
+    error = ('sin tiempo antes del timeout de la invocación', True)
+    for attempt in range(retries + 1):
+        delay = FANOUT_RETRY_BASE_SECONDS * 2 ** (attempt - 1) if attempt else 0
+        if deadline is not None and clock() + delay + FANOUT_ATTEMPT_SECONDS > deadline:
+            return error
+        if delay:
+            sleep(delay)
+        try:
+            client.post_to_connection(ConnectionId=connection_id, Data=data)
+            return None
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code', '')
+            if code == 'GoneException':
+                return 'gone'
+            error = (code or str(e), code in TRANSIENT_ERRORS)
+        except BotoCoreError as e:  # timeouts y errores de red
+            error = (str(e), True)
+        if not error[1]:
+            return error
+    return error
+
+
+def _send_all(client, connection_id, messages, retries=FANOUT_RETRY_ATTEMPTS, sleep=time.sleep, deadline=None):
+    """Envía `messages` en orden a una conexión. Devuelve (enviados, None | 'gone' | (motivo, transitorio))"""
+    sent = 0
+    for data in messages:
+        error = _post(client, connection_id, data, retries, sleep, deadline)
+        if error:
+            return sent, error
+        sent += 1
+    return sent, None
+
+
+def fan_out(client, connection_ids, messages, concurrency=FANOUT_CONCURRENCY, deadline=None):
+    """Envía todos los `messages` (bytes) a cada conexión de `connection_ids`"""
+    if not messages:
+        return FanoutResult()
+    return fan_out_deliveries(client, ((cid, messages) for cid in connection_ids), concurrency, deadline)
+
+
+def fan_out_deliveries(client, deliveries, concurrency=FANOUT_CONCURRENCY, deadline=None):
+    """Como `fan_out`, pero con mensajes propios por conexión: [(connectionId, [bytes])]"""
+    result = FanoutResult()
+    deliveries = [(cid, messages) for cid, messages in deliveries if messages]
+    if not deliveries:
+        return result
+    workers = max(1, min(concurrency, len(deliveries)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = pool.map(lambda d: (d[0], _send_all(client, d[0], d[1], deadline=deadline)), deliveries)
+        for connection_id, (sent, error) in outcomes:
+            result.sent += sent
+            if error == 'gone':
+                result.gone.append(connection_id)
+            elif error:
+                reason, transient = error
+                result.failed.append((connection_id, reason))
+                if transient:
+                    result.retryable.append(connection_id)
+    return result
@@ -0,0 +1,85 @@
+"""
+Reglas de notificación por transición de estado.
+
+Cada regla describe un cambio de un campo del incidente (`field`) hacia
+alguno de los valores `to`, opcionalmente desde alguno de `from`. Solo hay
+match cuando el valor realmente cambió, así un incidente que ya era 'alta'
+no vuelve a avisar porque lo asignaron. Un INSERT cuenta como transición
+desde "sin valor".
+
+Las reglas se leen de NOTIFICATION_RULES (JSON) o del archivo
+NOTIFICATION_RULES_FILE (por defecto notification_rules.json junto a este
+módulo) y se compilan una vez por contenedor. Los `roles` de cada regla y el
+edificio del incidente viajan como atributos del mensaje SNS para que las
+filter policies de las suscripciones descarten lo que no les corresponde.
+"""
+import json
+import os
+
+NOTIFICATION_RULES_FILE = os.environ.get(
+    'NOTIFICATION_RULES_FILE', os.path.join(os.path.dirname(__file__), 'notification_rules.json'))
+RULE_FIELDS = ('status', 'urgencia')
+
+
+class Rule:
+    """Regla compilada: valores normalizados en frozensets"""
+
+    __slots__ = ('name', 'field', 'to', 'source', 'roles')
+
+    def __init__(self, name, field, to, source=None, roles=()):
+        if field not in RULE_FIELDS:
+            raise ValueError(f'regla {name}: campo no soportado {field}')
+        if not to:
+            raise ValueError(f'regla {name}: `to` no puede estar vacío')
+        self.name = name
+        self.field = field
+        self.to = frozenset(v.lower() for v in to)
+        self.source = frozenset(v.lower() for v in source) if source else None
+        self.roles = tuple(roles)
+
+    def matches(self, new, old):
+        after = (new.get(self.field) or '').lower()
+        before = (old.get(self.field) or '').lower()
+        if after == before or after not in self.to or before in self.to:
+            return False
+        return self.source is None or before in self.source
+
+
+def compile_rules(config):
+    """Lista de dicts de configuración -> [Rule]. Lanza ValueError si es inválida"""
+    if not isinstance(config, list):
+        raise ValueError('las reglas deben ser una lista')
+    return [
+        Rule(rule['name'], rule['field'], rule['to'], rule.get('from'), rule.get('roles', ()))
+        for rule in config
+    ]
+
+
+def load_rules():
+    raw = os.environ.get('NOTIFICATION_RULES')
+    if not raw:
+        with open(NOTIFICATION_RULES_FILE, encoding='utf-8') as fh:
+            raw = fh.read()
+    return compile_rules(json.loads(raw))
+
+
+def matching_rules(rules, new, old):
+    return [rule for rule in rules if rule.matches(new, old)]
+
+
+def building_of(incident):
+    """Edificio a partir de locationKey (UTEC#A#A1#A101 -> A)"""
+    segments = (incident.get('locationKey') or '').split('#')
+    return segments[1] if len(segments) > 1 else 'unknown'
+
+
+def message_attributes(alert):
+    """Atributos SNS para filter policies: building, urgency, role y rule"""
+    attributes = {
+        'building': {'DataType': 'String', 'StringValue': alert.get('building') or 'unknown'},
+        'urgency': {'DataType': 'String', 'StringValue': alert.get('urgencia') or 'unknown'},
+        'rule': {'DataType': 'String.Array', 'StringValue': json.dumps(alert['rules'])},
+    }
+    if alert.get('roles'):
+        attributes['role'] = {'DataType': 'String.Array', 'StringValue': json.dumps(alert['roles'])}
+    return attributes
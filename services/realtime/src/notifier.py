@@ -1,37 +1,124 @@
 import os
-import json
+import time
+
 import boto3
-from boto3.dynamodb.types import TypeDeserializer
+import ddb_json
+from botocore.exceptions import BotoCoreError, ClientError
+
+from notification_rules import building_of, load_rules, matching_rules, message_attributes
+from stream_records import batch_item_failures, decode_changes, invocation_deadline
 
-_des = TypeDeserializer()
 _sns = boto3.client('sns')
 TOPIC_ARN = os.environ['SNS_TOPIC_ARN']
 
+# PublishBatch acepta hasta 10 mensajes por llamada
+PUBLISH_BATCH_SIZE = 10
+PUBLISH_MAX_ATTEMPTS = int(os.environ.get('PUBLISH_MAX_ATTEMPTS', '3'))
+PUBLISH_RETRY_BASE_SECONDS = float(os.environ.get('PUBLISH_RETRY_BASE_SECONDS', '0.2'))
+
+# Atributos que usa build_alert: el pipeline decodifica solo estos
+STREAM_FIELDS = frozenset({
+    'incidentId', 'entityType', 'status', 'urgencia', 'titulo', 'ubicacion', 'locationKey',
+})
+
+# Compiladas una vez por contenedor; una configuración inválida falla al iniciar
+_rules = load_rules()
+
+
+def build_alert(event_type, new, old, rules=None):
+    """
+    Mensaje de alerta para un incidente (ya coalescido y decodificado), o None si
+    ninguna regla de transición aplica. Cambios que no mueven status ni urgencia no avisan.
+    """
+    if event_type not in ('INSERT', 'MODIFY') or new.get('entityType', 'INCIDENT') != 'INCIDENT':
+        return None
+    old = old if event_type == 'MODIFY' else {}
+    matched = matching_rules(_rules if rules is None else rules, new, old)
+    if not matched:
+        return None
+
+    roles = sorted({role for rule in matched for role in rule.roles})
+    return {
+        'incidentId': new.get('incidentId'),
+        'status': (new.get('status') or '').lower(),
+        'urgencia': (new.get('urgencia') or '').lower(),
+        'previousStatus': old.get('status'),
+        'previousUrgencia': old.get('urgencia'),
+        'titulo': new.get('titulo'),
+        'ubicacion': new.get('ubicacion'),
+        'building': building_of(new),
+        'rules': [rule.name for rule in matched],
+        'roles': roles,
+    }
+
+
+def publish_batch(alerts, client=None, topic_arn=None, max_attempts=PUBLISH_MAX_ATTEMPTS, sleep=time.sleep,
+                  deadline=None, clock=time.monotonic):
+    """
+    Publica `alerts` con PublishBatch en grupos de 10. Las entradas que SNS
+    rechaza por un error propio, o todo el grupo si la llamada falla, se
+    reintentan con backoff exponencial; las que son culpa del request
+    (SenderFault) no. Un reintento cuyo backoff pasaría el `deadline` no se hace.
+    Devuelve [(alert, motivo, reintentable)] no publicados.
+    """
+    client = client or _sns
+    topic_arn = topic_arn or TOPIC_ARN
+    failed = []
+    for start in range(0, len(alerts), PUBLISH_BATCH_SIZE):
+        pending = {str(i): alert for i, alert in enumerate(alerts[start:start + PUBLISH_BATCH_SIZE])}
+        for attempt in range(max_attempts):
+            if attempt:
+                delay = PUBLISH_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+                if deadline is not None and clock() + delay > deadline:
+                    break
+                sleep(delay)
+            try:
+                resp = client.publish_batch(TopicArn=topic_arn, PublishBatchRequestEntries=[
+                    {'Id': entry_id, 'Subject': 'AlertaUTEC Incidente', 'Message': ddb_json.dumps(alert),
+                     'MessageAttributes': message_attributes(alert)}
+                    for entry_id, alert in pending.items()
+                ])
+            except (ClientError, BotoCoreError) as e:
+                reason = str(e)
+                continue
+            reason = 'reintentos agotados'
+            retry = {}
+            for entry in resp.get('Failed', []):
+                if entry.get('SenderFault'):
+                    failed.append((pending[entry['Id']], entry.get('Code') or entry.get('Message'), False))
+                else:
+                    retry[entry['Id']] = pending[entry['Id']]
+            pending = retry
+            if not pending:
+                break
+        failed.extend((alert, reason, True) for alert in pending.values())
+    return failed
+
+
+def notify(changes, deadline=None):
+    """
+    Sink de SNS: un solo aviso por incidente y batch, con su último estado.
+    Devuelve los cambios cuyo aviso no se pudo publicar por un error transitorio.
+    """
+    alerts = []
+    origin = {}  # id(alert) -> cambio que lo generó
+    for change in changes:
+        alert = build_alert(change.event_type, change.new, change.old)
+        if alert:
+            alerts.append(alert)
+            origin[id(alert)] = change
+    if not alerts:
+        return []
+    failed = []
+    for alert, reason, retryable in publish_batch(alerts, deadline=deadline):
+        print(f"Error publishing alert for {alert.get('incidentId')}: {reason}")
+        if retryable:
+            failed.append(origin[id(alert)])
+    return failed
+
 
-def _ddeserialize(dynamo_image):
-    if not dynamo_image:
-        return {}
-    return {k: _des.deserialize(v) for k, v in dynamo_image.items()}
-
-
-def handler(event, _context):
-    for rec in event.get('Records', []):
-        et = rec.get('eventName')
-        if et not in ('INSERT', 'MODIFY'):
-            continue
-        new = _ddeserialize(rec['dynamodb'].get('NewImage'))
-        urg = (new.get('urgencia') or '').lower()
-        status = (new.get('status') or '').lower()
-
-        should_notify = urg in ('alta', 'crítica', 'critica') or status in ('in_progress', 'escalated')
-        if not should_notify:
-            continue
-
-        msg = {
-            'id': new.get('id'),
-            'status': status,
-            'urgencia': urg,
-            'titulo': new.get('titulo'),
-            'ubicacion': new.get('ubicacion'),
-        }
-        _sns.publish(TopicArn=TOPIC_ARN, Subject='AlertaUTEC Incidente', Message=json.dumps(msg))
+def handler(event, context):
+    failed = []
+    changes = decode_changes(event.get('Records', []), STREAM_FIELDS, failed)
+    failed.extend(notify(changes, invocation_deadline(context)))
+    return batch_item_failures(failed)
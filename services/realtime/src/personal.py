@@ -0,0 +1,86 @@
+"""
+Entrega dirigida a usuarios concretos (reportante y asignado de un incidente).
+
+Las conexiones se buscan con un Query a UserIndex (GSI por userId de la
+tabla de conexiones), así avisar a una persona cuesta O(conexiones de ese
+usuario) y no recorrer todas las conexiones abiertas.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+
+from connection_registry import CONN_PREFIX, CONNECTIONS_TABLE
+
+USER_INDEX = os.environ.get('CONNECTIONS_USER_INDEX', 'UserIndex')
+# Usuarios sin identidad comparten este userId: nunca se les envía nada personal
+ANONYMOUS_USER = 'anon'
+
+# El client del resource es thread-safe y deserializa: se consulta en paralelo
+_client = boto3.resource('dynamodb').meta.client
+
+
+def user_connections(user_id, client=None, now=None):
+    """connectionIds con lease vigente de `user_id` (todas las páginas de UserIndex)"""
+    kwargs = {
+        'TableName': CONNECTIONS_TABLE,
+        'IndexName': USER_INDEX,
+        'KeyConditionExpression': Key('userId').eq(user_id),
+        # UserIndex proyecta `ttl`: los leases vencidos que TTL aún no borró se ignoran
+        'FilterExpression': Attr('ttl').not_exists() | Attr('ttl').gt(int(time.time() if now is None else now)),
+        'ProjectionExpression': 'pk',
+    }
+    connection_ids = []
+    while True:
+        resp = (client or _client).query(**kwargs)
+        connection_ids.extend(item['pk'][len(CONN_PREFIX):] for item in resp.get('Items', [])
+                              if item['pk'].startswith(CONN_PREFIX))
+        if not resp.get('LastEvaluatedKey'):
+            return connection_ids
+        kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+
+def personal_events(event_type, new, old):
+    """
+    Eventos personales [(userId, payload)] para un cambio de incidente ya
+    deserializado: el reportante se entera de los cambios de estado o urgencia
+    y quien queda asignado recibe el incidente.
+    """
+    if event_type != 'MODIFY' or new.get('entityType', 'INCIDENT') != 'INCIDENT':
+        return []
+    events = []
+    base = {
+        'incidentId': new.get('incidentId'),
+        'status': new.get('status'),
+        'urgencia': new.get('urgencia'),
+        'updatedAt': new.get('updatedAt'),
+    }
+    if new.get('status') != old.get('status') or new.get('urgencia') != old.get('urgencia'):
+        events.append((new.get('reporterId'), dict(base, type='YourIncidentUpdated',
+                                                   previousStatus=old.get('status'),
+                                                   previousUrgencia=old.get('urgencia'))))
+    if new.get('assignedTo') and new.get('assignedTo') != old.get('assignedTo'):
+        events.append((new['assignedTo'], dict(base, type='IncidentAssignedToYou',
+                                               titulo=new.get('titulo'), ubicacion=new.get('ubicacion'))))
+    return [(user_id, payload) for user_id, payload in events if user_id and user_id != ANONYMOUS_USER]
+
+
+def resolve_deliveries(events, lookup=user_connections, workers=8):
+    """
+    Agrupa eventos personales por conexión: {connectionId: [payload]}.
+    Cada usuario se consulta una sola vez aunque tenga varios eventos.
+    """
+    by_user = {}
+    for user_id, payload in events:
+        by_user.setdefault(user_id, []).append(payload)
+    if not by_user:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(by_user)))) as pool:
+        found = dict(zip(by_user, pool.map(lookup, by_user)))
+    deliveries = {}
+    for user_id, payloads in by_user.items():
+        for connection_id in found[user_id]:
+            deliveries.setdefault(connection_id, []).extend(payloads)
+    return deliveries
@@ -0,0 +1,102 @@
+"""
+Filtros de suscripción y tabla de ruteo de eventos WebSocket.
+
+Cada conexión guarda `filters` ({status, urgencia, locations}) y su `role`.
+`RoutingTable` precompila esos filtros en índices invertidos (valor ->
+conexiones, más el conjunto "sin filtro" de cada dimensión), así rutear un
+evento es intersectar unos pocos sets en vez de evaluar cada conexión.
+"""
+import json
+import os
+
+# Copia idéntica de services/incidents/src/location.py (lo verifica su test)
+from location import location_query
+
+FILTER_DIMENSIONS = ('status', 'urgencia')
+MAX_FILTER_VALUES = 20
+
+# Audiencia por tipo de evento, p. ej. {"IncidentStatusChanged": ["staff", "authority"]}.
+# Un tipo sin entrada llega a todos los roles.
+EVENT_AUDIENCE = json.loads(os.environ.get('EVENT_AUDIENCE') or '{}')
+
+def location_prefix(value):
+    """'A1' -> 'UTEC#A#A1', con el mismo parser que GET /incidents?location=. Lanza ValueError"""
+    return location_query(value)[1]
+
+
+def _values(raw):
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    values = [str(v).strip() for v in raw if str(v).strip()]
+    if len(values) > MAX_FILTER_VALUES:
+        raise ValueError(f'a lo más {MAX_FILTER_VALUES} valores por filtro')
+    return values
+
+
+def parse_filters(source):
+    """
+    Normaliza los filtros de una suscripción (query params de $connect o body de
+    `subscribe`). Acepta listas o strings separados por coma. Lanza ValueError.
+    """
+    filters = {}
+    for name in FILTER_DIMENSIONS:
+        values = _values(source.get(name))
+        if values:
+            filters[name] = sorted({v.lower() for v in values})
+    locations = _values(source.get('locations') or source.get('location'))
+    if locations:
+        filters['locations'] = sorted({location_prefix(v) for v in locations})
+    return filters
+
+
+def _location_prefixes(location_key):
+    segments = (location_key or '').split('#')
+    return ['#'.join(segments[:i]) for i in range(1, len(segments) + 1) if segments[0]]
+
+
+class RoutingTable:
+    """Índices invertidos de filtros -> connectionIds"""
+
+    def __init__(self, connections):
+        self._all = set()
+        self._by_value = {name: {} for name in FILTER_DIMENSIONS + ('locations',)}
+        self._unfiltered = {name: set() for name in FILTER_DIMENSIONS + ('locations',)}
+        self._by_role = {}
+        for connection_id, conn in connections.items():
+            self._all.add(connection_id)
+            self._by_role.setdefault(conn.get('role') or 'student', set()).add(connection_id)
+            filters = conn.get('filters') or {}
+            for name in self._by_value:
+                values = filters.get(name)
+                if not values:
+                    self._unfiltered[name].add(connection_id)
+                for value in values or ():
+                    self._by_value[name].setdefault(value, set()).add(connection_id)
+
+    def _matching(self, name, values):
+        matched = set(self._unfiltered[name])
+        for value in values:
+            matched |= self._by_value[name].get(value, set())
+        return matched
+
+    def match(self, event):
+        """
+        Conexiones que deben recibir `event`. Para un cambio de estado se consideran
+        el valor anterior y el nuevo: quien sigue los incidentes 'open' se entera
+        de que uno se cerró.
+        """
+        audience = EVENT_AUDIENCE.get(event.get('type'))
+        if audience:
+            targets = set().union(*(self._by_role.get(role, set()) for role in audience))
+        else:
+            targets = set(self._all)
+        for name in FILTER_DIMENSIONS:
+            previous = event.get('previous' + name.capitalize())
+            values = {str(v).lower() for v in (event.get(name), previous) if v}
+            if values:
+                targets &= self._matching(name, values)
+        if event.get('locationKey'):
+            targets &= self._matching('locations', _location_prefixes(event['locationKey']))
+        return targets
@@ -0,0 +1,204 @@
+import os
+import time
+from collections import Counter
+
+import boto3
+from botocore.exceptions import ClientError
+
+from notification_rules import building_of
+from stream_decoder import decode_image
+from stream_records import decode_changes
+
+_table = boto3.resource('dynamodb').Table(os.environ['STATS_TABLE'])
+
+STATS_ID = 'GLOBAL'
+# Lo único que miran _is_incident, counter_keys y los marcadores
+STATS_FIELDS = frozenset({'incidentId', 'entityType', 'parentIncidentId', 'type', 'status', 'urgencia', 'locationKey',
+                          'archivedAt'})
+# Campos que decodifica stream_pipeline para el sink `stats`
+STREAM_FIELDS = STATS_FIELDS
+# services/incidents/src/archive.py lo setea antes de borrar un incidente archivado
+ARCHIVED_AT = 'archivedAt'
+
+# Marcadores del último cambio aplicado por incidente (en la misma tabla, con TTL
+# mayor que la retención de 24 h del stream: un reintento nunca llega después)
+APPLIED_PREFIX = 'APPLIED#'
+APPLIED_TTL_SECONDS = 2 * 24 * 3600
+# Los SequenceNumber son strings de 21 a 40 dígitos: con ceros a la izquierda se comparan como texto
+SEQUENCE_NUMBER_WIDTH = 40
+# TransactWriteItems acepta hasta 100 operaciones: un marcador por cambio más los contadores
+TRANSACT_MAX_CHANGES = 99
+
+
+def _is_incident(img):
+    # entityType discrimina el tipo de item; sin él (items previos al backfill) los
+    # comentarios legacy se reconocen por parentIncidentId
+    if not img:
+        return False
+    if 'entityType' in img:
+        return img['entityType'] == 'INCIDENT'
+    return 'parentIncidentId' not in img and img.get('type') != 'comment'
+
+
+def counter_keys(img):
+    """
+    Nombres de los contadores a los que aporta un incidente. La ubicación se
+    cuenta por edificio (segmento de locationKey) y no por el texto libre
+    de `ubicacion`: así la cantidad de atributos del item GLOBAL queda acotada
+    por los edificios del campus.
+    """
+    status = img.get('status') or 'unknown'
+    urgencia = img.get('urgencia') or 'unknown'
+    edificio = building_of(img)
+    return (
+        'total',
+        f'status#{status}',
+        f'urgencia#{urgencia}',
+        f'edificio#{edificio}',
+        f'status#{status}|urgencia#{urgencia}',
+        f'status#{status}|edificio#{edificio}',
+    )
+
+
+def change_deltas(changes):
+    """
+    Suma los deltas de un batch: -1 por la imagen anterior y +1 por la nueva de
+    cada cambio. `changes` son tuplas (event_type, old, new) ya decodificadas.
+    """
+    deltas = Counter()
+    for event_type, old, new in changes:
+        if event_type == 'REMOVE' and ARCHIVED_AT in old:
+            # Archivar no es borrar: el incidente sigue contando
+            continue
+        if _is_incident(old):
+            deltas.subtract(counter_keys(old))
+        if _is_incident(new):
+            deltas.update(counter_keys(new))
+        if _is_incident(old) or _is_incident(new):
+            # Versión de los datos: GET /incidents la usa para invalidar su cache
+            deltas['version'] += 1
+    # Un MODIFY que no cambia status/urgencia/edificio se cancela solo
+    return {k: v for k, v in deltas.items() if v}
+
+
+def compute_deltas(records):
+    """Deltas de un batch de records crudos del stream"""
+    return change_deltas(
+        (rec['eventName'], decode_image(rec['dynamodb'].get('OldImage'), STATS_FIELDS),
+         decode_image(rec['dynamodb'].get('NewImage'), STATS_FIELDS))
+        for rec in records if rec.get('eventName') in ('INSERT', 'MODIFY', 'REMOVE')
+    )
+
+
+def _counter_update(deltas):
+    # Un solo Update con ADD atómicos, sin leer el item GLOBAL antes
+    names = {'#updatedAt': 'updatedAt'}
+    values = {':now': int(time.time())}
+    adds = []
+    for i, (key, delta) in enumerate(sorted(deltas.items())):
+        names[f'#c{i}'] = key
+        values[f':d{i}'] = delta
+        adds.append(f'#c{i} :d{i}')
+    return {
+        'TableName': _table.name,
+        'Key': {'statsId': STATS_ID},
+        'UpdateExpression': 'SET #updatedAt = :now ADD ' + ', '.join(adds),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+    }
+
+
+def _counted_keys(img):
+    return list(counter_keys(img)) if _is_incident(img) else []
+
+
+def _is_counted(change):
+    if change.event_type == 'REMOVE' and ARCHIVED_AT in change.old:
+        return False
+    return _is_incident(change.old) or _is_incident(change.new)
+
+
+def _read_markers(incident_ids, max_attempts=3, sleep=time.sleep):
+    keys = [{'statsId': APPLIED_PREFIX + incident_id} for incident_id in incident_ids]
+    markers = {}
+    for attempt in range(max_attempts):
+        resp = _table.meta.client.batch_get_item(RequestItems={_table.name: {'Keys': keys, 'ConsistentRead': True}})
+        for item in resp.get('Responses', {}).get(_table.name, []):
+            markers[item['statsId'][len(APPLIED_PREFIX):]] = item
+        keys = resp.get('UnprocessedKeys', {}).get(_table.name, {}).get('Keys', [])
+        if not keys:
+            return markers
+        sleep(0.05 * 2 ** attempt)
+    raise RuntimeError(f'{len(keys)} marcadores de stats sin leer')
+
+
+def _plan(changes, markers):
+    """
+    Deltas y Puts de marcadores para los cambios aún no aplicados. Cada marcador
+    guarda el SequenceNumber y las claves con que quedó contado el incidente: el
+    delta se calcula contra ese estado y no contra la imagen anterior del cambio,
+    así un reintento que coalesce records ya aplicados con otros nuevos no cuenta
+    dos veces la parte repetida.
+    """
+    deltas, puts = Counter(), []
+    now = int(time.time())
+    for change in changes:
+        incident_id = (change.new or change.old)['incidentId']
+        sequence_number = change.sequence_numbers[-1].zfill(SEQUENCE_NUMBER_WIDTH)
+        marker = markers.get(incident_id)
+        if marker and marker['seq'] >= sequence_number:
+            continue
+        before = marker['counted'] if marker else _counted_keys(change.old)
+        after = _counted_keys(change.new)
+        deltas.subtract(before)
+        deltas.update(after)
+        deltas['version'] += 1
+        put = {
+            'TableName': _table.name,
+            'Item': {'statsId': APPLIED_PREFIX + incident_id, 'seq': sequence_number, 'counted': after,
+                     'ttl': now + APPLIED_TTL_SECONDS},
+            'ExpressionAttributeNames': {'#seq': 'seq'},
+        }
+        if marker:
+            # Escritura optimista: nadie aplicó otro cambio del incidente desde la lectura
+            put['ConditionExpression'] = '#seq = :seq'
+            put['ExpressionAttributeValues'] = {':seq': marker['seq']}
+        else:
+            put['ConditionExpression'] = 'attribute_not_exists(#seq)'
+        puts.append({'Put': put})
+    return {k: v for k, v in deltas.items() if v}, puts
+
+
+def apply_changes(changes, max_attempts=3):
+    """
+    Aplica `changes` (a lo más TRANSACT_MAX_CHANGES) en un TransactWriteItems que
+    suma los contadores y avanza los marcadores de cada incidente. Si otra
+    escritura se adelantó, se releen los marcadores y se reintenta.
+    """
+    for attempt in range(max_attempts):
+        markers = _read_markers([(c.new or c.old)['incidentId'] for c in changes])
+        deltas, puts = _plan(changes, markers)
+        if not puts:
+            return
+        try:
+            _table.meta.client.transact_write_items(TransactItems=puts + [{'Update': _counter_update(deltas)}])
+            return
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException' or attempt + 1 == max_attempts:
+                raise
+
+
+def aggregate(changes, deadline=None):
+    """
+    Sink `stats` de stream_pipeline. Idempotente: un cambio que el pipeline
+    reintenta porque otro sink lo falló no se cuenta dos veces. Si la escritura
+    falla lanza y el pipeline reintenta los cambios.
+    """
+    counted = [c for c in changes if _is_counted(c)]
+    for start in range(0, len(counted), TRANSACT_MAX_CHANGES):
+        apply_changes(counted[start:start + TRANSACT_MAX_CHANGES])
+    return []
+
+
+def handler(event, _context):
+    aggregate(decode_changes(event.get('Records', []), STATS_FIELDS))
@@ -0,0 +1,73 @@
+"""
+Decodificador rápido de imágenes del stream (formato AttributeValue).
+
+TypeDeserializer de boto3 despacha por reflexión en cada atributo y devuelve
+Decimal para todo número, que luego hay que volver a convertir. Acá los tipos
+de la forma del incidente se traducen directo a tipos nativos: `S` -> str,
+`N` -> int (o float si no es entero), `BOOL`, `NULL` -> None, `M` / `L`
+recursivos. Los tipos poco comunes (sets, binarios) pasan al deserializador
+genérico. `decode_image(image, fields)` decodifica solo los campos pedidos.
+
+Benchmark: python benchmarks/bench_stream_decoder.py
+"""
+from boto3.dynamodb.types import TypeDeserializer
+
+_generic = TypeDeserializer()
+
+# Campos de un item INCIDENT y el tipo con el que se guardan
+INCIDENT_SCHEMA = {
+    'incidentId': 'S', 'entityType': 'S', 'status': 'S', 'urgencia': 'S',
+    'titulo': 'S', 'descripcion': 'S', 'ubicacion': 'S', 'locationKey': 'S',
+    'locationCampus': 'S', 'reporterId': 'S', 'reporterEmail': 'S', 'assignedTo': 'S',
+    'createdAt': 'N', 'updatedAt': 'N', 'updatedShard': 'N', 'commentCount': 'N',
+    'lastCommentAt': 'N', 'ttl': 'N',
+}
+
+
+def _number(text):
+    if '.' in text or 'e' in text or 'E' in text:
+        value = float(text)
+        return int(value) if value.is_integer() else value
+    return int(text)
+
+
+def decode_value(value):
+    """Un AttributeValue a tipo nativo"""
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        return _number(value['N'])
+    if 'BOOL' in value:
+        return value['BOOL']
+    if 'NULL' in value:
+        return None
+    if 'M' in value:
+        return {k: decode_value(v) for k, v in value['M'].items()}
+    if 'L' in value:
+        return [decode_value(v) for v in value['L']]
+    if 'NS' in value:
+        return {_number(n) for n in value['NS']}
+    # SS, B, BS: raros en incidentes, se delega al genérico
+    return _generic.deserialize(value)
+
+
+def _decode_field(name, value):
+    # Camino especializado: el tipo esperado del esquema se lee sin despachar
+    expected = INCIDENT_SCHEMA.get(name)
+    if expected == 'S' and 'S' in value:
+        return value['S']
+    if expected == 'N' and 'N' in value:
+        return _number(value['N'])
+    return decode_value(value)
+
+
+def decode_image(image, fields=None):
+    """
+    Imagen del stream -> dict nativo. Con `fields` (conjunto de nombres) solo se
+    decodifican esos atributos; el resto ni se mira.
+    """
+    if not image:
+        return {}
+    if fields is None:
+        return {name: _decode_field(name, value) for name, value in image.items()}
+    return {name: _decode_field(name, image[name]) for name in fields if name in image}
@@ -0,0 +1,104 @@
+"""
+Pipeline único para el stream de incidentes.
+
+Reemplaza a los Lambdas separados que leían el stream (broadcaster, notifier,
+contadores, índice de búsqueda y tombstones): cada batch se coalesce y
+decodifica una sola vez (stream_records.decode_changes) y los cambios se
+entregan a todos los sinks configurados en paralelo. Un sink que falla no
+impide que los demás terminen.
+
+Cada sink devuelve los cambios que no pudo procesar (o lanza, y entonces
+cuentan todos). El handler responde con `batchItemFailures`
+(ReportBatchItemFailures), así Lambda reintenta desde el primer record
+fallido y no el batch entero. Un cambio reintentado vuelve a pasar por todos
+los sinks: la entrega es at-least-once.
+
+Los sinks son funciones `sink(changes, deadline=None)` registradas por
+nombre; `deadline` (time.monotonic()) marca cuándo dejar de reintentar para no
+pasarse del timeout de la invocación. STREAM_SINKS elige cuáles corren (por
+defecto broadcast y notify); los módulos se importan recién al usarlos, así
+un despliegue solo con `notify` no necesita WS_CALLBACK_URL. Si el módulo de
+un sink declara STREAM_FIELDS, se decodifica solo la unión de esos campos.
+"""
+import importlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from stream_records import batch_item_failures, decode_changes, invocation_deadline
+
+STREAM_SINKS = tuple(s.strip() for s in os.environ.get('STREAM_SINKS', 'broadcast,notify').split(',') if s.strip())
+
+# nombre -> (módulo, función). Nuevos consumidores se agregan acá en vez de leer el stream
+# por su cuenta: DynamoDB Streams throttlea con más de dos lectores por shard.
+# `search` y `tombstones` viven en services/incidents/src, que debe estar en el path
+SINKS = {
+    'broadcast': ('broadcaster', 'broadcast'),
+    'notify': ('notifier', 'notify'),
+    'stats': ('stats_aggregator', 'aggregate'),
+    'search': ('search', 'index_changes'),
+    'tombstones': ('sync', 'tombstone_changes'),
+}
+
+
+def register_sink(name, module, function):
+    SINKS[name] = (module, function)
+
+
+def load_sinks(names=STREAM_SINKS):
+    """[(nombre, función)] de los sinks pedidos. Lanza ValueError con un nombre desconocido"""
+    sinks = []
+    for name in names:
+        if name not in SINKS:
+            raise ValueError(f'sink desconocido: {name}')
+        module, function = SINKS[name]
+        sinks.append((name, getattr(importlib.import_module(module), function)))
+    return sinks
+
+
+def required_fields(names=STREAM_SINKS):
+    """Unión de los STREAM_FIELDS de los sinks; None (todo) si alguno no los declara"""
+    fields = set()
+    for name in names:
+        declared = getattr(importlib.import_module(SINKS[name][0]), 'STREAM_FIELDS', None)
+        if declared is None:
+            return None
+        fields |= declared
+    return frozenset(fields)
+
+
+def run_sinks(sinks, changes, deadline=None):
+    """Corre cada sink en su propio thread. Devuelve los cambios que falló algún sink"""
+    if not sinks:
+        return []
+
+    def run(sink):
+        name, fn = sink
+        try:
+            return fn(changes, deadline) or []
+        except Exception as e:  # aislamiento: un sink no tumba a los demás
+            print(f'Error in sink {name}: {e}')
+            return changes
+
+    failed = {}
+    with ThreadPoolExecutor(max_workers=len(sinks)) as pool:
+        for sink_failed in pool.map(run, sinks):
+            for change in sink_failed:
+                failed[id(change)] = change
+    return list(failed.values())
+
+
+_sinks = None
+_fields = None
+
+
+def handler(event, context):
+    global _sinks, _fields
+    deadline = invocation_deadline(context)
+    if _sinks is None:
+        _sinks = load_sinks()
+        _fields = required_fields()
+    failed = []
+    changes = decode_changes(event.get('Records', []), _fields, failed)
+    if changes:
+        failed.extend(run_sinks(_sinks, changes, deadline))
+    return batch_item_failures(failed)
@@ -0,0 +1,122 @@
+"""
+Utilidades compartidas por los consumidores del stream de incidentes.
+"""
+import json
+import time
+from dataclasses import dataclass, field
+
+from stream_decoder import decode_image
+
+
+@dataclass
+class IncidentChange:
+    """Cambio de un item ya coalescido y decodificado. Los sinks no deben modificarlo"""
+    event_type: str
+    new: dict = field(default_factory=dict)
+    old: dict = field(default_factory=dict)
+    # SequenceNumber de los records que se coalescieron en este cambio
+    sequence_numbers: list = field(default_factory=list)
+
+
+# Lo marca el archivado antes del REMOVE: ese borrado no es un borrado del incidente
+ARCHIVED_AT = 'archivedAt'
+
+# Margen para responder batchItemFailures antes de que Lambda corte la invocación
+DEADLINE_MARGIN_SECONDS = 0.5
+
+
+def invocation_deadline(context, clock=time.monotonic):
+    """Instante (en `clock`) en que los sinks deben dejar de reintentar, o None sin contexto de Lambda"""
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if remaining is None:
+        return None
+    return clock() + remaining() / 1000 - DEADLINE_MARGIN_SECONDS
+
+
+def deserialize_image(dynamo_image, fields=None):
+    """Imagen del stream a tipos nativos (números como int/float, no Decimal)"""
+    return decode_image(dynamo_image, fields)
+
+
+def _carry_archived_at(first_old, removed_old):
+    if not first_old or ARCHIVED_AT not in (removed_old or {}):
+        return first_old
+    return dict(first_old, **{ARCHIVED_AT: removed_old[ARCHIVED_AT]})
+
+
+def coalesce_records(records):
+    """
+    Colapsa los records de un mismo incidente en uno solo con el estado final.
+
+    Conserva la imagen anterior del primer record y la nueva del último, así un
+    INSERT seguido de MODIFYs sigue siendo un IncidentCreated (con el estado
+    final) y varios MODIFY se comparan contra el estado previo al batch. Un
+    REMOVE cierra la entrada: INSERT + REMOVE se anulan (no queda nada que
+    avisar ni contar), MODIFY + REMOVE queda como REMOVE del estado previo (con
+    el archivedAt del REMOVE, si lo trae, para que siga siendo un archivado) y
+    REMOVE + INSERT (borrado y recreado) como MODIFY.
+    Devuelve [(event_type, new_img, old_img, sequence_numbers)] en el orden de la
+    primera aparición.
+    """
+    merged = {}
+    for rec in records:
+        et = rec.get('eventName')
+        if et not in ('INSERT', 'MODIFY', 'REMOVE'):
+            continue
+        ddb_rec = rec['dynamodb']
+        key = json.dumps(ddb_rec['Keys'], sort_keys=True)
+        sequence_number = ddb_rec.get('SequenceNumber')
+        if key not in merged:
+            merged[key] = (et, ddb_rec.get('NewImage'), ddb_rec.get('OldImage'), [sequence_number])
+            continue
+        first_et, _, first_old, sequence_numbers = merged[key]
+        sequence_numbers = sequence_numbers + [sequence_number]
+        if et == 'REMOVE':
+            if first_et == 'INSERT':
+                del merged[key]
+            else:
+                merged[key] = ('REMOVE', None, _carry_archived_at(first_old, ddb_rec.get('OldImage')),
+                               sequence_numbers)
+        elif first_et == 'REMOVE':
+            merged[key] = ('MODIFY', ddb_rec.get('NewImage'), first_old, sequence_numbers)
+        else:
+            merged[key] = (first_et, ddb_rec.get('NewImage'), first_old, sequence_numbers)
+    return list(merged.values())
+
+
+def decode_changes(records, fields=None, failed=None):
+    """
+    Coalesce los records del batch y decodifica cada imagen una sola vez.
+    `fields` limita la decodificación a los atributos que usan los sinks. Un
+    record que no se puede decodificar no frena al resto: su cambio (sin
+    imágenes) se agrega a `failed` si se pasa una lista.
+    """
+    changes = []
+    for et, new_img, old_img, sequence_numbers in coalesce_records(records):
+        try:
+            changes.append(IncidentChange(et, deserialize_image(new_img, fields),
+                                          deserialize_image(old_img, fields), sequence_numbers))
+        except Exception as e:
+            print(f'Error decoding record {sequence_numbers[0]}: {e}')
+            if failed is not None:
+                failed.append(IncidentChange(et, sequence_numbers=sequence_numbers))
+    return changes
+
+
+def _sequence_key(sequence_number):
+    # Comparar como número: los SequenceNumber son strings de largo variable
+    return len(sequence_number), sequence_number
+
+
+def batch_item_failures(failed_changes):
+    """
+    Respuesta para ReportBatchItemFailures. Lambda reanuda desde el menor
+    SequenceNumber informado, así que por cambio basta su primer record.
+    """
+    identifiers = set()
+    for change in failed_changes:
+        sequence_numbers = [seq for seq in change.sequence_numbers if seq]
+        if sequence_numbers:
+            identifiers.add(min(sequence_numbers, key=_sequence_key))
+    ordered = sorted(identifiers, key=_sequence_key)
+    return {'batchItemFailures': [{'itemIdentifier': seq} for seq in ordered]}
@@ -0,0 +1,48 @@
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('WS_CALLBACK_URL', 'https://example.execute-api.us-east-1.amazonaws.com/prod')
+os.environ.setdefault('CONNECTIONS_TABLE', 'AlertaUTEC-Connections')
+
+import broadcaster
+from fanout import FanoutResult
+from stream_records import IncidentChange
+
+
+def _created(incident_id, status):
+    return IncidentChange('INSERT', {'incidentId': incident_id, 'entityType': 'INCIDENT', 'status': status},
+                          sequence_numbers=[incident_id])
+
+
+def test_broadcast_fails_only_changes_with_transient_send_errors():
+    open_, resolved = _created('1', 'open'), _created('2', 'resolved')
+    routing = MagicMock()
+    # 'slow' recibe ambos eventos, 'closed' solo el segundo
+    routing.match.side_effect = lambda payload: {'slow'} if payload['status'] == 'open' else {'slow', 'closed'}
+    result = FanoutResult(sent=0, gone=['closed'], failed=[('slow', 'ThrottlingException')], retryable=['slow'])
+
+    with patch.object(broadcaster, '_registry') as registry, \
+            patch.object(broadcaster, 'resolve_deliveries', return_value={}), \
+            patch.object(broadcaster, 'fan_out_deliveries', return_value=result):
+        registry.routing.return_value = routing
+        failed = broadcaster.broadcast([open_, resolved])
+
+    assert sorted(c.sequence_numbers for c in failed) == [['1'], ['2']]
+    registry.discard_many.assert_called_once_with(['closed'])
+
+
+def test_broadcast_drops_permanent_and_gone_failures():
+    routing = MagicMock()
+    routing.match.return_value = {'forbidden', 'closed'}
+    result = FanoutResult(gone=['closed'], failed=[('forbidden', 'ForbiddenException')])
+
+    with patch.object(broadcaster, '_registry') as registry, \
+            patch.object(broadcaster, 'resolve_deliveries', return_value={}), \
+            patch.object(broadcaster, 'fan_out_deliveries', return_value=result):
+        registry.routing.return_value = routing
+        assert broadcaster.broadcast([_created('1', 'open')]) == []
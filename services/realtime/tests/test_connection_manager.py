@@ -0,0 +1,59 @@
+import sys
+import os
+import json
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('CONNECTIONS_TABLE', 'AlertaUTEC-Connections')
+
+import connection_manager
+from connection_manager import _get_claims
+
+
+def _connect_event(authorizer=None, query=None):
+    context = {'connectionId': 'c1'}
+    if authorizer is not None:
+        context['authorizer'] = authorizer
+    return {'requestContext': context, 'queryStringParameters': query}
+
+
+def test_get_claims_reads_lambda_authorizer_context_and_jwt_claims():
+    assert _get_claims(_connect_event({'sub': 'u1', 'role': 'staff'}))['sub'] == 'u1'
+    assert _get_claims(_connect_event({'jwt': {'claims': {'sub': 'u2'}}})) == {'sub': 'u2'}
+
+
+def test_get_claims_ignores_anonymous_connections_and_query_params():
+    assert _get_claims(_connect_event()) is None
+    assert _get_claims(_connect_event({'principalId': 'anonymous'})) is None
+    assert _get_claims(_connect_event(query={'sub': 'u1', 'role': 'admin'})) is None
+
+
+def test_on_connect_stores_verified_identity_and_logs_the_change():
+    with patch.object(connection_manager, '_table') as table, patch.object(connection_manager, 'record_change') as record:
+        response = connection_manager.on_connect(_connect_event({'sub': 'u1', 'role': 'staff'}, {'status': 'open'}), None)
+
+    assert response['statusCode'] == 200
+    item = table.put_item.call_args.kwargs['Item']
+    assert (item['userId'], item['role'], item['filters']) == ('u1', 'staff', {'status': ['open']})
+    assert record.call_args.args[1] == {'userId': 'u1', 'role': 'staff', 'filters': {'status': ['open']}}
+
+
+def test_on_connect_anonymous_gets_student_role_without_user():
+    with patch.object(connection_manager, '_table') as table, patch.object(connection_manager, 'record_change'):
+        connection_manager.on_connect(_connect_event(query={'sub': 'u1', 'role': 'admin'}), None)
+
+    item = table.put_item.call_args.kwargs['Item']
+    assert item['role'] == 'student'
+    assert 'userId' not in item
+
+
+def test_on_connect_rejects_invalid_filters():
+    with patch.object(connection_manager, '_table') as table:
+        response = connection_manager.on_connect(_connect_event(query={'location': 'zzz'}), None)
+
+    assert response['statusCode'] == 400
+    assert 'error' in json.loads(response['body'])
+    table.put_item.assert_not_called()
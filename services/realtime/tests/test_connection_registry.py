@@ -0,0 +1,89 @@
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('CONNECTIONS_TABLE', 'AlertaUTEC-Connections')
+
+from connection_registry import REGISTRY_CHANGE_LAG_MS, ConnectionRegistry, change_item
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _conn(connection_id, **state):
+    return dict({'userId': None, 'role': 'student', 'filters': {}}, connectionId=connection_id, **state)
+
+
+def _registry(log, loaded=None, ttl_seconds=300):
+    loader = MagicMock(return_value=dict(loaded or {}))
+    changes = MagicMock(side_effect=lambda since, until: [c for c in log if since <= int(c['sk'][:13]) <= until])
+    clock, wall = Clock(0.0), Clock(1000.0)
+    registry = ConnectionRegistry(table=MagicMock(), loader=loader, changes=changes, ttl_seconds=ttl_seconds,
+                                  clock=clock, wall_clock=wall)
+    return registry, loader, changes, clock, wall
+
+
+def test_change_item_encodes_minute_partition_and_ordered_sort_key():
+    item = change_item('c1', {'role': 'staff'}, 1735689600123)
+
+    assert item['pk'] == f'CHANGES#{1735689600123 // 60000}'
+    assert item['sk'] == '1735689600123#c1'
+    assert item['connection'] == {'role': 'staff'}
+    assert 'connection' not in change_item('c1', None, 1735689600123)
+
+
+def test_registry_applies_change_log_between_full_loads():
+    log = []
+    registry, loader, changes, clock, wall = _registry(log, {'c1': _conn('c1')})
+
+    assert set(registry.connections()) == {'c1'}
+    log.append(change_item('c2', {'role': 'staff', 'filters': {'status': ['open']}}, 1000500))
+    log.append(change_item('c1', None, 1000600))
+    wall.now, clock.now = 1001.0, 1.0
+
+    current = registry.connections()
+
+    assert current == {'c2': _conn('c2', role='staff', filters={'status': ['open']})}
+    loader.assert_called_once()
+    # Relee desde la última sincronización menos el margen por escrituras tardías
+    assert changes.call_args.args == (1000000 - 2 * REGISTRY_CHANGE_LAG_MS, 1001000)
+
+
+def test_registry_reuses_routing_table_when_nothing_changed():
+    registry, _, _, clock, wall = _registry([change_item('c1', {'role': 'student'}, 999000)], {'c1': _conn('c1')})
+    routing = registry.routing()
+    wall.now, clock.now = 1001.0, 1.0
+
+    assert registry.routing() is routing
+
+
+def test_registry_reloads_after_ttl():
+    registry, loader, changes, clock, _ = _registry([], {'c1': _conn('c1')}, ttl_seconds=10)
+    registry.connections()
+    clock.now = 10.0
+
+    registry.connections()
+
+    assert loader.call_count == 2
+    changes.assert_not_called()
+
+
+def test_discard_many_deletes_and_logs_each_connection_once():
+    registry, _, _, _, _ = _registry([], {'c1': _conn('c1'), 'c2': _conn('c2')})
+    registry.connections()
+
+    registry.discard_many(['c1', 'c1'])
+
+    batch = registry._table.batch_writer.return_value.__enter__.return_value
+    batch.delete_item.assert_called_once_with(Key={'pk': 'CONN#c1', 'sk': 'META#'})
+    assert batch.put_item.call_args.kwargs['Item']['connectionId'] == 'c1'
+    assert set(registry.connections()) == {'c2'}
@@ -0,0 +1,98 @@
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import fanout
+from fanout import _post, fan_out, fan_out_deliveries
+from stream_records import invocation_deadline
+
+
+def _error(code):
+    return ClientError({'Error': {'Code': code}}, 'PostToConnection')
+
+
+def _client(*outcomes):
+    client = MagicMock()
+    client.post_to_connection.side_effect = list(outcomes)
+    return client
+
+
+def test_post_retries_transient_errors_then_succeeds():
+    client = _client(_error('ThrottlingException'), ReadTimeoutError(endpoint_url='https://x'), None)
+    sleeps = []
+
+    assert _post(client, 'c1', b'{}', 2, sleeps.append) is None
+    assert client.post_to_connection.call_count == 3
+    assert sleeps == [fanout.FANOUT_RETRY_BASE_SECONDS, fanout.FANOUT_RETRY_BASE_SECONDS * 2]
+
+
+def test_post_gives_up_after_retries():
+    client = _client(*[_error('InternalServerError')] * 3)
+
+    assert _post(client, 'c1', b'{}', 2, lambda _: None) == ('InternalServerError', True)
+    assert client.post_to_connection.call_count == 3
+
+
+def test_post_classifies_gone_and_permanent_errors_without_retrying():
+    gone = _client(_error('GoneException'))
+    forbidden = _client(_error('ForbiddenException'))
+
+    assert _post(gone, 'c1', b'{}', 2, lambda _: None) == 'gone'
+    assert _post(forbidden, 'c1', b'{}', 2, lambda _: None) == ('ForbiddenException', False)
+    assert gone.post_to_connection.call_count == 1
+    assert forbidden.post_to_connection.call_count == 1
+
+
+def test_post_does_not_start_an_attempt_past_the_deadline():
+    client = _client(_error('ThrottlingException'), None)
+    # Alcanza para un intento (connect + read) pero no para el backoff y otro intento
+    deadline = 100 + fanout.FANOUT_ATTEMPT_SECONDS + fanout.FANOUT_RETRY_BASE_SECONDS / 2
+
+    assert _post(client, 'c1', b'{}', 2, lambda _: None, deadline, clock=lambda: 100) == ('ThrottlingException', True)
+    assert client.post_to_connection.call_count == 1
+
+    client.reset_mock()
+    assert _post(client, 'c1', b'{}', 2, lambda _: None, 100, clock=lambda: 100)[1] is True
+    client.post_to_connection.assert_not_called()
+
+
+def test_fan_out_posts_within_the_default_lambda_timeout():
+    # 6 s es el timeout por defecto de Lambda: el primer intento tiene que caber
+    context = SimpleNamespace(get_remaining_time_in_millis=lambda: 6000)
+    client = _client(None, None)
+
+    result = fan_out(client, ['c1', 'c2'], [b'{}'], deadline=invocation_deadline(context))
+
+    assert result.sent == 2
+    assert client.post_to_connection.call_count == 2
+
+
+def test_fan_out_deliveries_collects_gone_and_failed(monkeypatch):
+    monkeypatch.setattr(fanout, 'FANOUT_RETRY_BASE_SECONDS', 0)
+
+    def post(ConnectionId, Data):
+        if ConnectionId == 'gone':
+            raise _error('GoneException')
+        if ConnectionId == 'forbidden':
+            raise _error('ForbiddenException')
+        if ConnectionId == 'throttled':
+            raise _error('ThrottlingException')
+
+    client = MagicMock()
+    client.post_to_connection.side_effect = post
+    result = fan_out_deliveries(client, [('ok', [b'1', b'2']), ('gone', [b'1']), ('forbidden', [b'1']),
+                                         ('throttled', [b'1']), ('empty', [])])
+
+    assert result.sent == 2
+    assert result.gone == ['gone']
+    assert sorted(result.failed) == [('forbidden', 'ForbiddenException'), ('throttled', 'ThrottlingException')]
+    # Solo los transitorios justifican reintentar el record
+    assert result.retryable == ['throttled']
@@ -0,0 +1,100 @@
+import sys
+import os
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('SNS_TOPIC_ARN', 'arn:aws:sns:us-east-1:123456789012:alerts')
+
+import notifier
+from notification_rules import Rule, compile_rules
+from notifier import build_alert, publish_batch
+
+TOPIC = 'arn:aws:sns:us-east-1:123456789012:alerts'
+
+
+def _alerts(n):
+    return [{'incidentId': f'inc-{i}', 'rules': ['r'], 'roles': []} for i in range(n)]
+
+
+def test_rule_matches_only_transitions_into_target_values():
+    rule = Rule('urgencia-alta', 'urgencia', ['alta', 'crítica'])
+
+    assert rule.matches({'urgencia': 'Alta'}, {'urgencia': 'media'})
+    assert rule.matches({'urgencia': 'alta'}, {})  # INSERT: cambio desde ningún valor
+    assert not rule.matches({'urgencia': 'alta'}, {'urgencia': 'alta'})
+    # Sigue dentro de `to`: no vuelve a avisar
+    assert not rule.matches({'urgencia': 'crítica'}, {'urgencia': 'alta'})
+    assert not rule.matches({'urgencia': 'baja'}, {'urgencia': 'alta'})
+
+
+def test_rule_from_restricts_the_previous_value():
+    rule = Rule('escalated-from-open', 'status', ['escalated'], source=['open'])
+
+    assert rule.matches({'status': 'escalated'}, {'status': 'open'})
+    assert not rule.matches({'status': 'escalated'}, {'status': 'in_progress'})
+
+
+@pytest.mark.parametrize('config', [{}, [{'name': 'x', 'field': 'titulo', 'to': ['a']}], [{'name': 'x', 'field': 'status', 'to': []}]])
+def test_compile_rules_rejects_invalid_config(config):
+    with pytest.raises(ValueError):
+        compile_rules(config)
+
+
+def test_build_alert_carries_matched_rules_and_roles():
+    rules = [Rule('status-escalated', 'status', ['escalated'], roles=['authority', 'admin'])]
+    new = {'incidentId': 'inc-1', 'status': 'escalated', 'urgencia': 'alta', 'locationKey': 'UTEC#B#B2'}
+
+    alert = build_alert('MODIFY', new, {'status': 'open'}, rules)
+
+    assert alert['rules'] == ['status-escalated']
+    assert alert['roles'] == ['admin', 'authority']
+    assert alert['building'] == 'B'
+    assert build_alert('REMOVE', {}, new, rules) is None
+    assert build_alert('MODIFY', new, new, rules) is None
+
+
+def test_publish_batch_retries_only_failed_entries():
+    client = MagicMock()
+    client.publish_batch.side_effect = [
+        {'Failed': [{'Id': '1', 'SenderFault': False, 'Code': 'InternalError'},
+                    {'Id': '2', 'SenderFault': True, 'Code': 'InvalidParameter'}]},
+        {'Failed': []},
+    ]
+
+    failed = publish_batch(_alerts(3), client, TOPIC, sleep=lambda _: None)
+
+    assert [(alert['incidentId'], reason, retryable) for alert, reason, retryable in failed] == [
+        ('inc-2', 'InvalidParameter', False)
+    ]
+    retried = client.publish_batch.call_args_list[1].kwargs['PublishBatchRequestEntries']
+    assert [json.loads(entry['Message'])['incidentId'] for entry in retried] == ['inc-1']
+
+
+def test_publish_batch_sends_groups_of_ten_and_reports_exhausted_retries():
+    client = MagicMock()
+    error = ClientError({'Error': {'Code': 'Throttling'}}, 'PublishBatch')
+    client.publish_batch.side_effect = [{'Failed': []}] + [error] * notifier.PUBLISH_MAX_ATTEMPTS
+
+    failed = publish_batch(_alerts(12), client, TOPIC, sleep=lambda _: None)
+
+    assert len(client.publish_batch.call_args_list[0].kwargs['PublishBatchRequestEntries']) == 10
+    assert [alert['incidentId'] for alert, _, retryable in failed if retryable] == ['inc-10', 'inc-11']
+
+
+def test_publish_batch_stops_retrying_at_the_deadline():
+    client = MagicMock()
+    client.publish_batch.side_effect = ClientError({'Error': {'Code': 'Throttling'}}, 'PublishBatch')
+    sleeps = []
+
+    failed = publish_batch(_alerts(1), client, TOPIC, sleep=sleeps.append, deadline=100, clock=lambda: 100)
+
+    assert client.publish_batch.call_count == 1
+    assert sleeps == []
+    assert failed[0][2] is True
@@ -0,0 +1,62 @@
+import sys
+import os
+import json
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import routing
+from routing import RoutingTable, parse_filters
+
+CONNECTIONS = {
+    'all': {'role': 'student'},
+    'open': {'role': 'student', 'filters': {'status': ['open']}},
+    'alta-a': {'role': 'staff', 'filters': {'urgencia': ['alta'], 'locations': ['UTEC#A']}},
+    'b': {'role': 'authority', 'filters': {'locations': ['UTEC#B']}},
+}
+
+
+def _event(**fields):
+    return dict({'type': 'IncidentCreated', 'status': 'open', 'urgencia': 'alta', 'locationKey': 'UTEC#A#A1#A101'},
+                **fields)
+
+
+def test_match_applies_every_filter_dimension():
+    table = RoutingTable(CONNECTIONS)
+
+    assert table.match(_event()) == {'all', 'open', 'alta-a'}
+    assert table.match(_event(status='resolved', locationKey='UTEC#B#B2')) == {'all', 'b'}
+
+
+def test_match_location_prefix_does_not_match_sibling_buildings():
+    table = RoutingTable({'a': {'filters': {'locations': ['UTEC#A']}}})
+
+    assert table.match(_event(locationKey='UTEC#AB#AB1')) == set()
+
+
+def test_match_status_change_reaches_subscribers_of_the_previous_status():
+    table = RoutingTable(CONNECTIONS)
+
+    assert 'open' in table.match(_event(type='IncidentStatusChanged', status='resolved', previousStatus='open'))
+
+
+def test_match_restricts_event_types_to_their_audience(monkeypatch):
+    monkeypatch.setattr(routing, 'EVENT_AUDIENCE', {'IncidentStatusChanged': ['staff', 'authority']})
+    table = RoutingTable(CONNECTIONS)
+
+    assert table.match(_event(type='IncidentStatusChanged')) == {'alta-a'}
+    assert table.match(_event()) == {'all', 'open', 'alta-a'}
+
+
+def test_parse_filters_normalizes_lists_and_strings():
+    filters = parse_filters({'status': 'Open, resolved', 'urgencia': ['ALTA'], 'location': 'A1'})
+
+    assert filters == {'status': ['open', 'resolved'], 'urgencia': ['alta'], 'locations': ['UTEC#A#A1']}
+    json.dumps(filters)
+
+
+def test_parse_filters_rejects_unknown_locations():
+    with pytest.raises(ValueError):
+        parse_filters({'locations': ['zzz']})
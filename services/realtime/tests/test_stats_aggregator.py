@@ -0,0 +1,123 @@
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('STATS_TABLE', 'AlertaUTEC-IncidentStats')
+
+import stats_aggregator
+from stats_aggregator import compute_deltas
+from stream_records import IncidentChange
+
+INCIDENT = {'incidentId': {'S': 'inc-1'}, 'entityType': {'S': 'INCIDENT'}, 'status': {'S': 'open'},
+            'urgencia': {'S': 'alta'}, 'locationKey': {'S': 'UTEC#A#A1'}}
+
+
+def _record(event_name, new=None, old=None):
+    data = {}
+    if new:
+        data['NewImage'] = new
+    if old:
+        data['OldImage'] = old
+    return {'eventName': event_name, 'dynamodb': data}
+
+
+def test_compute_deltas_moves_counters_between_statuses():
+    resolved = dict(INCIDENT, status={'S': 'resolved'})
+
+    deltas = compute_deltas([_record('MODIFY', resolved, INCIDENT)])
+
+    assert deltas == {
+        'status#open': -1, 'status#resolved': 1,
+        'status#open|urgencia#alta': -1, 'status#resolved|urgencia#alta': 1,
+        'status#open|edificio#A': -1, 'status#resolved|edificio#A': 1,
+        'version': 1,
+    }
+
+
+def test_compute_deltas_skips_archived_removals_but_counts_deletions():
+    archived = dict(INCIDENT, archivedAt={'N': '1735689600'})
+
+    assert compute_deltas([_record('REMOVE', old=archived)]) == {}
+    assert compute_deltas([_record('REMOVE', old=INCIDENT)])['total'] == -1
+
+
+def test_compute_deltas_ignores_other_item_types():
+    tombstone = dict(INCIDENT, entityType={'S': 'TOMBSTONE'})
+
+    assert compute_deltas([_record('INSERT', tombstone)]) == {}
+
+
+class _FakeStatsTable:
+    """Tabla de stats en memoria: BatchGetItem y TransactWriteItems con las condiciones de los marcadores"""
+
+    name = 'AlertaUTEC-IncidentStats'
+
+    def __init__(self):
+        self.items = {}
+        self.transactions = 0
+        self.meta = SimpleNamespace(client=SimpleNamespace(batch_get_item=self.batch_get_item,
+                                                           transact_write_items=self.transact_write_items))
+
+    def batch_get_item(self, RequestItems):
+        keys = RequestItems[self.name]['Keys']
+        found = [self.items[k['statsId']] for k in keys if k['statsId'] in self.items]
+        return {'Responses': {self.name: found}}
+
+    def transact_write_items(self, TransactItems):
+        for op in TransactItems:
+            put = op.get('Put')
+            if put:
+                current = self.items.get(put['Item']['statsId'], {})
+                expected = put.get('ExpressionAttributeValues', {}).get(':seq')
+                assert current.get('seq') == expected
+        self.transactions += 1
+        for op in TransactItems:
+            if 'Put' in op:
+                self.items[op['Put']['Item']['statsId']] = dict(op['Put']['Item'])
+            else:
+                update = op['Update']
+                stats = self.items.setdefault('GLOBAL', {'statsId': 'GLOBAL'})
+                for alias, key in update['ExpressionAttributeNames'].items():
+                    if alias.startswith('#c'):
+                        stats[key] = stats.get(key, 0) + update['ExpressionAttributeValues'][':d' + alias[2:]]
+
+
+def test_aggregate_sink_writes_one_transaction_per_batch():
+    changes = [
+        IncidentChange('INSERT', {'incidentId': 'inc-1', 'entityType': 'INCIDENT', 'status': 'open', 'urgencia': 'alta'},
+                       sequence_numbers=['100']),
+        IncidentChange('INSERT', {'incidentId': 'inc-2', 'entityType': 'INCIDENT', 'status': 'open', 'urgencia': 'baja'},
+                       sequence_numbers=['101']),
+    ]
+    table = _FakeStatsTable()
+    with patch.object(stats_aggregator, '_table', table):
+        assert stats_aggregator.aggregate(changes) == []
+
+    assert table.transactions == 1
+    assert table.items['GLOBAL']['total'] == 2
+    assert table.items['GLOBAL']['edificio#unknown'] == 2
+
+
+def test_aggregate_sink_does_not_count_replayed_changes_twice():
+    open_ = {'incidentId': 'inc-1', 'entityType': 'INCIDENT', 'status': 'open', 'urgencia': 'alta'}
+    in_progress = dict(open_, status='in_progress')
+    resolved = dict(open_, status='resolved')
+    table = _FakeStatsTable()
+    with patch.object(stats_aggregator, '_table', table):
+        stats_aggregator.aggregate([IncidentChange('INSERT', open_, sequence_numbers=['1'])])
+        stats_aggregator.aggregate([IncidentChange('MODIFY', in_progress, open_, sequence_numbers=['2'])])
+        # Reintento del mismo cambio (falló otro sink)
+        stats_aggregator.aggregate([IncidentChange('MODIFY', in_progress, open_, sequence_numbers=['2'])])
+        # Reintento que coalesce el record ya aplicado con uno nuevo: el delta parte del estado contado
+        stats_aggregator.aggregate([IncidentChange('MODIFY', resolved, open_, sequence_numbers=['2', '3'])])
+
+    stats = table.items['GLOBAL']
+    assert table.transactions == 3
+    assert stats['total'] == 1
+    assert (stats['status#open'], stats['status#in_progress'], stats['status#resolved']) == (0, 0, 1)
+    assert stats['version'] == 3
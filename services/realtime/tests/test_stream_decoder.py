@@ -0,0 +1,53 @@
+import sys
+import os
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from stream_decoder import decode_image
+
+IMAGE = {
+    'incidentId': {'S': 'inc-1'},
+    'status': {'S': 'open'},
+    'createdAt': {'N': '1735689600'},
+    'score': {'N': '2.5'},
+    'rounded': {'N': '3.0'},
+    'urgent': {'BOOL': True},
+    'assignedTo': {'NULL': True},
+    'history': {'L': [{'M': {'status': {'S': 'open'}, 'at': {'N': '1'}}}]},
+    'tags': {'SS': ['agua', 'fuga']},
+    'counts': {'NS': ['1', '2']},
+}
+
+
+def _native(value):
+    # TypeDeserializer devuelve Decimal: se compara contra int/float
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: _native(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_native(v) for v in value]
+    if isinstance(value, set):
+        return {_native(v) for v in value}
+    return value
+
+
+def test_decode_image_matches_type_deserializer():
+    deserializer = TypeDeserializer()
+    expected = {k: _native(deserializer.deserialize(v)) for k, v in IMAGE.items()}
+
+    decoded = decode_image(IMAGE)
+
+    assert decoded == expected
+    assert type(decoded['createdAt']) is int
+    assert type(decoded['rounded']) is int
+    assert type(decoded['score']) is float
+
+
+def test_decode_image_only_reads_requested_fields():
+    assert decode_image(IMAGE, frozenset({'status', 'createdAt', 'missing'})) == {'status': 'open', 'createdAt': 1735689600}
+    assert decode_image(None, frozenset({'status'})) == {}
@@ -0,0 +1,73 @@
+import sys
+import os
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import stream_pipeline
+from stats_aggregator import ARCHIVED_AT, change_deltas
+from stream_pipeline import load_sinks, run_sinks
+from stream_records import IncidentChange
+
+
+def _changes():
+    return [IncidentChange('INSERT', sequence_numbers=['1']), IncidentChange('MODIFY', sequence_numbers=['2'])]
+
+
+def test_run_sinks_unions_failures_and_isolates_raising_sinks():
+    changes = _changes()
+    deadlines = []
+
+    def partial(batch, deadline):
+        deadlines.append(deadline)
+        return batch[1:]
+
+    def broken(batch, deadline):
+        raise RuntimeError('boom')
+
+    assert run_sinks([('ok', lambda batch, deadline: [])], changes, 5.0) == []
+    assert run_sinks([('partial', partial)], changes, 5.0) == changes[1:]
+    # Un sink que lanza falla todos los cambios; cada uno se reporta una sola vez
+    failed = run_sinks([('partial', partial), ('broken', broken)], changes)
+    assert sorted(failed, key=lambda c: c.sequence_numbers) == changes
+    assert deadlines == [5.0, None]
+
+
+def test_load_sinks_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        load_sinks(('nope',))
+
+
+def test_handler_reports_failed_changes(monkeypatch):
+    monkeypatch.setattr(stream_pipeline, '_sinks', [('fail-modify', lambda batch, deadline: [c for c in batch if c.event_type == 'MODIFY'])])
+    monkeypatch.setattr(stream_pipeline, '_fields', None)
+    records = [
+        {'eventName': 'INSERT', 'dynamodb': {'Keys': {'incidentId': {'S': 'a'}}, 'SequenceNumber': '10', 'NewImage': {}}},
+        {'eventName': 'MODIFY', 'dynamodb': {'Keys': {'incidentId': {'S': 'b'}}, 'SequenceNumber': '11', 'NewImage': {}}},
+    ]
+
+    assert stream_pipeline.handler({'Records': records}, None) == {'batchItemFailures': [{'itemIdentifier': '11'}]}
+
+
+def test_handler_archive_in_one_batch_is_not_a_delete(monkeypatch):
+    seen = []
+    monkeypatch.setattr(stream_pipeline, '_sinks', [('capture', lambda batch, deadline: seen.extend(batch))])
+    monkeypatch.setattr(stream_pipeline, '_fields', None)
+    incident = {'incidentId': {'S': 'a'}, 'entityType': {'S': 'INCIDENT'}, 'status': {'S': 'open'}}
+    archived = dict(incident, archivedAt={'N': '1700000000'})
+    records = [
+        {'eventName': 'MODIFY', 'dynamodb': {'Keys': {'incidentId': {'S': 'a'}}, 'SequenceNumber': '10',
+                                             'OldImage': incident, 'NewImage': archived}},
+        {'eventName': 'REMOVE', 'dynamodb': {'Keys': {'incidentId': {'S': 'a'}}, 'SequenceNumber': '11',
+                                             'OldImage': archived}},
+    ]
+
+    assert stream_pipeline.handler({'Records': records}, None) == {'batchItemFailures': []}
+    [change] = seen
+    # stats, search y tombstones ignoran el REMOVE de un incidente archivado
+    assert change.event_type == 'REMOVE' and ARCHIVED_AT in change.old
+    assert change_deltas([(change.event_type, change.old, change.new)]) == {}
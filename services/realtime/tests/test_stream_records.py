@@ -0,0 +1,82 @@
+import sys
+import os
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from stream_records import IncidentChange, batch_item_failures, coalesce_records, decode_changes
+
+
+def _record(event_name, seq, incident_id='inc-1', new=None, old=None):
+    data = {'Keys': {'incidentId': {'S': incident_id}}, 'SequenceNumber': seq}
+    if new is not None:
+        data['NewImage'] = {'incidentId': {'S': incident_id}, 'status': {'S': new}}
+    if old is not None:
+        data['OldImage'] = {'incidentId': {'S': incident_id}, 'status': {'S': old}}
+    return {'eventName': event_name, 'dynamodb': data}
+
+
+def _status(image):
+    return image['status']['S'] if image else None
+
+
+def test_coalesce_keeps_first_old_and_last_new_image():
+    records = [
+        _record('INSERT', '100', new='open'),
+        _record('MODIFY', '200', new='in_progress', old='open'),
+        _record('MODIFY', '300', incident_id='inc-2', new='resolved', old='open'),
+        _record('MODIFY', '400', new='resolved', old='in_progress'),
+    ]
+
+    merged = coalesce_records(records)
+
+    assert [(et, _status(new), _status(old), seqs) for et, new, old, seqs in merged] == [
+        ('INSERT', 'resolved', None, ['100', '200', '400']),
+        ('MODIFY', 'resolved', 'open', ['300']),
+    ]
+
+
+def test_coalesce_remove_closes_the_entry():
+    insert_then_remove = [_record('INSERT', '1', new='open'), _record('REMOVE', '2', old='open')]
+    modify_then_remove = [_record('MODIFY', '1', new='resolved', old='open'), _record('REMOVE', '2', old='resolved')]
+    remove_then_insert = [_record('REMOVE', '1', old='open'), _record('INSERT', '2', new='open')]
+
+    assert coalesce_records(insert_then_remove) == []
+    [(et, new, old, seqs)] = coalesce_records(modify_then_remove)
+    assert (et, new, _status(old), seqs) == ('REMOVE', None, 'open', ['1', '2'])
+    [(et, new, old, seqs)] = coalesce_records(remove_then_insert)
+    assert (et, _status(new), _status(old)) == ('MODIFY', 'open', 'open')
+
+
+def test_coalesce_modify_then_remove_keeps_archived_at():
+    archive = _record('MODIFY', '1', new='open', old='open')
+    archive['dynamodb']['NewImage']['archivedAt'] = {'N': '1700000000'}
+    remove = _record('REMOVE', '2', old='open')
+    remove['dynamodb']['OldImage']['archivedAt'] = {'N': '1700000000'}
+
+    [(et, new, old, seqs)] = coalesce_records([archive, remove])
+
+    assert (et, new, _status(old), seqs) == ('REMOVE', None, 'open', ['1', '2'])
+    assert old['archivedAt'] == {'N': '1700000000'}
+
+
+def test_decode_changes_fails_undecodable_records_on_their_own():
+    bad = _record('INSERT', '5', incident_id='inc-2')
+    bad['dynamodb']['NewImage'] = {'status': {'X': 'unknown type'}}
+    failed = []
+
+    changes = decode_changes([_record('INSERT', '4', new='open'), bad], failed=failed)
+
+    assert [c.new for c in changes] == [{'incidentId': 'inc-1', 'status': 'open'}]
+    assert [c.sequence_numbers for c in failed] == [['5']]
+
+
+def test_batch_item_failures_reports_first_sequence_number_in_numeric_order():
+    failed = [
+        IncidentChange('MODIFY', sequence_numbers=['1000', '1200']),
+        IncidentChange('MODIFY', sequence_numbers=['900']),
+        IncidentChange('MODIFY', sequence_numbers=['1000']),
+    ]
+
+    assert batch_item_failures(failed) == {'batchItemFailures': [{'itemIdentifier': '900'}, {'itemIdentifier': '1000'}]}
+    assert batch_item_failures([]) == {'batchItemFailures': []}